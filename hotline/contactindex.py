@@ -0,0 +1,128 @@
+# Author: Jorge Alarcon Alvarez
+# Email: jorge4larcon@gmail.com
+"""This module defines an in-memory index of the contacts to search them as the user types. Every searchable field has
+a sorted list of (key, mac_address) pairs, the contacts whose key starts with the pattern are found with a binary
+search and are next to each other in the list, so a search does not depend on the number of contacts.
+
+The names are indexed from the start of every word, 'insp' finds 'Dell_Inspiron', and the MAC addresses without their
+separators, 'b8ee65' finds 'b8ee.659d.868a'."""
+
+import bisect
+import re
+
+FIELDS = ('name', 'mac_address', 'ipv4_address', 'ipv6_address')
+# Contacts returned by a search at most
+SEARCH_LIMIT = 1000
+
+_WORD = re.compile(r'[^\W_]+')
+_MAC_SEPARATORS = re.compile(r'[.:\-]')
+
+
+def field_keys(field, value) -> tuple:
+    """This function returns the keys under which a value of a field is indexed"""
+    if not value:
+        return ()
+    value = str(value).lower()
+    if field == 'name':
+        return tuple(dict.fromkeys([value] + [value[match.start():] for match in _WORD.finditer(value)]))
+    if field == 'mac_address':
+        return _MAC_SEPARATORS.sub('', value),
+    return value,
+
+
+def pattern_key(field, pattern) -> str:
+    """This function normalizes a search pattern like the keys of a field"""
+    pattern = pattern.strip().lower()
+    if field == 'mac_address':
+        return _MAC_SEPARATORS.sub('', pattern)
+    return pattern
+
+
+class ContactSearchIndex:
+    """This index finds the contacts whose name, MAC address, IPv4 or IPv6 address starts with a pattern"""
+    def __init__(self, contacts=()):
+        self.keys = {field: [] for field in FIELDS}
+        self.contacts = {}
+        self.build(contacts)
+
+    def __len__(self):
+        return len(self.contacts)
+
+    def __contains__(self, mac_address):
+        return mac_address in self.contacts
+
+    def build(self, contacts):
+        """This method replaces the contents of the index with `contacts`, dicts with the FIELDS"""
+        self.keys = {field: [] for field in FIELDS}
+        self.contacts = {}
+        # Built in a single pass, the pairs are sorted once at the end
+        pairs = [(field, self.keys[field].append) for field in FIELDS]
+        for contact in contacts:
+            mac_address = contact['mac_address']
+            indexed = self.contacts[mac_address] = {}
+            for field, append in pairs:
+                keys = indexed[field] = field_keys(field, contact[field])
+                for key in keys:
+                    append((key, mac_address))
+        for field_pairs in self.keys.values():
+            field_pairs.sort()
+
+    def add(self, mac_address, **fields):
+        """This method adds a contact to the index, or updates its fields if it is already there"""
+        if mac_address in self.contacts:
+            self.update(mac_address, **fields)
+            return
+        fields['mac_address'] = mac_address
+        indexed = self.contacts[mac_address] = {field: field_keys(field, fields.get(field)) for field in FIELDS}
+        for field, keys in indexed.items():
+            for key in keys:
+                bisect.insort(self.keys[field], (key, mac_address))
+
+    def update(self, mac_address, **fields):
+        """This method updates the fields of a contact in the index, the fields not given are kept"""
+        indexed = self.contacts.get(mac_address)
+        if indexed is None:
+            return
+        for field, value in fields.items():
+            if field not in indexed or field == 'mac_address':
+                continue
+            keys = field_keys(field, value)
+            if keys == indexed[field]:
+                continue
+            self._remove_keys(field, mac_address, indexed[field])
+            for key in keys:
+                bisect.insort(self.keys[field], (key, mac_address))
+            indexed[field] = keys
+
+    def remove(self, mac_address):
+        """This method removes a contact from the index"""
+        indexed = self.contacts.pop(mac_address, None)
+        if indexed is None:
+            return
+        for field, keys in indexed.items():
+            self._remove_keys(field, mac_address, keys)
+
+    def _remove_keys(self, field, mac_address, keys):
+        pairs = self.keys[field]
+        for key in keys:
+            position = bisect.bisect_left(pairs, (key, mac_address))
+            if position < len(pairs) and pairs[position] == (key, mac_address):
+                del pairs[position]
+
+    def search(self, pattern, fields=FIELDS, limit=SEARCH_LIMIT) -> set:
+        """This method returns the MAC addresses of the contacts with a field of `fields` starting with the pattern, at
+        most `limit` of them"""
+        found = set()
+        for field in fields:
+            key = pattern_key(field, pattern)
+            if not key:
+                continue
+            pairs = self.keys[field]
+            position = bisect.bisect_left(pairs, (key,))
+            while position < len(pairs) and len(found) < limit:
+                indexed_key, mac_address = pairs[position]
+                if not indexed_key.startswith(key):
+                    break
+                found.add(mac_address)
+                position += 1
+        return found
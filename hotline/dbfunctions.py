@@ -5,10 +5,15 @@
 import sqlite3
 import os
 import datetime
-import operator
 import logging
+import threading
+import contactindex
+import dbpool
 
 DB_PATH = None
+# The row of the `Configuration` table, it is read once and then kept up to date by `update_configuration`
+_configuration = None
+_configuration_lock = threading.Lock()
 
 CONFIGURATION_FIELDS = {
     'mac_address': {'editable': True, 'validator': None},
@@ -25,7 +30,14 @@ CONFIGURATION_FIELDS = {
     'interlocutor_address': {'editable': True, 'validator': None},
     'interlocutor_port': {'editable': True, 'validator': None},
     'interlocutor_password': {'editable': True, 'validator': None},
-    'get_only_by_mac': {'editable': True, 'validator': None}
+    'get_only_by_mac': {'editable': True, 'validator': None},
+    'inbox_persistent_sessions': {'editable': True, 'validator': None},
+    'db_synchronous': {'editable': True, 'validator': None},
+    'db_cache_size': {'editable': True, 'validator': None},
+    'retention_days': {'editable': True, 'validator': None},
+    'retention_max_messages': {'editable': True, 'validator': None},
+    'ftp_keep_partial_uploads': {'editable': True, 'validator': None},
+    'ftp_server_backend': {'editable': True, 'validator': None}
 }
 
 CONTACT_FIELDS = {
@@ -34,10 +46,13 @@ CONTACT_FIELDS = {
     'ipv4_address': {'editable': True, 'validator': None},
     'ipv6_address': {'editable': True, 'validator': None},
     'inbox_port': {'editable': True, 'validator': None},
-    'ftp_port': {'editable': True, 'validator': None}
+    'ftp_port': {'editable': True, 'validator': None},
+    'retention_days': {'editable': True, 'validator': None},
+    'retention_max_messages': {'editable': True, 'validator': None}
 }
 
 SENT_MESSAGE_FIELDS = {
+    'id': {'editable': False, 'validator': None},
     'sent_timestamp': {'editable': False, 'validator': None},
     'receiver_contact': {'editable': True, 'validator': None},
     'content': {'editable': True, 'validator': None},
@@ -45,12 +60,58 @@ SENT_MESSAGE_FIELDS = {
 }
 
 RECEIVED_MESSAGE_FIELDS = {
+    'id': {'editable': False, 'validator': None},
     'received_timestamp': {'editable': False, 'validator': None},
     'sender_contact': {'editable': True, 'validator': None},
     'content': {'editable': True, 'validator': None},
     'sent_timestamp': {'editable': True, 'validator': None}
 }
 
+# The table, contact column, timestamp column and other timestamp column of every type of message
+MESSAGE_TABLES = {
+    'sent': ('SentMessage', 'receiver_contact', 'sent_timestamp', 'received_timestamp'),
+    'received': ('ReceivedMessage', 'sender_contact', 'received_timestamp', 'sent_timestamp')
+}
+
+
+# The timestamps of the messages are stored as the microseconds since this date, in the local time of the computer
+EPOCH = datetime.datetime(1970, 1, 1)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def to_epoch(timestamp):
+    """This function converts a datetime object or an ISO 8601 string to the integer stored in the database."""
+    if timestamp is None or isinstance(timestamp, int):
+        return timestamp
+    if isinstance(timestamp, str):
+        timestamp = datetime.datetime.fromisoformat(timestamp)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone().replace(tzinfo=None)
+    return (timestamp - EPOCH) // MICROSECOND
+
+
+def from_epoch(timestamp):
+    """This function converts a timestamp stored in the database to a datetime object."""
+    if timestamp is None:
+        return None
+    return EPOCH + timestamp * MICROSECOND
+
+
+def with_datetimes(rows, *columns):
+    """This function converts the timestamps in the given columns of the rows to datetime objects."""
+    converted = []
+    for row in rows:
+        row = list(row)
+        for column in columns:
+            row[column] = from_epoch(row[column])
+        converted.append(tuple(row))
+    return converted
+
+
+def timestamp_fields(fields: dict):
+    """This function converts the timestamps of a dict of message fields to the integers stored in the database."""
+    return {field: to_epoch(value) if field.endswith('_timestamp') else value for field, value in fields.items()}
+
 
 def unwrap_get_configuration(function):
     """This is a decorating function to return the values​of the decorated function in the form of a list"""
@@ -122,19 +183,45 @@ def update_configuration(conn: sqlite3.Connection, **kwargs):
     if fields:
         values = [kwargs[field] for field in fields]
         statement = f"UPDATE Configuration SET {'= ?, '.join(fields)} = ?"
-        with conn:
-            conn.execute(statement, values)
+        with _configuration_lock:
+            with conn:
+                conn.execute(statement, values)
+            if _configuration is not None:
+                _configuration.update(zip(fields, values))
 
 
 @unwrap_get_configuration
 def get_configuration(conn: sqlite3.Connection, *args):
-    """This function is used to retrieve data from the `Configuration` table in the database."""
+    """This function is used to retrieve data from the `Configuration` table in the database, the table is read the
+    first time and the next calls are served from memory."""
+    global _configuration
     fields = [*filter(lambda f: f in CONFIGURATION_FIELDS, args)]
     if fields:
-        with conn:
-            statement = (f"SELECT {', '.join(fields)} FROM Configuration")
-            values = conn.execute(statement).fetchone()
-        return dict(zip(fields, values))
+        with _configuration_lock:
+            if _configuration is None:
+                with conn:
+                    row = conn.execute('SELECT * FROM Configuration').fetchone()
+                _configuration = dict(zip(row.keys(), row)) if row else {}
+            return {field: _configuration.get(field) for field in fields}
+
+
+def cached_configuration(*args):
+    """This function is used to retrieve data from the `Configuration` table without opening a connection to the
+    database, unless it has not been read yet."""
+    if _configuration is None:
+        conn = get_connection()
+        try:
+            return get_configuration(conn, *args)
+        finally:
+            conn.close()
+    return get_configuration(None, *args)
+
+
+def invalidate_configuration():
+    """This function forgets the values of the `Configuration` table kept in memory, so they are read again."""
+    global _configuration
+    with _configuration_lock:
+        _configuration = None
 
 
 def insert_contact(conn: sqlite3.Connection, mac_address, name='Muhammad', ipv4_address='', ipv6_address='',
@@ -183,71 +270,124 @@ def contacts(conn: sqlite3.Connection, mac_address=None):
             'SELECT mac_address, name, ipv4_address, ipv6_address, inbox_port, ftp_port FROM Contact ORDER BY name ASC').fetchall()
 
 
+def contacts_page(conn: sqlite3.Connection, after=None, limit=256):
+    """This function is used to select a page of the contacts ordered by name and MAC address, the next page is
+    selected passing the (name, mac_address) of the last contact as `after`."""
+    statement = 'SELECT mac_address, name, ipv4_address, ipv6_address, inbox_port, ftp_port FROM Contact '
+    if after is None:
+        statement += "ORDER BY IFNULL(name, ''), mac_address LIMIT ?"
+        parameters = (limit,)
+    else:
+        # Written so the index is searched, a row value comparison would scan it
+        statement += "WHERE IFNULL(name, '') >= ?1 AND (IFNULL(name, '') > ?1 OR mac_address > ?2) " \
+                     "ORDER BY IFNULL(name, ''), mac_address LIMIT ?3"
+        parameters = (after[0] or '', after[1], limit)
+    with conn:
+        return [dict(row) for row in conn.execute(statement, parameters)]
+
+
 def last_sent_messages(conn: sqlite3.Connection, limit=10):
     """This function is used to select the last sent messages in the database."""
     statement = 'SELECT DISTINCT MAX(sent_timestamp), receiver_contact, name FROM SentMessage, Contact WHERE receiver_contact = mac_address GROUP BY receiver_contact ORDER BY sent_timestamp DESC LIMIT ?;'
     with conn:
-        return conn.execute(statement, (limit,)).fetchall()
+        return with_datetimes(conn.execute(statement, (limit,)), 0)
 
 
 def last_sent_messages_to_contact(conn: sqlite3.Connection, mac_address, limit=10):
     """This function is used to select the last sent messages to an specific contact in the database."""
     statement = 'SELECT sent_timestamp, received_timestamp, receiver_contact, name, content FROM SentMessage, Contact WHERE receiver_contact = ? AND receiver_contact = mac_address ORDER BY sent_timestamp DESC LIMIT ?;'
     with conn:
-        return conn.execute(statement, (mac_address, limit))
+        return with_datetimes(conn.execute(statement, (mac_address, limit)), 0, 1)
 
 
 def insert_sent_message(conn: sqlite3.Connection, sent_timestamp, receiver_contact, content, received_timestamp):
-    """This function is used to insert a sent message in the database."""
+    """This function is used to insert a sent message in the database, it returns the id of the message, the
+    timestamps are not unique so the id is the key of the message."""
     statement = 'INSERT INTO SentMessage(sent_timestamp, receiver_contact, content, received_timestamp) ' \
                 'VALUES (?, ?, ?, ?)'
     with conn:
-        conn.execute(statement, (sent_timestamp, receiver_contact, content, received_timestamp))
+        return conn.execute(statement, (to_epoch(sent_timestamp), receiver_contact, content,
+                                        to_epoch(received_timestamp))).lastrowid
 
 
-def update_sent_message(conn: sqlite3.Connection, sent_timestamp, **kwargs):
+def update_sent_message(conn: sqlite3.Connection, message_id, **kwargs):
     """This function is used to update a sent message in the database."""
     fields = [*filter(lambda f: f in SENT_MESSAGE_FIELDS and SENT_MESSAGE_FIELDS[f]['editable'], kwargs)]
     if fields:
+        kwargs = timestamp_fields(kwargs)
         values = [kwargs[field] for field in fields]
-        values.append(sent_timestamp)
-        statement = f"UPDATE SentMessage SET {'= ?, '.join(fields)} = ? WHERE sent_timestamp = ?"
+        values.append(message_id)
+        statement = f"UPDATE SentMessage SET {'= ?, '.join(fields)} = ? WHERE id = ?"
         with conn:
             conn.execute(statement, values)
 
 
-def delete_sent_message(conn: sqlite3.Connection, sent_timestamp):
+def delete_sent_message(conn: sqlite3.Connection, message_id):
     """This function is used to delete a sent message in the database."""
     with conn:
-        conn.execute('DELETE FROM SentMessage WHERE sent_timestamp = ?', (sent_timestamp,))
+        conn.execute('DELETE FROM SentMessage WHERE id = ?', (message_id,))
 
 
 @unwrap_get_sent_message
-def get_sent_message(conn: sqlite3.Connection, sent_timestamp, *args):
+def get_sent_message(conn: sqlite3.Connection, message_id, *args):
     """This function is used to select a sent message in the database."""
     fields = [*filter(lambda f: f in SENT_MESSAGE_FIELDS, args)]
     if fields:
         with conn:
-            statement = (f"SELECT {', '.join(fields)} FROM SentMessage WHERE sent_timestamp = ?")
-            values = conn.execute(statement, (sent_timestamp,)).fetchone()
+            statement = (f"SELECT {', '.join(fields)} FROM SentMessage WHERE id = ?")
+            values = conn.execute(statement, (message_id,)).fetchone()
             if not values:
-                raise sqlite3.Error(f"The SentMessage with the sent_timestamp '{sent_timestamp}' does not exist")
-        return dict(zip(fields, values))
+                raise sqlite3.Error(f"The SentMessage with the id '{message_id}' does not exist")
+        return {field: from_epoch(value) if field.endswith('_timestamp') else value for field, value in zip(fields, values)}
 
 
 def sent_messages(conn: sqlite3.Connection):
     """This function is used to select every sent message in the database."""
     with conn:
-        return conn.execute(
-            'SELECT sent_timestamp, receiver_contact, content, received_timestamp FROM SentMessage ORDER BY sent_timestamp DESC').fetchall()
+        return with_datetimes(conn.execute(
+            'SELECT sent_timestamp, receiver_contact, content, received_timestamp FROM SentMessage ORDER BY sent_timestamp DESC'), 0, 3)
 
 
 def insert_received_message(conn: sqlite3.Connection, received_timestamp, sender_contact, content, sent_timestamp):
-    """This function is used to insert a received message in the database."""
+    """This function is used to insert a received message in the database, it returns the id of the message, the
+    timestamps are not unique so the id is the key of the message."""
     statement = 'INSERT INTO ReceivedMessage(received_timestamp, sender_contact, content, sent_timestamp) ' \
                 'VALUES (?, ?, ?, ?)'
     with conn:
-        conn.execute(statement, (received_timestamp, sender_contact, content, sent_timestamp))
+        return conn.execute(statement, (to_epoch(received_timestamp), sender_contact, content,
+                                        to_epoch(sent_timestamp))).lastrowid
+
+
+def write_received_messages(conn: sqlite3.Connection, messages):
+    """This function inserts a batch of received messages in a single transaction, the senders that are not contacts
+    are added as 'Stranger' and the IP addresses the messages came from are saved in their contacts.
+
+    Every message is a dict with the keys received_timestamp, sender_contact, content, sent_timestamp, ipv4_address and
+    ipv6_address, the function returns the set of MAC addresses of the senders that were not contacts."""
+    senders = {}
+    for message in messages:
+        addresses = senders.setdefault(message['sender_contact'], {'ipv4_address': None, 'ipv6_address': None})
+        for field in ('ipv4_address', 'ipv6_address'):
+            if message.get(field):
+                addresses[field] = message[field]
+
+    with conn:
+        placeholders = ', '.join('?' * len(senders))
+        known = {row['mac_address'] for row in conn.execute(
+            f'SELECT mac_address FROM Contact WHERE mac_address IN ({placeholders})', list(senders))}
+        strangers = set(senders) - known
+        conn.executemany('INSERT INTO Contact(mac_address, name, ipv4_address, ipv6_address, inbox_port, ftp_port) '
+                         "VALUES (?, 'Stranger', '', '', 42000, 21)", [(mac,) for mac in strangers])
+        conn.executemany('UPDATE Contact SET ipv4_address = COALESCE(?, ipv4_address), '
+                         'ipv6_address = COALESCE(?, ipv6_address) WHERE mac_address = ?',
+                         [(addresses['ipv4_address'], addresses['ipv6_address'], mac)
+                          for mac, addresses in senders.items()
+                          if addresses['ipv4_address'] or addresses['ipv6_address']])
+        conn.executemany('INSERT INTO ReceivedMessage(received_timestamp, sender_contact, content, sent_timestamp) '
+                         'VALUES (?, ?, ?, ?)',
+                         [(to_epoch(message['received_timestamp']), message['sender_contact'], message['content'],
+                           to_epoch(message['sent_timestamp'])) for message in messages])
+    return strangers
 
 
 def last_received_messages(conn: sqlite3.Connection, limit=10):
@@ -255,134 +395,653 @@ def last_received_messages(conn: sqlite3.Connection, limit=10):
     # Use of distinc, max and group by to get the last n messages
     statement = 'SELECT DISTINCT MAX(received_timestamp), sender_contact, name FROM ReceivedMessage, Contact WHERE sender_contact = mac_address GROUP BY sender_contact ORDER BY received_timestamp DESC LIMIT ?'
     with conn:
-        return conn.execute(statement, (limit,)).fetchall()
+        return with_datetimes(conn.execute(statement, (limit,)), 0)
 
 
 def last_received_messages_from_contact(conn: sqlite3.Connection, mac_address, limit=10):
     """This function is used to select the received messages to an specific contact in the database."""
     statement = 'SELECT received_timestamp, sent_timestamp, sender_contact, name, content FROM ReceivedMessage, Contact WHERE sender_contact = ? AND sender_contact = mac_address ORDER BY received_timestamp DESC LIMIT ?'
     with conn:
-        return conn.execute(statement, (mac_address, limit))
+        return with_datetimes(conn.execute(statement, (mac_address, limit)), 0, 1)
 
 
-def update_received_message(conn: sqlite3.Connection, sent_timestamp, **kwargs):
+def update_received_message(conn: sqlite3.Connection, message_id, **kwargs):
     """This function is used to update a received message in the database."""
     fields = [*filter(lambda f: f in RECEIVED_MESSAGE_FIELDS and RECEIVED_MESSAGE_FIELDS[f]['editable'], kwargs)]
     if fields:
+        kwargs = timestamp_fields(kwargs)
         values = [kwargs[field] for field in fields]
-        values.append(sent_timestamp)
-        statement = f"UPDATE ReceivedMessage SET {'= ?, '.join(fields)} = ? WHERE received_timestamp = ?"
+        values.append(message_id)
+        statement = f"UPDATE ReceivedMessage SET {'= ?, '.join(fields)} = ? WHERE id = ?"
         with conn:
             conn.execute(statement, values)
 
 
-def delete_received_message(conn: sqlite3.Connection, received_timestamp):
+def delete_received_message(conn: sqlite3.Connection, message_id):
     """This function is used to delete a received message in the database."""
     with conn:
-        conn.execute('DELETE FROM ReceivedMessage WHERE received_timestamp = ?', (received_timestamp,))
+        conn.execute('DELETE FROM ReceivedMessage WHERE id = ?', (message_id,))
 
 
 @unwrap_get_received_message
-def get_received_message(conn: sqlite3.Connection, received_timestamp, *args):
+def get_received_message(conn: sqlite3.Connection, message_id, *args):
     """This function is used to select a received message in the database."""
     fields = [*filter(lambda f: f in RECEIVED_MESSAGE_FIELDS, args)]
     if fields:
         with conn:
-            statement = (f"SELECT {', '.join(fields)} FROM ReceivedMessage WHERE received_timestamp = ?")
-            values = conn.execute(statement, (received_timestamp,)).fetchone()
+            statement = (f"SELECT {', '.join(fields)} FROM ReceivedMessage WHERE id = ?")
+            values = conn.execute(statement, (message_id,)).fetchone()
             if not values:
-                raise sqlite3.Error(
-                    f"The ReceivedMessage with the received_timestamp '{received_timestamp}' does not exist")
-        return dict(zip(fields, values))
+                raise sqlite3.Error(f"The ReceivedMessage with the id '{message_id}' does not exist")
+        return {field: from_epoch(value) if field.endswith('_timestamp') else value for field, value in zip(fields, values)}
 
 
 def received_messages(conn: sqlite3.Connection):
     """This function is used to select every received message in the database."""
     with conn:
-        return conn.execute(
-            'SELECT received_timestamp, sender_contact, content, sent_timestamp FROM ReceivedMessage ORDER BY received_timestamp DESC').fetchall()
+        return with_datetimes(conn.execute(
+            'SELECT received_timestamp, sender_contact, content, sent_timestamp FROM ReceivedMessage ORDER BY received_timestamp DESC'), 0, 3)
+
+
+def conversation_history(conn: sqlite3.Connection, mac_address, before=None, limit=50):
+    """This function is used to select a page of the conversation with a contact, the sent and received messages
+    merged and ordered from the most recent to the oldest.
+
+    It returns (type, timestamp, other_timestamp, content, id) tuples, where type is 'sent' or 'received', timestamp
+    is the sent timestamp of the sent messages and the received timestamp of the received ones, as datetime objects,
+    and other_timestamp is the opposite one. The messages with the same timestamp are ordered by type and id, so the
+    next page is selected passing the last tuple as `before` and no message is skipped."""
+    if before is None:
+        received_condition, sent_condition, parameters = '', '', (mac_address, limit)
+    else:
+        before_type, before_timestamp, before_id = before[0], before[1], before[4]
+        # At the same timestamp the sent messages go before the received ones
+        if before_type == 'received':
+            received_condition = 'AND (received_timestamp, id) < (?2, ?3)'
+            sent_condition = 'AND sent_timestamp < ?2'
+        else:
+            received_condition = 'AND received_timestamp <= ?2'
+            sent_condition = 'AND (sent_timestamp, id) < (?2, ?3)'
+        parameters = (mac_address, to_epoch(before_timestamp), before_id, limit)
+    limit_parameter = f'?{len(parameters)}'
+    statement = f"SELECT * FROM (SELECT 'received' AS type, received_timestamp AS timestamp, " \
+                f"sent_timestamp AS other_timestamp, content, id FROM ReceivedMessage " \
+                f"WHERE sender_contact = ?1 {received_condition} " \
+                f"ORDER BY received_timestamp DESC, id DESC LIMIT {limit_parameter}) " \
+                f"UNION ALL " \
+                f"SELECT * FROM (SELECT 'sent', sent_timestamp, received_timestamp, content, id FROM SentMessage " \
+                f"WHERE receiver_contact = ?1 {sent_condition} " \
+                f"ORDER BY sent_timestamp DESC, id DESC LIMIT {limit_parameter}) " \
+                f"ORDER BY timestamp DESC, type DESC, id DESC LIMIT {limit_parameter}"
+    with conn:
+        return with_datetimes(conn.execute(statement, parameters), 1, 2)
 
 
 def last_sent_or_received_messages_from_contact(conn: sqlite3.Connection, mac_address, limit=10):
     """This function is used to select the last sent or received messages from a specific contact."""
-    received_messages = last_received_messages_from_contact(conn, mac_address, limit)
-    sent_messages = last_sent_messages_to_contact(conn, mac_address, limit)
+    name = get_contact(conn, mac_address, 'name')
     messages = []
-
-    for received in received_messages:
+    for message_type, timestamp, other_timestamp, content, _ in conversation_history(conn, mac_address, limit=limit):
         message = {
-            'mac_address': received['sender_contact'],
-            'name': received['name'],
-            'timestamp': datetime.datetime.fromisoformat(received['received_timestamp']),
-            'sent_timestamp': datetime.datetime.fromisoformat(received['sent_timestamp']),
-            'content': received['content'],
-            'type': 'received'
+            'mac_address': mac_address,
+            'name': name,
+            'timestamp': timestamp,
+            'content': content,
+            'type': message_type
         }
+        if message_type == 'received':
+            message['sent_timestamp'] = other_timestamp
+        else:
+            message['received_timestamp'] = other_timestamp
         messages.append(message)
+    return messages
 
-    for sent in sent_messages:
-        message = {
-            'mac_address': sent['receiver_contact'],
-            'name': sent['name'],
-            'timestamp': datetime.datetime.fromisoformat(sent['sent_timestamp']),
-            'received_timestamp': datetime.datetime.fromisoformat(sent['received_timestamp']),
-            'content': sent['content'],
-            'type': 'sent'
-        }
-        messages.append(message)
 
-    messages = sorted(messages, key=operator.itemgetter('timestamp'), reverse=True)
-    return messages[:limit]
+def last_sent_received_messages(conn: sqlite3.Connection, limit=10):
+    """This function is used to select the last contacts a message was sent to or received from, the most recent first.
+
+    The last timestamp of every contact is looked up with the (contact, timestamp) indexes, so the cost depends on the
+    number of contacts and not on the number of messages."""
+    statement = 'SELECT mac_address, name, MAX(COALESCE(last_sent, -1), COALESCE(last_received, -1)) AS timestamp ' \
+                'FROM (SELECT mac_address, name, ' \
+                '(SELECT MAX(sent_timestamp) FROM SentMessage WHERE receiver_contact = mac_address) AS last_sent, ' \
+                '(SELECT MAX(received_timestamp) FROM ReceivedMessage WHERE sender_contact = mac_address) AS last_received ' \
+                'FROM Contact) ' \
+                'WHERE last_sent IS NOT NULL OR last_received IS NOT NULL ORDER BY timestamp DESC LIMIT ?'
+    with conn:
+        rows = conn.execute(statement, (limit,)).fetchall()
+    return [{
+        'mac_address': row['mac_address'],
+        'timestamp': from_epoch(row['timestamp']),
+        'name': row['name']
+    } for row in rows]
+
+
+def has_message_search(conn: sqlite3.Connection):
+    """This function tells if the database has the `MessageSearch` index."""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'MessageSearch'").fetchone() is not None
+
+
+def fts_query(text):
+    """This function converts the text typed by the user to an FTS5 query that matches the messages that have all of
+    its words, the last one as a prefix, so the quotes or operators typed are not interpreted."""
+    words = text.split()
+    if not words:
+        return None
+    terms = ['"' + word.replace('"', '""') + '"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def escape_like(text):
+    """This function escapes the wildcards of a text to use it in a LIKE pattern with ESCAPE '\\'"""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def like_pattern(text):
+    """This function returns a LIKE pattern, to use with ESCAPE '\\', that matches the values containing `text`"""
+    return f'%{escape_like(text)}%'
+
+
+def search_messages(conn: sqlite3.Connection, query, contact=None, limit=20, cursor=None):
+    """This function is used to search the sent and received messages that contain the words of `query`, optionally
+    only the ones of a contact, the best matches first.
+
+    It returns a (results, next_cursor) tuple, the results are (type, mac_address, name, timestamp, snippet) tuples with
+    the matching words of the snippet between square brackets and the timestamp as a datetime object, and next_cursor is
+    the `cursor` to get the next results or None if there are no more."""
+    match = fts_query(query)
+    if not match:
+        return [], None
+
+    contact_condition = 'AND Message.contact = ?' if contact else ''
+    contact_parameters = [contact] if contact else []
+    if has_message_search(conn):
+        # The matches are ordered by rank, the cursor is the number of results already returned
+        offset = cursor or 0
+        contact_condition = contact_condition.replace('Message.', 'MessageSearch.')
+        statement = f"SELECT MessageSearch.type, MessageSearch.contact, Contact.name, MessageSearch.timestamp, " \
+                    f"snippet(MessageSearch, 0, '[', ']', '...', 12) FROM MessageSearch " \
+                    f"LEFT JOIN Contact ON Contact.mac_address = MessageSearch.contact " \
+                    f"WHERE MessageSearch MATCH ? {contact_condition} ORDER BY rank LIMIT ? OFFSET ?"
+        with conn:
+            results = with_datetimes(conn.execute(statement, [match, *contact_parameters, limit + 1, offset]), 3)
+        if len(results) > limit:
+            return results[:limit], offset + limit
+        return results, None
+
+    # Without FTS5 the messages that contain the whole text are returned, the most recent first, the cursor is the
+    # (timestamp, type, id) of the last result returned
+    cursor_condition, cursor_parameters = '', []
+    if cursor:
+        cursor_condition, cursor_parameters = 'AND (Message.timestamp, Message.type, Message.id) < (?, ?, ?)', [*cursor]
+    statement = f"SELECT Message.type, Message.contact, Contact.name, Message.timestamp, Message.content, " \
+                f"Message.id FROM (" \
+                f"SELECT 'sent' AS type, receiver_contact AS contact, sent_timestamp AS timestamp, content, id " \
+                f"FROM SentMessage UNION ALL " \
+                f"SELECT 'received', sender_contact, received_timestamp, content, id FROM ReceivedMessage) AS Message " \
+                f"LEFT JOIN Contact ON Contact.mac_address = Message.contact " \
+                f"WHERE Message.content LIKE ? ESCAPE '\\' {contact_condition} {cursor_condition} " \
+                f"ORDER BY Message.timestamp DESC, Message.type DESC, Message.id DESC LIMIT ?"
+    parameters = [like_pattern(query.strip()), *contact_parameters, *cursor_parameters, limit + 1]
+    with conn:
+        rows = conn.execute(statement, parameters).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        message_type, timestamp, message_id = rows[-1][0], rows[-1][3], rows[-1][5]
+        next_cursor = (timestamp, message_type, message_id)
+    return with_datetimes((row[:5] for row in rows), 3), next_cursor
+
+
+def add_column(conn: sqlite3.Connection, table, column, definition):
+    """This function adds a column to a table of the database if the table does not have it yet."""
+    columns = [row['name'] for row in conn.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def migration_1_add_contact_indexes(conn: sqlite3.Connection):
+    """This migration adds the indexes to look for the messages of a contact ordered by timestamp."""
+    conn.execute('CREATE INDEX IF NOT EXISTS SentMessage_receiver_contact_sent_timestamp '
+                 'ON SentMessage(receiver_contact, sent_timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS ReceivedMessage_sender_contact_received_timestamp '
+                 'ON ReceivedMessage(sender_contact, received_timestamp)')
+
+
+def migration_2_add_sessions_routes_and_settings(conn: sqlite3.Connection):
+    """This migration adds the `Route` table and the configuration of the persistent sessions and of the database
+    connections, the databases upgraded before the migrations existed may already have them."""
+    add_column(conn, 'Configuration', 'inbox_persistent_sessions', 'BOOLEAN DEFAULT 0')
+    add_column(conn, 'Configuration', 'db_synchronous', "TEXT DEFAULT 'NORMAL'")
+    add_column(conn, 'Configuration', 'db_cache_size', 'INTEGER DEFAULT -16000')
+    conn.execute('''CREATE TABLE IF NOT EXISTS "Route" (
+        "contact_mac"   TEXT NOT NULL,
+        "address"       TEXT NOT NULL,
+        "port"          INTEGER NOT NULL,
+        "family"        TEXT NOT NULL,
+        "last_success"  DATETIME,
+        "last_failure"  DATETIME,
+        FOREIGN KEY("contact_mac") REFERENCES "Contact"("mac_address") ON UPDATE CASCADE ON DELETE CASCADE,
+        PRIMARY KEY("contact_mac", "address", "port")
+    )''')
+
+
+def fts5_available(conn: sqlite3.Connection):
+    """This function tells if the SQLite library was compiled with the FTS5 extension."""
+    try:
+        conn.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(content)')
+        conn.execute('DROP TABLE temp.fts5_probe')
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def create_message_search(conn: sqlite3.Connection):
+    """This function creates the `MessageSearch` full-text index of the content of the sent and received messages and
+    the triggers that keep it in sync, and adds to it the messages that are not indexed yet.
+
+    The rowid of a sent message in the index is its rowid * 2 and the rowid of a received message is its rowid * 2 + 1."""
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS MessageSearch USING fts5("
+                 "content, contact UNINDEXED, type UNINDEXED, timestamp UNINDEXED, "
+                 "tokenize = 'unicode61 remove_diacritics 2')")
+    for table, contact, timestamp, message_type, offset in (
+            ('SentMessage', 'receiver_contact', 'sent_timestamp', 'sent', 0),
+            ('ReceivedMessage', 'sender_contact', 'received_timestamp', 'received', 1)):
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN "
+                     f"INSERT INTO MessageSearch(rowid, content, contact, type, timestamp) "
+                     f"VALUES (new.rowid * 2 + {offset}, new.content, new.{contact}, '{message_type}', new.{timestamp}); "
+                     f"END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN "
+                     f"DELETE FROM MessageSearch WHERE rowid = old.rowid * 2 + {offset}; "
+                     f"END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE ON {table} BEGIN "
+                     f"DELETE FROM MessageSearch WHERE rowid = old.rowid * 2 + {offset}; "
+                     f"INSERT INTO MessageSearch(rowid, content, contact, type, timestamp) "
+                     f"VALUES (new.rowid * 2 + {offset}, new.content, new.{contact}, '{message_type}', new.{timestamp}); "
+                     f"END")
+        conn.execute(f"INSERT INTO MessageSearch(rowid, content, contact, type, timestamp) "
+                     f"SELECT rowid * 2 + {offset}, content, {contact}, '{message_type}', {timestamp} FROM {table} "
+                     f"WHERE rowid * 2 + {offset} NOT IN (SELECT rowid FROM MessageSearch)")
+    conn.execute("INSERT INTO MessageSearch(MessageSearch) VALUES ('optimize')")
+
+
+def migration_3_add_message_search(conn: sqlite3.Connection):
+    """This migration adds the `MessageSearch` index, if SQLite has FTS5."""
+    if not fts5_available(conn):
+        logging.warning('SQLite was compiled without FTS5, the messages will be searched without an index')
+        return
+    create_message_search(conn)
+
+
+def migration_4_use_integer_timestamps(conn: sqlite3.Connection):
+    """This migration rebuilds the message tables with an integer primary key and the timestamps stored as integers,
+    see `to_epoch`, instead of ISO 8601 text keys. The search index is rebuilt because the rowids of the messages
+    change."""
+    def text_to_epoch(timestamp):
+        try:
+            return to_epoch(timestamp)
+        except (TypeError, ValueError):
+            logging.warning(f"Invalid message timestamp '{timestamp}'")
+            return None
+
+    conn.create_function('to_epoch', 1, text_to_epoch)
+    conn.execute('''CREATE TABLE "SentMessage_new" (
+        "id"                    INTEGER PRIMARY KEY,
+        "receiver_contact"      TEXT NOT NULL,
+        "content"               TEXT,
+        "sent_timestamp"        INTEGER NOT NULL,
+        "received_timestamp"    INTEGER,
+        FOREIGN KEY("receiver_contact") REFERENCES "Contact"("mac_address") ON UPDATE CASCADE ON DELETE CASCADE
+    )''')
+    conn.execute('''CREATE TABLE "ReceivedMessage_new" (
+        "id"                    INTEGER PRIMARY KEY,
+        "sender_contact"        TEXT NOT NULL,
+        "content"               TEXT,
+        "received_timestamp"    INTEGER NOT NULL,
+        "sent_timestamp"        INTEGER,
+        FOREIGN KEY("sender_contact") REFERENCES "Contact"("mac_address") ON UPDATE CASCADE ON DELETE CASCADE
+    )''')
+    conn.execute('INSERT INTO SentMessage_new(receiver_contact, content, sent_timestamp, received_timestamp) '
+                 'SELECT receiver_contact, content, COALESCE(to_epoch(sent_timestamp), 0), to_epoch(received_timestamp) '
+                 'FROM SentMessage ORDER BY sent_timestamp')
+    conn.execute('INSERT INTO ReceivedMessage_new(sender_contact, content, received_timestamp, sent_timestamp) '
+                 'SELECT sender_contact, content, COALESCE(to_epoch(received_timestamp), 0), to_epoch(sent_timestamp) '
+                 'FROM ReceivedMessage ORDER BY received_timestamp')
+    for table in ('SentMessage', 'ReceivedMessage'):
+        conn.execute(f'DROP TABLE {table}')
+        conn.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    migration_1_add_contact_indexes(conn)
+    if has_message_search(conn):
+        conn.execute('DELETE FROM MessageSearch')
+        create_message_search(conn)
+
+
+def migration_5_add_retention_policy(conn: sqlite3.Connection):
+    """This migration adds the global retention policy to the `Configuration` table and the retention policy of every
+    contact, which overrides the global one, to the `Contact` table."""
+    for table in ('Configuration', 'Contact'):
+        add_column(conn, table, 'retention_days', 'INTEGER')
+        add_column(conn, table, 'retention_max_messages', 'INTEGER')
+
+
+def migration_6_add_contact_name_index(conn: sqlite3.Connection):
+    """This migration adds the index to read the contacts ordered by name in pages."""
+    conn.execute("CREATE INDEX IF NOT EXISTS Contact_name_mac_address ON Contact(IFNULL(name, ''), mac_address)")
+
+
+def migration_7_add_ftp_partial_uploads(conn: sqlite3.Connection):
+    """This migration adds the configuration of the FTP server to keep the partial uploads so they can be resumed."""
+    add_column(conn, 'Configuration', 'ftp_keep_partial_uploads', 'BOOLEAN DEFAULT 0')
+
+
+def migration_8_add_ftp_server_backend(conn: sqlite3.Connection):
+    """This migration adds the concurrency backend of the FTP server to the configuration."""
+    add_column(conn, 'Configuration', 'ftp_server_backend', "TEXT DEFAULT 'async'")
+
+
+# The migrations of the database schema in order, the database is at version N (PRAGMA user_version) after running
+# the first N of them. New migrations are appended, never edited or reordered.
+MIGRATIONS = [
+    migration_1_add_contact_indexes,
+    migration_2_add_sessions_routes_and_settings,
+    migration_3_add_message_search,
+    migration_4_use_integer_timestamps,
+    migration_5_add_retention_policy,
+    migration_6_add_contact_name_index,
+    migration_7_add_ftp_partial_uploads,
+    migration_8_add_ftp_server_backend
+]
+
+
+def schema_version(conn: sqlite3.Connection):
+    """This function returns the number of migrations applied to the database."""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def upgrade_database(conn: sqlite3.Connection):
+    """This function switches the database to WAL mode, so the inbox servers can write while the UI reads, and applies
+    the migrations that the database does not have yet, every migration runs in its own transaction."""
+    journal_mode = conn.execute('PRAGMA journal_mode = WAL').fetchone()[0]
+    if journal_mode.lower() != 'wal':
+        logging.warning(f"Could not enable WAL mode, the journal mode is '{journal_mode}'")
+
+    version = schema_version(conn)
+    if version > len(MIGRATIONS):
+        logging.warning(f'The database schema version {version} is newer than this application')
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        logging.info(f'Migrating the database to version {number}: {migration.__name__}')
+        with conn:
+            conn.execute('BEGIN')
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {number}')
+    invalidate_configuration()
+    enable_incremental_vacuum(conn)
+
 
+def enable_incremental_vacuum(conn: sqlite3.Connection):
+    """This function switches the database to incremental auto-vacuum, so the pages freed by the archival of the old
+    messages can be returned to the file system little by little, the change needs a full VACUUM that is done once."""
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+        return
+    logging.info('Enabling the incremental auto-vacuum of the database, this is done once')
+    conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    conn.execute('VACUUM')
 
-def last_sent_received_messages(conn: sqlite3.Connection, limit=10):
-    """This function is used to select the last sent or received messages in the database."""
-    last_sent = last_sent_messages(conn, limit)
-    last_received = last_received_messages(conn, limit)
-    last_messenguers = []
-
-    for received in last_received:
-        contact = {
-            'mac_address': received['sender_contact'],
-            'timestamp': datetime.datetime.fromisoformat(received['MAX(received_timestamp)']),
-            'name': received['name']
-        }
-        last_messenguers.append(contact)
 
-    for sent in last_sent:
-        contact = {
-            'mac_address': sent['receiver_contact'],
-            'timestamp': datetime.datetime.fromisoformat(sent['MAX(sent_timestamp)']),
-            'name': sent['name'],
+def incremental_vacuum(conn: sqlite3.Connection, pages=None):
+    """This function returns up to `pages` free pages of the database, or all of them, to the file system, it returns
+    the number of pages freed."""
+    free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    # The pragma frees a page per step and the sqlite3 module steps a statement without rows only once, executescript()
+    # runs it to completion
+    conn.executescript(f'PRAGMA incremental_vacuum({int(pages) if pages else 0})')
+    return free_pages - conn.execute('PRAGMA freelist_count').fetchone()[0]
+
+
+def apply_database_settings(conn: sqlite3.Connection):
+    """This function applies the `db_synchronous` and `db_cache_size` configuration to the connections."""
+    synchronous, cache_size = get_configuration(conn, 'db_synchronous', 'db_cache_size')
+    try:
+        dbpool.set_pragmas(synchronous, cache_size)
+    except ValueError as e:
+        logging.error(e)
+
+
+def checkpoint(conn: sqlite3.Connection, mode='PASSIVE'):
+    """This function copies the pages of the write-ahead log to the database file, it returns the (busy, log pages,
+    checkpointed pages) of the checkpoint."""
+    return tuple(conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone())
+
+
+def archive_path(path=None):
+    """This function returns the path of the archive database of the old messages, next to the database."""
+    root, extension = os.path.splitext(path or DB_PATH)
+    return f'{root}-archive{extension or ".db"}'
+
+
+def attach_archive(conn: sqlite3.Connection, path=None):
+    """This function attaches the archive database as `archive`, creating its tables if they do not exist.
+
+    The archived messages keep the columns of the message tables, they get new ids and have no foreign keys because the
+    contacts can be deleted after their messages are archived."""
+    conn.execute('ATTACH DATABASE ? AS archive', (path or archive_path(),))
+    with conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS archive."SentMessage" (
+            "id"                    INTEGER PRIMARY KEY,
+            "receiver_contact"      TEXT NOT NULL,
+            "content"               TEXT,
+            "sent_timestamp"        INTEGER NOT NULL,
+            "received_timestamp"    INTEGER
+        )''')
+        conn.execute('''CREATE TABLE IF NOT EXISTS archive."ReceivedMessage" (
+            "id"                    INTEGER PRIMARY KEY,
+            "sender_contact"        TEXT NOT NULL,
+            "content"               TEXT,
+            "received_timestamp"    INTEGER NOT NULL,
+            "sent_timestamp"        INTEGER
+        )''')
+        conn.execute('CREATE INDEX IF NOT EXISTS archive.SentMessage_receiver_contact_sent_timestamp '
+                     'ON SentMessage(receiver_contact, sent_timestamp)')
+        conn.execute('CREATE INDEX IF NOT EXISTS archive.ReceivedMessage_sender_contact_received_timestamp '
+                     'ON ReceivedMessage(sender_contact, received_timestamp)')
+
+
+def detach_archive(conn: sqlite3.Connection):
+    """This function detaches the archive database."""
+    conn.execute('DETACH DATABASE archive')
+
+
+def retention_cutoffs(conn: sqlite3.Connection, now=None):
+    """This function returns a {mac_address: timestamp} dict with the contacts whose messages older than the timestamp
+    must be archived, according to their retention policy or the global one.
+
+    A policy keeps the messages of the last `retention_days` days and at most the last `retention_max_messages`
+    messages of the conversation, NULL or 0 means no limit."""
+    now = now or datetime.datetime.now()
+    days, max_messages = get_configuration(conn, 'retention_days', 'retention_max_messages')
+    cutoffs = {}
+    with conn:
+        rows = conn.execute('SELECT mac_address, COALESCE(retention_days, ?) AS retention_days, '
+                            'COALESCE(retention_max_messages, ?) AS retention_max_messages FROM Contact',
+                            (days, max_messages)).fetchall()
+        for row in rows:
+            cutoff = None
+            if row['retention_days']:
+                cutoff = to_epoch(now - datetime.timedelta(days=row['retention_days']))
+            if row['retention_max_messages']:
+                # The timestamp of the oldest message kept, the union is read in the order of the contact indexes
+                oldest_kept = conn.execute(
+                    'SELECT timestamp FROM (SELECT sent_timestamp AS timestamp FROM SentMessage WHERE receiver_contact = ?1 '
+                    'UNION ALL SELECT received_timestamp FROM ReceivedMessage WHERE sender_contact = ?1) '
+                    'ORDER BY timestamp DESC LIMIT 1 OFFSET ?2',
+                    (row['mac_address'], row['retention_max_messages'] - 1)).fetchone()
+                if oldest_kept and (cutoff is None or oldest_kept[0] > cutoff):
+                    cutoff = oldest_kept[0]
+            if cutoff is not None:
+                cutoffs[row['mac_address']] = cutoff
+    return cutoffs
+
+
+def archive_messages(conn: sqlite3.Connection, mac_address, before_timestamp, batch_size=500):
+    """This function moves the messages of a contact older than `before_timestamp` to the attached archive database,
+    `batch_size` messages per transaction so the inbox servers are not blocked for long, it returns the number of
+    messages moved."""
+    before_timestamp = to_epoch(before_timestamp)
+    moved = 0
+    for table, contact, timestamp, other_timestamp in (
+            ('SentMessage', 'receiver_contact', 'sent_timestamp', 'received_timestamp'),
+            ('ReceivedMessage', 'sender_contact', 'received_timestamp', 'sent_timestamp')):
+        columns = f'{contact}, content, {timestamp}, {other_timestamp}'
+        while True:
+            with conn:
+                ids = [row[0] for row in conn.execute(
+                    f'SELECT id FROM main.{table} WHERE {contact} = ? AND {timestamp} < ? ORDER BY {timestamp} LIMIT ?',
+                    (mac_address, before_timestamp, batch_size))]
+                if not ids:
+                    break
+                placeholders = ', '.join('?' * len(ids))
+                conn.execute(f'INSERT INTO archive.{table}({columns}) '
+                             f'SELECT {columns} FROM main.{table} WHERE id IN ({placeholders}) ORDER BY id', ids)
+                conn.execute(f'DELETE FROM main.{table} WHERE id IN ({placeholders})', ids)
+            moved += len(ids)
+    return moved
+
+
+def iter_contacts(conn: sqlite3.Connection, mac_addresses=None):
+    """This function yields the contacts of the database, or only the ones in `mac_addresses`, as dicts."""
+    statement = 'SELECT mac_address, name, ipv4_address, ipv6_address, inbox_port, ftp_port, retention_days, ' \
+                'retention_max_messages FROM Contact'
+    parameters = []
+    if mac_addresses:
+        statement += f" WHERE mac_address IN ({', '.join('?' * len(mac_addresses))})"
+        parameters = list(mac_addresses)
+    for row in conn.execute(statement, parameters):
+        yield dict(row)
+
+
+# The characters after which a word of a contact name starts, for the searches without the search index
+CONTACT_NAME_SEPARATORS = ' _-.'
+
+
+def search_contacts(conn: sqlite3.Connection, pattern, fields, limit):
+    """This function returns the MAC addresses of at most `limit` contacts with a field of `fields` starting with the
+    pattern, the names also from the start of every word and the MAC addresses without separators. It scans the
+    contacts, it is used while the search index of the contacts is being built."""
+    conditions, parameters = [], []
+    for field in fields:
+        key = contactindex.pattern_key(field, pattern)
+        if not key:
+            continue
+        prefix = f'{escape_like(key)}%'
+        if field == 'name':
+            words = [prefix] + [f'%{escape_like(separator)}{prefix}' for separator in CONTACT_NAME_SEPARATORS]
+            conditions.append('(' + ' OR '.join(["name LIKE ? ESCAPE '\\'"] * len(words)) + ')')
+            parameters += words
+        elif field == 'mac_address':
+            conditions.append("REPLACE(REPLACE(REPLACE(mac_address, '.', ''), ':', ''), '-', '') LIKE ? ESCAPE '\\'")
+            parameters.append(prefix)
+        else:
+            conditions.append(f"{field} LIKE ? ESCAPE '\\'")
+            parameters.append(prefix)
+    if not conditions:
+        return set()
+    statement = f"SELECT mac_address FROM Contact WHERE {' OR '.join(conditions)} LIMIT ?"
+    with conn:
+        return {row[0] for row in conn.execute(statement, parameters + [limit])}
+
+
+def iter_messages(conn: sqlite3.Connection, message_type, mac_addresses=None, since=None, schema='main'):
+    """This function yields the sent or received messages, `message_type` is 'sent' or 'received', of every contact
+    or only of the ones in `mac_addresses`, optionally only the messages since a timestamp, as dicts with datetime
+    timestamps and ordered by contact and timestamp, following the contact indexes. The messages are read from the
+    tables of `schema`, 'archive' for the attached archive database."""
+    table, contact, timestamp, other_timestamp = MESSAGE_TABLES[message_type]
+    statement = f'SELECT {contact}, content, {timestamp}, {other_timestamp} FROM {schema}.{table}'
+    conditions, parameters = [], []
+    if mac_addresses:
+        conditions.append(f"{contact} IN ({', '.join('?' * len(mac_addresses))})")
+        parameters.extend(mac_addresses)
+    if since is not None:
+        conditions.append(f'{timestamp} >= ?')
+        parameters.append(to_epoch(since))
+    if conditions:
+        statement += ' WHERE ' + ' AND '.join(conditions)
+    statement += f' ORDER BY {contact}, {timestamp}'
+    for row in conn.execute(statement, parameters):
+        yield {
+            contact: row[0],
+            'content': row[1],
+            timestamp: from_epoch(row[2]),
+            other_timestamp: from_epoch(row[3])
         }
-        exist = False
-        for messenguer in last_messenguers:
-            if messenguer['mac_address'] == contact['mac_address']:
-                logging.debug(f"The contact '{messenguer['mac_address']}' exists")
-                exist = True
-                messenger_timestamp = messenguer['timestamp']
-                if contact['timestamp'] > messenger_timestamp:
-                    logging.debug(f"Updating timestamp")
-                    logging.debug(f"Old timestamp: {messenguer['timestamp'].isoformat()}")
-                    messenguer['timestamp'] = contact['timestamp']
-                    logging.debug(f"New timestamp: {messenguer['timestamp'].isoformat()}")
 
-        if not exist:
-            last_messenguers.append(contact)
 
-    last_messenguers = sorted(last_messenguers, key=operator.itemgetter('timestamp'), reverse=True)
-    return last_messenguers
+def count_messages(conn: sqlite3.Connection, message_type, mac_addresses=None, since=None, schema='main'):
+    """This function counts the messages that `iter_messages` yields."""
+    table, contact, timestamp, _ = MESSAGE_TABLES[message_type]
+    statement = f'SELECT COUNT(*) FROM {schema}.{table} WHERE 1'
+    parameters = []
+    if mac_addresses:
+        statement += f" AND {contact} IN ({', '.join('?' * len(mac_addresses))})"
+        parameters.extend(mac_addresses)
+    if since is not None:
+        statement += f' AND {timestamp} >= ?'
+        parameters.append(to_epoch(since))
+    return conn.execute(statement, parameters).fetchone()[0]
+
+
+def import_contacts(conn: sqlite3.Connection, contacts, replace=False):
+    """This function inserts a batch of contacts (dicts like the ones of `iter_contacts`) in a transaction, the
+    contacts that already exist are kept unless `replace` is True."""
+    fields = [*CONTACT_FIELDS]
+    conflict = 'DO UPDATE SET ' + ', '.join(f'{field} = excluded.{field}' for field in fields if field != 'mac_address') \
+        if replace else 'DO NOTHING'
+    statement = f"INSERT INTO Contact({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))}) " \
+                f"ON CONFLICT(mac_address) {conflict}"
+    with conn:
+        conn.executemany(statement, [[contact.get(field) for field in fields] for contact in contacts])
+
+
+def import_messages(conn: sqlite3.Connection, message_type, messages):
+    """This function inserts a batch of sent or received messages (dicts like the ones of `iter_messages`) in a
+    transaction, the messages already in the database are skipped, so importing a file twice does not duplicate them,
+    and the contacts that do not exist are added as 'Stranger'. It returns the number of messages inserted."""
+    table, contact, timestamp, other_timestamp = MESSAGE_TABLES[message_type]
+    with conn:
+        conn.executemany("INSERT INTO Contact(mac_address, name, ipv4_address, ipv6_address, inbox_port, ftp_port) "
+                         "VALUES (?, 'Stranger', '', '', 42000, 21) ON CONFLICT(mac_address) DO NOTHING",
+                         [(mac,) for mac in {message[contact] for message in messages}])
+        cursor = conn.executemany(f'INSERT INTO {table}({contact}, content, {timestamp}, {other_timestamp}) '
+                         f'SELECT ?1, ?2, ?3, ?4 WHERE NOT EXISTS (SELECT 1 FROM {table} '
+                         f'WHERE {contact} = ?1 AND {timestamp} = ?3 AND content IS ?2)',
+                         [(message[contact], message['content'], to_epoch(message[timestamp]),
+                           to_epoch(message.get(other_timestamp))) for message in messages])
+        return cursor.rowcount
+
+
+def record_route(conn: sqlite3.Connection, contact_mac, address, port, family, success, timestamp):
+    """This function is used to record in the database that an address of a contact worked or failed."""
+    column = 'last_success' if success else 'last_failure'
+    statement = f'INSERT INTO Route(contact_mac, address, port, family, {column}) VALUES (?, ?, ?, ?, ?) ' \
+                f'ON CONFLICT(contact_mac, address, port) DO UPDATE SET family = excluded.family, ' \
+                f'{column} = excluded.{column}'
+    with conn:
+        conn.execute(statement, (contact_mac, address, port, family, timestamp))
+
+
+def routes(conn: sqlite3.Connection, contact_mac):
+    """This function is used to select the known routes to a contact in the database."""
+    statement = 'SELECT address, port, family, last_success, last_failure FROM Route WHERE contact_mac = ? ' \
+                'ORDER BY last_success DESC'
+    with conn:
+        return conn.execute(statement, (contact_mac,)).fetchall()
 
 
 def get_connection():
-    """This function is used to get a connection to the database."""
-    if DB_PATH:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON")
-        return conn
-    else:
-        raise Exception('The database path has not been defined')
+    """This function is used to get a connection to the database, the connection is shared by the operations of the
+    calling thread and closing it does nothing (see dbpool)."""
+    return dbpool.get_connection()
 
 
 def set_dbpath(path):
@@ -390,6 +1049,8 @@ def set_dbpath(path):
     if os.path.isfile(path):
         global DB_PATH
         DB_PATH = path
+        dbpool.configure(path)
+        invalidate_configuration()
     else:
         raise FileNotFoundError(f"No such file: '{path}')")
 
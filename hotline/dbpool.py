@@ -0,0 +1,140 @@
+# Author: Jorge Alarcon Alvarez
+# Email: jorge4larcon@gmail.com
+"""This module keeps a connection to the database per thread, the connection is opened and configured the first time a
+thread asks for it and then reused, instead of opening a new connection for every operation."""
+
+import contextlib
+import logging
+import sqlite3
+import threading
+import time
+import weakref
+
+# Number of compiled statements kept by every connection
+CACHED_STATEMENTS = 256
+# Statements executed once when a connection is opened, besides the synchronous and cache_size settings
+PRAGMAS = ['PRAGMA foreign_keys = ON']
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+# NORMAL is durable enough in WAL mode, a commit can only be lost with a power failure
+DEFAULT_SYNCHRONOUS = 'NORMAL'
+# Negative values are KiB, 16 MiB per connection
+DEFAULT_CACHE_SIZE = -16000
+# Seconds a connection waits for a lock held by another connection before failing with 'database is locked'
+BUSY_TIMEOUT = 5
+
+_synchronous = DEFAULT_SYNCHRONOUS
+_cache_size = DEFAULT_CACHE_SIZE
+
+_path = None
+_generation = 0
+_local = threading.local()
+_connections = weakref.WeakSet()
+_lock = threading.Lock()
+
+
+class PooledConnection(sqlite3.Connection):
+    """This is a connection owned by a thread, `close()` does nothing so the code that closes the connection after every
+    operation keeps working, the connection is closed by `close_all()` or when the database path changes"""
+    def close(self):
+        """This method keeps the connection open for the next operation of the thread"""
+
+    def really_close(self):
+        """This method closes the connection"""
+        super(PooledConnection, self).close()
+
+
+def configure(path):
+    """This function sets the path of the database, the connections to the previous path are replaced the next time
+    their threads ask for them"""
+    global _path, _generation
+    with _lock:
+        _path = path
+        _generation += 1
+
+
+def set_pragmas(synchronous=None, cache_size=None):
+    """This function changes the synchronous and cache_size settings of the connections, the connections already open
+    are replaced the next time their threads ask for them"""
+    global _synchronous, _cache_size, _generation
+    synchronous = str(synchronous).upper() if synchronous else DEFAULT_SYNCHRONOUS
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f"Invalid synchronous mode: '{synchronous}'")
+    cache_size = int(cache_size) if cache_size else DEFAULT_CACHE_SIZE
+    with _lock:
+        if (synchronous, cache_size) != (_synchronous, _cache_size):
+            _synchronous, _cache_size = synchronous, cache_size
+            _generation += 1
+
+
+def retry_if_locked(function, *args, attempts=5, delay=0.05, **kwargs):
+    """This function calls `function(*args, **kwargs)` and calls it again, waiting a bit longer every time, if it fails
+    because the database is locked, which can still happen after the busy timeout when a read transaction is upgraded to
+    a write transaction"""
+    for attempt in range(attempts):
+        try:
+            return function(*args, **kwargs)
+        except sqlite3.OperationalError as e:
+            message = str(e).lower()
+            if attempt == attempts - 1 or ('locked' not in message and 'busy' not in message):
+                raise
+            logging.info(f'The database is locked, trying again ({attempt + 1}/{attempts})')
+            time.sleep(delay * 2 ** attempt)
+
+
+def get_connection() -> PooledConnection:
+    """This function returns the connection of the calling thread, opening it if needed"""
+    conn = getattr(_local, 'connection', None)
+    if conn is not None and _local.generation == _generation:
+        return conn
+    if conn is not None:
+        conn.really_close()
+        _local.connection = None
+
+    with _lock:
+        path, generation, synchronous, cache_size = _path, _generation, _synchronous, _cache_size
+    if not path:
+        raise Exception('The database path has not been defined')
+
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, factory=PooledConnection, cached_statements=CACHED_STATEMENTS,
+                           check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    conn.execute(f'PRAGMA synchronous = {synchronous}')
+    conn.execute(f'PRAGMA cache_size = {cache_size}')
+    _local.connection, _local.generation = conn, generation
+    with _lock:
+        _connections.add(conn)
+    logging.debug(f'Opened a database connection for {threading.current_thread().name}')
+    return conn
+
+
+@contextlib.contextmanager
+def connection():
+    """This function is a context manager that gives the connection of the calling thread inside a transaction, the
+    transaction is committed when the block ends or rolled back if it raises an exception"""
+    conn = get_connection()
+    with conn:
+        yield conn
+
+
+def close_thread_connection():
+    """This function closes the connection of the calling thread"""
+    conn = getattr(_local, 'connection', None)
+    if conn is not None:
+        _local.connection = None
+        conn.really_close()
+
+
+def close_all():
+    """This function closes the connections of every thread, it must be called when the application is closing"""
+    global _generation
+    with _lock:
+        _generation += 1
+        connections = list(_connections)
+        _connections.clear()
+    for conn in connections:
+        try:
+            conn.really_close()
+        except sqlite3.Error as e:
+            logging.error(f'Could not close a database connection: {e}')
@@ -0,0 +1,177 @@
+# Author: Jorge Alarcon Alvarez
+# Email: jorge4larcon@gmail.com
+"""This module defines the write-behind writer of the received messages: the inbox servers confirm a message as soon as
+it arrives and put it in a queue, a dedicated thread takes the messages from the queue and writes them to the database
+in batches, one transaction per batch, and notifies the UI after the batch is committed."""
+
+import logging
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import dbfunctions
+import dbpool
+
+# The biggest number of messages written in a transaction
+BATCH_SIZE = 64
+# Seconds to wait for more messages before writing a batch
+BATCH_INTERVAL = 0.05
+# Seconds between the checkpoints of the write-ahead log, they are done when the writer is idle
+CHECKPOINT_INTERVAL = 30
+# Seconds to wait before writing again the messages that could not be written
+RETRY_INTERVAL = 1
+# Times a message is written before it is dropped, the messages are not dropped while the database cannot be opened
+MAX_ATTEMPTS = 5
+
+_STOP = object()
+_writer = None
+_lock = threading.Lock()
+
+
+class ReceivedMessageWriter(threading.Thread):
+    """This is the thread that writes the received messages to the database"""
+    def __init__(self, batch_size=BATCH_SIZE, batch_interval=BATCH_INTERVAL):
+        super(ReceivedMessageWriter, self).__init__(name='ReceivedMessageWriterThread', daemon=True)
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.queue = queue.Queue()
+
+    def put(self, message: dict, received_timestamp, peer_address, peer_family, signals):
+        """This method queues a message parsed by the inbox server, `signals.on_message_received` is emitted after the
+        message is committed"""
+        received = {
+            'received_timestamp': received_timestamp,
+            'sender_contact': message['sender'],
+            'content': message['content'],
+            'sent_timestamp': message['sent_timestamp'],
+            'ipv4_address': peer_address if peer_address and peer_family == socket.AF_INET else None,
+            'ipv6_address': peer_address if peer_address and peer_family == socket.AF_INET6 else None
+        }
+        self.queue.put((received, signals))
+
+    def stop(self, timeout=None):
+        """This method writes the messages left in the queue and stops the thread"""
+        self.queue.put(_STOP)
+        self.join(timeout)
+
+    def next_batch(self, timeout=CHECKPOINT_INTERVAL):
+        """This method waits for a message and then takes up to `batch_size` messages, waiting at most `batch_interval`
+        seconds for them, it returns the batch and if the thread must stop, the batch is empty if no message arrives in
+        `timeout` seconds"""
+        try:
+            item = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return [], False
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.batch_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def run(self) -> None:
+        """This method defines the actions of the writer when started, the messages that could not be written are kept
+        and written again with the next batch, the senders have already been told that they were received"""
+        conn = None
+        stop = False
+        failed = []
+        pending_checkpoint = False
+        last_checkpoint = time.monotonic()
+        while not stop:
+            batch, stop = self.next_batch(RETRY_INTERVAL if failed else CHECKPOINT_INTERVAL)
+            batch, failed = failed + batch, []
+            if batch:
+                try:
+                    if conn is None:
+                        conn = dbfunctions.get_connection()
+                except Exception as e:
+                    logging.error(f'Could not open the database to write {len(batch)} received message(s): {e}')
+                    failed = batch
+                    continue
+                failed = self.write(conn, batch)
+                pending_checkpoint = True
+            try:
+                if pending_checkpoint and (stop or time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL):
+                    busy, log_pages, checkpointed_pages = dbfunctions.checkpoint(conn)
+                    logging.debug(f'Checkpoint: {checkpointed_pages} of {log_pages} page(s), busy={busy}')
+                    pending_checkpoint = False
+                    last_checkpoint = time.monotonic()
+            except Exception as e:
+                logging.error(f'Could not checkpoint the write-ahead log: {e}')
+        if failed:
+            logging.error(f'{len(failed)} received message(s) were not written before the writer was stopped')
+        if conn:
+            conn.close()
+        logging.info('The received messages writer was stopped')
+
+    def write(self, conn: sqlite3.Connection, batch):
+        """This method writes a batch in a transaction and emits the signals, if the transaction fails the messages are
+        written one by one so a bad message does not lose the rest of them. It returns the messages that could not be
+        written and must be written again"""
+        try:
+            strangers = dbpool.retry_if_locked(dbfunctions.write_received_messages, conn,
+                                               [received for received, _ in batch])
+            written, failed = batch, []
+        except Exception as e:
+            logging.error(f'Could not write the batch of {len(batch)} received message(s), writing them one by one: {e}')
+            strangers, written, failed = set(), [], []
+            for received, signals in batch:
+                try:
+                    strangers |= dbpool.retry_if_locked(dbfunctions.write_received_messages, conn, [received])
+                except Exception as e:
+                    attempts = received.get('attempts', 0) + 1
+                    if attempts < MAX_ATTEMPTS:
+                        logging.error(f"Could not write the message from {received['sender_contact']}, it will be "
+                                      f"written again: {e}")
+                        received['attempts'] = attempts
+                        failed.append((received, signals))
+                    else:
+                        logging.error(f"Could not write the message from {received['sender_contact']}, it was "
+                                      f"dropped after {attempts} attempts: {e}")
+                else:
+                    written.append((received, signals))
+
+        for received, signals in written:
+            ipv, ip = None, None
+            if received['ipv4_address']:
+                ipv, ip = 4, received['ipv4_address']
+            elif received['ipv6_address']:
+                ipv, ip = 6, received['ipv6_address']
+            is_stranger = received['sender_contact'] in strangers
+            strangers.discard(received['sender_contact'])
+            signal_info = {"mac_address": received['sender_contact'], "is_stranger": is_stranger, "ipv": ipv, "ip": ip,
+                           "timestamp": received['received_timestamp']}
+            try:
+                signals.on_message_received.emit(signal_info)
+            except Exception as e:
+                logging.error(f"Could not notify the message from {received['sender_contact']}: {e}")
+        return failed
+
+
+def get_writer() -> ReceivedMessageWriter:
+    """This function returns the writer shared by the inbox servers, starting it the first time it is called"""
+    global _writer
+    with _lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = ReceivedMessageWriter()
+            _writer.start()
+            logging.info('The received messages writer was started')
+        return _writer
+
+
+def shutdown(timeout=3):
+    """This function writes the pending messages and stops the writer"""
+    global _writer
+    with _lock:
+        writer, _writer = _writer, None
+    if writer and writer.is_alive():
+        writer.stop(timeout)
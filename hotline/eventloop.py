@@ -0,0 +1,118 @@
+# Author: Jorge Alarcon Alvarez
+# Email: jorge4larcon@gmail.com
+"""This module runs a single long-lived asyncio event loop in a background thread, every network coroutine of the
+application (senders, lookups and Interlocutor requests) is submitted to it instead of creating a new loop per call.
+The widgets submit them with `submit_to_qt`, that reports their results through Qt signals, so no thread of the Qt
+thread pool is blocked waiting for the network."""
+
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import threading
+from PyQt5 import QtCore
+
+_loop = None
+_thread = None
+_lock = threading.Lock()
+# The signals of the coroutines submitted with `submit_to_qt` and the objects that own their slots, they are kept until
+# the last signal is delivered and released in the thread of the slots, not in the thread of the event loop
+_qt_pending = {}
+
+
+def _run_loop(loop: asyncio.AbstractEventLoop):
+    """This function is the target of the event loop thread"""
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_forever()
+    finally:
+        try:
+            pending = asyncio.all_tasks(loop)
+            for pending_task in pending:
+                pending_task.cancel()
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            loop.close()
+            logging.info('The shared event loop was closed')
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """This function returns the shared event loop, starting its thread the first time it is called"""
+    global _loop, _thread
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_run_loop, args=(_loop,), name='EventLoopThread', daemon=True)
+            _thread.start()
+            logging.info('The shared event loop was started')
+        return _loop
+
+
+def submit(coro) -> concurrent.futures.Future:
+    """This function schedules a coroutine in the shared event loop and returns a concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+async def run_blocking(function, *args):
+    """This function runs a blocking function, like a database query, in the default executor of the event loop and
+    returns its result, so the coroutines of the loop are not blocked while it runs"""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(function, *args))
+
+
+def shutdown(timeout=3):
+    """This function stops the shared event loop and waits for its thread to finish"""
+    global _loop, _thread
+    with _lock:
+        loop, thread = _loop, _thread
+        _loop, _thread = None, None
+    if loop and not loop.is_closed():
+        loop.call_soon_threadsafe(loop.stop)
+    if thread:
+        thread.join(timeout)
+
+
+class CoroutineSignals(QtCore.QObject):
+    """These are the signals emitted when a coroutine submitted with `submit_to_qt` finishes"""
+    on_result = QtCore.pyqtSignal('PyQt_PyObject')
+    on_error = QtCore.pyqtSignal('PyQt_PyObject')
+    on_finished = QtCore.pyqtSignal()
+
+
+def _release_qt_pending(key):
+    """This function releases the signals of a finished coroutine and its owner once the slot that called it returns"""
+    QtCore.QTimer.singleShot(0, functools.partial(_qt_pending.pop, key, None))
+
+
+def submit_to_qt(coro, on_result=None, on_error=None, on_finished=None, owner=None) -> CoroutineSignals:
+    """This function schedules a coroutine in the shared event loop and reports its result to the Qt world through a
+    CoroutineSignals object, the slots are connected before the coroutine is scheduled and they are called in the thread
+    of their receivers, the thread that called this function for the functions that are not slots of a QObject.
+
+    PyQt does not keep alive the objects of the bound methods connected to a signal, `owner`, usually the object whose
+    methods are the slots, is kept alive until the coroutine has finished and its signals have been delivered."""
+    signals = CoroutineSignals()
+    if on_result:
+        signals.on_result.connect(on_result)
+    if on_error:
+        signals.on_error.connect(on_error)
+    if on_finished:
+        signals.on_finished.connect(on_finished)
+    key = id(signals)
+    signals.on_finished.connect(functools.partial(_release_qt_pending, key))
+    _qt_pending[key] = (signals, owner)
+
+    def on_done(future):
+        try:
+            result = future.result()
+        except Exception as e:
+            if not on_error:
+                logging.error(f'A coroutine submitted to the shared event loop failed: {e!r}')
+            signals.on_error.emit(e)
+        else:
+            signals.on_result.emit(result)
+        finally:
+            signals.on_finished.emit()
+
+    submit(coro).add_done_callback(on_done)
+    return signals
@@ -0,0 +1,117 @@
+# Author: Jorge Alarcon Alvarez
+# Email: jorge4larcon@gmail.com
+"""This module defines the streaming decoders used to read requests and replies from TCP connections, where a read may
+return part of a request or several of them at once.
+
+There are two kinds of streams: the persistent sessions, made of length-prefixed frames, and the old single request
+connections, made of JSON documents written one after another."""
+
+import asyncio
+import codecs
+import json
+import struct
+
+# Header of the frames: the length of the JSON payload as a 4 bytes big-endian integer
+FRAME_HEADER = struct.Struct('!I')
+# The biggest frame or JSON document accepted, a message has at most 10240 characters
+MAX_FRAME_SIZE = 256 * 1024
+# Bytes requested to the stream on every read
+READ_SIZE = 4096
+
+
+class FrameError(ValueError):
+    """This exception is raised when a stream has a frame bigger than allowed or a malformed document"""
+
+
+def encode_frame(obj) -> bytes:
+    """This function encodes an object as a length-prefixed frame"""
+    payload = json.dumps(obj).encode('UTF-8')
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+class FrameDecoder:
+    """This class splits a stream of length-prefixed frames, the bytes of an incomplete frame are kept until the rest of
+    them arrive"""
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        """This method adds the received bytes to the buffer and returns the payloads of the frames completed"""
+        self.buffer.extend(data)
+        payloads = []
+        while len(self.buffer) >= FRAME_HEADER.size:
+            length, = FRAME_HEADER.unpack_from(self.buffer)
+            if length > self.max_frame_size:
+                raise FrameError(f'The frame has {length} bytes, the maximum is {self.max_frame_size}')
+            end = FRAME_HEADER.size + length
+            if len(self.buffer) < end:
+                break
+            payloads.append(bytes(self.buffer[FRAME_HEADER.size:end]))
+            del self.buffer[:end]
+        return payloads
+
+
+class JsonDecoder:
+    """This class splits a stream of JSON objects or arrays written one after another, it decodes the UTF-8 bytes
+    incrementally and finds the end of every document tracking the nesting level outside the strings"""
+    def __init__(self, max_document_size=MAX_FRAME_SIZE):
+        self.max_document_size = max_document_size
+        self.utf8 = codecs.getincrementaldecoder('UTF-8')()
+        self.buffer = ''
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, data: bytes) -> list:
+        """This method adds the received bytes to the buffer and returns the texts of the documents completed"""
+        self.buffer += self.utf8.decode(data)
+        documents = []
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+            self.position += 1
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if self.depth == 0:
+                    documents.append(self.buffer[:self.position].strip())
+                    self.buffer = self.buffer[self.position:]
+                    self.position = 0
+            elif self.depth == 0 and not char.isspace():
+                raise FrameError(f'Unexpected character {char!r} between documents')
+            if self.depth < 0:
+                raise FrameError('Unbalanced document')
+        if len(self.buffer) > self.max_document_size:
+            raise FrameError(f'The document has more than {self.max_document_size} bytes')
+        return documents
+
+
+async def read_frame(reader: asyncio.StreamReader, max_frame_size=MAX_FRAME_SIZE) -> bytes:
+    """This function reads the payload of a complete length-prefixed frame from a stream"""
+    length, = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    if length > max_frame_size:
+        raise FrameError(f'The frame has {length} bytes, the maximum is {max_frame_size}')
+    return await reader.readexactly(length)
+
+
+async def read_json(reader: asyncio.StreamReader, max_document_size=MAX_FRAME_SIZE):
+    """This function reads a complete JSON document from a stream, even if it arrives in several segments"""
+    decoder = JsonDecoder(max_document_size)
+    while True:
+        data = await reader.read(READ_SIZE)
+        if not data:
+            raise asyncio.IncompleteReadError(decoder.buffer.encode('UTF-8'), None)
+        documents = decoder.feed(data)
+        if documents:
+            return json.loads(documents[0])
@@ -1,12 +1,50 @@
 # Author: Jorge Alarcon Alvarez
 # Email: jorge4larcon@gmail.com
-"""This module contains functions to start an FTP server and handle its events."""
+"""This module contains functions to start an FTP server and handle its events.
 
-from pyftpdlib.handlers import FTPHandler
-from pyftpdlib.servers import FTPServer
+The files are sent with sendfile() where the system has it, the kernel copies them from the disk cache to the socket
+without passing them through Python, in chunks of the data channel buffer size. The throughput of every
+configuration can be measured with the benchmark mode.
+
+Usage: python ftp.py [--file FILE | --size MIB] [--buffer-size BYTES ...] [--backend BACKEND ...] [--clients N]"""
+
+from pyftpdlib.handlers import DTPHandler, FTPHandler
+from pyftpdlib.servers import FTPServer, ThreadedFTPServer
 from pyftpdlib.authorizers import DummyAuthorizer
 from PyQt5 import QtCore
+import argparse
+import ftplib
 import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# The concurrency backends of the FTP server: a single thread serving every connection asynchronously, a thread per
+# connection, or a process per connection so the transfers are spread over all the cores
+BACKEND_ASYNC = 'async'
+BACKEND_THREADED = 'threaded'
+BACKEND_MULTIPROCESS = 'multiprocess'
+SERVER_BACKENDS = {
+    BACKEND_ASYNC: FTPServer,
+    BACKEND_THREADED: ThreadedFTPServer
+}
+try:  # Only available where the processes can be forked
+    from pyftpdlib.servers import MultiprocessFTPServer
+    SERVER_BACKENDS[BACKEND_MULTIPROCESS] = MultiprocessFTPServer
+except ImportError:
+    pass
+
+# True where the files can be sent without copying them to Python, sendfile() is not used for ASCII transfers
+SENDFILE_AVAILABLE = hasattr(os, 'sendfile')
+# Bytes read from or written to a data connection at once, also the bytes sent by every sendfile() call
+DTP_BUFFER_SIZE = 256 * 1024
+# Seconds the server waits for events before checking if it has to shut down
+POLL_TIMEOUT = 0.5
+# Seconds the benchmark waits for a server to shut down
+SHUTDOWN_TIMEOUT = 10
 
 
 class FtpServerSignals(QtCore.QObject):
@@ -31,17 +69,87 @@ class FtpServerSignals(QtCore.QObject):
     on_error = QtCore.pyqtSignal('PyQt_PyObject')
 
 
+class QueuedSignal:
+    """This class puts the arguments of the signal emitted in a process serving a connection in a queue, the FTP server
+    thread emits them in the main process where the UI is listening."""
+    def __init__(self, queue, name):
+        self.queue = queue
+        self.name = name
+
+    def emit(self, *args):
+        """This method queues the emission of the signal"""
+        self.queue.put((self.name, args))
+
+
+class QueuedSignals:
+    """This class defines the handler signals of the processes serving the connections."""
+    NAMES = ('on_connect', 'on_disconnect', 'on_login', 'on_logout', 'on_file_sent', 'on_file_received',
+             'on_incomplete_file_sent', 'on_incomplete_file_received')
+
+    def __init__(self, queue):
+        for name in self.NAMES:
+            setattr(self, name, QueuedSignal(queue, name))
+
+
+def relay_signals(queue, signals: FtpServerSignals):
+    """This function emits the signals queued by the processes serving the connections until it gets None"""
+    for name, args in iter(queue.get, None):
+        getattr(signals, name).emit(*args)
+
+
+class MyDTPHandler(DTPHandler):
+    """This class defines the data connection handler of the FTP server."""
+    ac_in_buffer_size = DTP_BUFFER_SIZE
+    ac_out_buffer_size = DTP_BUFFER_SIZE
+
+
 class MyHandler(FTPHandler):
     """This class defines the connection handler of the FTP server."""
     signals: FtpServerSignals = None
+    dtp_handler = MyDTPHandler
+    use_sendfile = SENDFILE_AVAILABLE
+    # If True the part of a file received before the connection dropped is kept, so the client can resume the upload
+    keep_partial_uploads = False
+    # True when every connection is served in its own process
+    served_in_process = False
+    # The process that accepted the connection
+    accepted_in = None
+    # The clients downloading a file in segments announce the length of the next RETR with SITE RANGE and abort the
+    # transfer after it, a transfer aborted after sending the whole range is not reported as incomplete
+    proto_cmds = dict(FTPHandler.proto_cmds)
+    proto_cmds['SITE RANGE'] = dict(
+        perm=None, auth=True, arg=True,
+        help='Syntax: SITE RANGE <SP> length (the next RETR sends a range of length bytes).')
+    range_length = None
+    transfer_range = None
+
+    def ftp_SITE_RANGE(self, line):
+        """This method sets the length of the range the next RETR sends"""
+        try:
+            length = int(line)
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            self.respond('501 Invalid SITE RANGE format.')
+            return
+        self.range_length = length
+        self.respond('200 SITE RANGE successful.')
+
+    def ftp_RETR(self, file):
+        """This method sends a file, or the range announced by SITE RANGE"""
+        self.transfer_range, self.range_length = self.range_length, None
+        return super(MyHandler, self).ftp_RETR(file)
 
     def on_connect(self):
         """When FTP client connects"""
+        self.accepted_in = os.getpid()
         logging.info(f"ftp: new connection from {self.remote_ip}:{self.remote_port}")
         self.signals.on_connect.emit(self.remote_ip, self.remote_port)
 
     def on_disconnect(self):
         """When FTP client disconnects"""
+        if self.served_in_process and os.getpid() == self.accepted_in:
+            return  # The server closed its copy of the connection, the process serving it is still connected
         logging.info(f"ftp: client {self.remote_ip}:{self.remote_port} disconnected")
         self.signals.on_disconnect.emit(self.remote_ip, self.remote_port)
 
@@ -67,6 +175,10 @@ class MyHandler(FTPHandler):
 
     def on_incomplete_file_sent(self, file):
         """When a file has been incompletely sent"""
+        if self.transfer_range is not None and self.data_channel is not None and \
+                self.data_channel.tot_bytes_sent >= self.transfer_range:
+            logging.debug(f"ftp: a range of '{file}' was sent to {self.remote_ip}:{self.remote_port}")
+            return
         logging.info(f"ftp: '{file}' was not fully sent to {self.remote_ip}:{self.remote_port}")
         self.signals.on_incomplete_file_sent.emit(self.remote_ip, self.remote_port, file)
 
@@ -74,16 +186,19 @@ class MyHandler(FTPHandler):
         """When a file has been incompletely received"""
         logging.info(f"ftp: '{file}' was not fully received from {self.remote_ip}:{self.remote_port}")
         self.signals.on_incomplete_file_received.emit(self.remote_ip, self.remote_port, file)
-        import os
+        if self.keep_partial_uploads:
+            return
         try:
             os.remove(file)
-        except Exception as e:
-            pass
+        except OSError as e:
+            logging.error(f"ftp: could not remove '{file}': {e}")
 
 
 class FtpServer(QtCore.QRunnable):
     """The FTP server thread"""
-    def __init__(self, ip, port, max_conn, max_conn_per_ip, folder, banner, users_can_upload_files):
+    def __init__(self, ip, port, max_conn, max_conn_per_ip, folder, banner, users_can_upload_files,
+                 keep_partial_uploads=False, backend=BACKEND_ASYNC, use_sendfile=True,
+                 buffer_size=DTP_BUFFER_SIZE):
         super(FtpServer, self).__init__()
         self.signals = FtpServerSignals()
         self.ip = ip
@@ -93,8 +208,18 @@ class FtpServer(QtCore.QRunnable):
         self.folder = folder
         self.banner = banner
         self.permisions = 'elr'
+        self.keep_partial_uploads = keep_partial_uploads
+        if backend not in SERVER_BACKENDS:
+            logging.warning(f"ftp: the '{backend}' backend is not available, using '{BACKEND_THREADED}' instead")
+            backend = BACKEND_THREADED
+        self.backend = backend
+        self.use_sendfile = use_sendfile and SENDFILE_AVAILABLE
+        self.buffer_size = buffer_size
+        self.stopping = threading.Event()
         if users_can_upload_files:
             self.permisions += 'w'
+            if keep_partial_uploads:  # The uploads are resumed appending to the partial file
+                self.permisions += 'a'
 
     @QtCore.pyqtSlot()
     def run(self):
@@ -104,25 +229,141 @@ class FtpServer(QtCore.QRunnable):
         handler = MyHandler
         handler.banner = self.banner
         handler.authorizer = authorizer
+        handler.keep_partial_uploads = self.keep_partial_uploads
+        handler.served_in_process = self.backend == BACKEND_MULTIPROCESS
+        handler.use_sendfile = self.use_sendfile
+        MyDTPHandler.ac_in_buffer_size = MyDTPHandler.ac_out_buffer_size = self.buffer_size
         self.handler = handler
-        self.handler.signals = self.signals
+        if handler.served_in_process:  # The signals of other processes do not reach the UI, they are relayed
+            queue = multiprocessing.Queue()
+            self.handler.signals = QueuedSignals(queue)
+            relay = threading.Thread(target=relay_signals, args=(queue, self.signals), name='ftp-signals', daemon=True)
+            relay.start()
+        else:
+            self.handler.signals = self.signals
         try:
-            self.server = FTPServer((self.ip, self.port), handler)
+            self.server = SERVER_BACKENDS[self.backend]((self.ip, self.port), handler)
         except Exception as e:
             self.signals.on_error.emit(e)
+            self.stop_relay(handler)
             return
 
         self.server.max_cons = self.max_connections
         self.server.max_cons_per_ip = self.max_connections_per_ip
-        # server = FTPServer((self.ip, self.port), handler)
+        logging.info(f"ftp: serving the connections with the '{self.backend}' backend, sendfile={self.use_sendfile}, "
+                     f"buffer_size={self.buffer_size}")
         try:
             self.signals.on_start.emit()
-            self.server.serve_forever()
+            # The connections are closed by this thread, closing them from another one while the server waits for
+            # events could leave it waiting forever
+            while not self.stopping.is_set():
+                self.server.serve_forever(timeout=POLL_TIMEOUT, blocking=False, handle_exit=False)
+            self.server.close_all()
         except Exception as e:
             self.signals.on_error.emit(e)
+        finally:
+            self.stop_relay(handler)
+
+    @staticmethod
+    def stop_relay(handler):
+        """This method stops relaying the signals of the processes serving the connections, if they are relayed"""
+        if isinstance(handler.signals, QueuedSignals):
+            handler.signals.on_connect.queue.put(None)
 
     def my_jorge_shutdown(self):
         """This method shutdowns the server"""
         self.signals.on_shutdown.emit()
-        # self.server.close()
-        self.server.close_all()
+        self.stopping.set()
+
+
+def download(address, port, filename, buffer_size) -> int:
+    """This function downloads a file from the FTP server discarding its content and returns the bytes received"""
+    received = 0
+
+    def count(data):
+        nonlocal received
+        received += len(data)
+
+    with ftplib.FTP() as ftp_conn:
+        ftp_conn.connect(address, port)
+        ftp_conn.login('hotline', 'hotpassword')
+        ftp_conn.retrbinary(f'RETR {filename}', count, blocksize=buffer_size)
+    return received
+
+
+def benchmark(folder, filename, backend, use_sendfile, buffer_size, clients=1, rounds=3) -> float:
+    """This function serves `folder` with a configuration, downloads `filename` `rounds` times with `clients` concurrent
+    clients and returns the best throughput in MB/s"""
+    # The async backend also counts the data connections
+    max_connections = 2 * clients + 2
+    server = FtpServer('127.0.0.1', 0, max_connections, max_connections, folder, '', False, backend=backend,
+                       use_sendfile=use_sendfile, buffer_size=buffer_size)
+    started = threading.Event()
+    server.signals.on_start.connect(started.set, QtCore.Qt.DirectConnection)
+    server.signals.on_error.connect(lambda e: started.set(), QtCore.Qt.DirectConnection)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    started.wait()
+    if not hasattr(server, 'server'):
+        raise RuntimeError(f"the '{backend}' FTP server could not start")
+    port = server.server.socket.getsockname()[1]
+    best = 0.0
+    try:
+        for _ in range(rounds):
+            results = [0] * clients
+
+            def client(number):
+                results[number] = download('127.0.0.1', port, filename, buffer_size)
+
+            threads = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+            start = time.perf_counter()
+            for client_thread in threads:
+                client_thread.start()
+            for client_thread in threads:
+                client_thread.join()
+            elapsed = time.perf_counter() - start
+            best = max(best, sum(results) / elapsed / 1e6)
+    finally:
+        server.my_jorge_shutdown()
+        thread.join(SHUTDOWN_TIMEOUT)
+        if thread.is_alive():
+            logging.warning(f"ftp: the '{backend}' FTP server did not shut down in {SHUTDOWN_TIMEOUT} s")
+    return best
+
+
+def main(argv=None):
+    """This function is the command line interface of the benchmark mode"""
+    parser = argparse.ArgumentParser(description='Measure the download throughput of the Hotline FTP server.')
+    parser.add_argument('--file', help='the file to download, a temporary file of --size MiB by default')
+    parser.add_argument('--size', type=int, default=256, help='the size in MiB of the temporary file')
+    parser.add_argument('--buffer-size', type=int, nargs='+', default=[64 * 1024, DTP_BUFFER_SIZE, 1024 * 1024],
+                        metavar='BYTES', help='the data channel buffer sizes to measure')
+    parser.add_argument('--backend', nargs='+', default=[BACKEND_ASYNC], choices=sorted(SERVER_BACKENDS),
+                        help='the concurrency backends to measure')
+    parser.add_argument('--clients', type=int, default=1, help='the clients downloading the file at the same time')
+    parser.add_argument('--rounds', type=int, default=3, help='the downloads of every configuration, the best counts')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as temporary_folder:
+        if args.file:
+            folder, filename = os.path.split(os.path.abspath(args.file))
+        else:
+            folder, filename = temporary_folder, 'benchmark.bin'
+            with open(os.path.join(folder, filename), 'wb') as file:
+                for _ in range(args.size):
+                    file.write(os.urandom(1024 * 1024))
+        size = os.path.getsize(os.path.join(folder, filename))
+        print(f"Downloading '{filename}' ({size / 1e6:.1f} MB) with {args.clients} client(s), "
+              f"sendfile is {'available' if SENDFILE_AVAILABLE else 'not available'}")
+        print(f"{'backend':<14}{'sendfile':<10}{'buffer':>10}{'MB/s':>10}")
+        for backend in args.backend:
+            for use_sendfile in sorted({True, False} if SENDFILE_AVAILABLE else {False}, reverse=True):
+                for buffer_size in args.buffer_size:
+                    throughput = benchmark(folder, filename, backend, use_sendfile, buffer_size, args.clients,
+                                           args.rounds)
+                    print(f'{backend:<14}{str(use_sendfile):<10}{buffer_size:>10}{throughput:>10.1f}', flush=True)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
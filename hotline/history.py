@@ -0,0 +1,189 @@
+# Author: Jorge Alarcon Alvarez
+# Email: jorge4larcon@gmail.com
+"""This module exports and imports the contacts and the message history as NDJSON, a JSON object per line, so they can
+be moved to another computer without copying the whole database. The records are streamed, so the memory used does not
+depend on the size of the history, and they are imported in batches of BATCH_SIZE records per transaction.
+
+Every line has a `type`, 'contact', 'sent' or 'received', and the fields of the row, with the timestamps as ISO 8601
+strings. The contacts are written first so they exist when their messages are imported. The messages moved to the
+archive database by the retention policy are exported too, before the ones of the database, and they are imported in
+the database of the other computer.
+
+Usage: python history.py export FILE [--contact MAC ...] [--since TIMESTAMP] [--no-messages] [--no-archive]
+       python history.py import FILE [--replace-contacts]
+A FILE ending in .gz is compressed, - is the standard output or input."""
+
+import argparse
+import datetime
+import gzip
+import json
+import logging
+import os
+import sys
+import dbfunctions
+
+# Records written to the database in a transaction
+BATCH_SIZE = 1000
+# Records between two calls to the progress callback
+PROGRESS_INTERVAL = 10000
+
+
+def open_ndjson(path, mode):
+    """This function opens an NDJSON file for reading ('r') or writing ('w'), compressed if it ends in .gz"""
+    if path == '-':
+        return open(sys.stdin.fileno() if mode == 'r' else sys.stdout.fileno(), mode, encoding='UTF-8', closefd=False)
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='UTF-8')
+    return open(path, mode, encoding='UTF-8')
+
+
+def encode_record(record_type, fields: dict) -> str:
+    """This function encodes a record as a line of NDJSON"""
+    record = {'type': record_type}
+    for field, value in fields.items():
+        record[field] = value.isoformat() if isinstance(value, datetime.datetime) else value
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def message_schemas(archive):
+    """This function returns the schemas whose messages are exported, the archive first because its messages are the
+    oldest"""
+    return ('archive', 'main') if archive else ('main',)
+
+
+def iter_records(conn, mac_addresses=None, since=None, messages=True, archive=False):
+    """This function yields the (type, fields) records to export, the contacts first, the messages of the attached
+    archive database are included if `archive` is True"""
+    for contact in dbfunctions.iter_contacts(conn, mac_addresses):
+        yield 'contact', contact
+    if messages:
+        for message_type in dbfunctions.MESSAGE_TABLES:
+            for schema in message_schemas(archive):
+                for message in dbfunctions.iter_messages(conn, message_type, mac_addresses, since, schema):
+                    yield message_type, message
+
+
+def export_history(conn, file, mac_addresses=None, since=None, messages=True, archive=False, progress=None):
+    """This function writes the contacts, all of them or the ones in `mac_addresses`, and their messages, optionally
+    only the ones since a timestamp, to an open text file, it returns the number of records written. The messages of
+    the archive database, that must be attached with `dbfunctions.attach_archive`, are written if `archive` is True.
+
+    `progress(written, total)` is called every PROGRESS_INTERVAL records and at the end."""
+    total = len(mac_addresses) if mac_addresses else conn.execute('SELECT COUNT(*) FROM Contact').fetchone()[0]
+    if messages:
+        total += sum(dbfunctions.count_messages(conn, message_type, mac_addresses, since, schema)
+                     for message_type in dbfunctions.MESSAGE_TABLES for schema in message_schemas(archive))
+    written = 0
+    for record_type, fields in iter_records(conn, mac_addresses, since, messages, archive):
+        file.write(encode_record(record_type, fields))
+        written += 1
+        if progress and written % PROGRESS_INTERVAL == 0:
+            progress(written, total)
+    if progress:
+        progress(written, total)
+    return written
+
+
+def import_history(conn, file, replace_contacts=False, batch_size=BATCH_SIZE, progress=None):
+    """This function reads the records of an open NDJSON text file and inserts them in the database in batches, the
+    messages already in the database are skipped, it returns the number of records read and of messages inserted.
+
+    `progress(read, None)` is called every PROGRESS_INTERVAL records and at the end."""
+    batches = {'contact': [], 'sent': [], 'received': []}
+    read, inserted = 0, 0
+
+    def flush(record_type):
+        nonlocal inserted
+        batch = batches[record_type]
+        if not batch:
+            return
+        if record_type == 'contact':
+            dbfunctions.import_contacts(conn, batch, replace_contacts)
+        else:
+            inserted += dbfunctions.import_messages(conn, record_type, batch)
+        batch.clear()
+
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            record_type = record.pop('type')
+            batch = batches[record_type]
+        except (ValueError, KeyError) as e:
+            raise ValueError(f'Invalid record at line {line_number}: {e}') from e
+        if record_type != 'contact':
+            # The contacts of the file are written before its messages
+            flush('contact')
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush(record_type)
+        read += 1
+        if progress and read % PROGRESS_INTERVAL == 0:
+            progress(read, None)
+    for record_type in batches:
+        flush(record_type)
+    if progress:
+        progress(read, None)
+    return read, inserted
+
+
+def print_progress(done, total):
+    """This function prints the progress of an export or import to the standard error"""
+    if total:
+        print(f'\r{done}/{total} records ({done * 100 // max(total, 1)}%)', end='', file=sys.stderr, flush=True)
+    else:
+        print(f'\r{done} records', end='', file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    """This function is the command line interface of the module"""
+    parser = argparse.ArgumentParser(description='Export or import the contacts and messages of Hotline as NDJSON.')
+    parser.add_argument('--database', help='path of hotline.db, the one of the resources folder by default')
+    parser.add_argument('--quiet', action='store_true', help='do not print the progress')
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help='write the contacts and messages to a file')
+    export_parser.add_argument('file', help='the NDJSON file, .gz to compress it, - for the standard output')
+    export_parser.add_argument('--contact', action='append', dest='contacts', metavar='MAC',
+                               help='export only this contact, can be repeated')
+    export_parser.add_argument('--since', type=datetime.datetime.fromisoformat, metavar='TIMESTAMP',
+                               help='export only the messages since this ISO 8601 timestamp')
+    export_parser.add_argument('--no-messages', action='store_true', help='export only the contacts')
+    export_parser.add_argument('--no-archive', action='store_true',
+                               help='do not export the messages of the archive database')
+    import_parser = commands.add_parser('import', help='read the contacts and messages from a file')
+    import_parser.add_argument('file', help='the NDJSON file, .gz if it is compressed, - for the standard input')
+    import_parser.add_argument('--replace-contacts', action='store_true',
+                               help='overwrite the contacts that already exist')
+    args = parser.parse_args(argv)
+
+    if args.database is None:
+        from configuration import debug_database_path
+        args.database = debug_database_path()
+    dbfunctions.set_dbpath(args.database)
+    conn = dbfunctions.get_connection()
+    dbfunctions.upgrade_database(conn)
+    progress = None if args.quiet else print_progress
+    started = datetime.datetime.now()
+    if args.command == 'export':
+        # The archive database only exists after the retention policy has archived some messages
+        archive = not args.no_archive and os.path.exists(dbfunctions.archive_path())
+        if archive:
+            dbfunctions.attach_archive(conn)
+        with open_ndjson(args.file, 'w') as file:
+            written = export_history(conn, file, args.contacts, args.since, not args.no_messages, archive, progress)
+        summary = f'{written} records exported'
+    else:
+        with open_ndjson(args.file, 'r') as file:
+            read, inserted = import_history(conn, file, args.replace_contacts, progress=progress)
+        summary = f'{read} records read, {inserted} new messages imported'
+    elapsed = (datetime.datetime.now() - started).total_seconds()
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(f'{summary} in {elapsed:.1f} s', file=sys.stderr)
+    conn.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -3,7 +3,10 @@
 """This module is the responsible of setting up the application and then start it."""
 
 import dbfunctions
+import dbpool
+import dbwriter
 import configuration
+import eventloop
 import logging
 import sys
 import PyQt5
@@ -21,6 +24,12 @@ if __name__ == '__main__':
             logging.info('Not running as a Python process')
             dbfunctions.set_dbpath(configuration.bundled_database_path(__file__))
             app_icon = configuration.bundled_icon_path(__file__)
+        conn = dbfunctions.get_connection()
+        try:
+            dbfunctions.upgrade_database(conn)
+            dbfunctions.apply_database_settings(conn)
+        finally:
+            conn.close()
     except FileNotFoundError as f:
         logging.critical(f)
         logging.info('Closing application...')
@@ -49,4 +58,7 @@ if __name__ == '__main__':
     window.show()
     exit_code = app.exec_()
     logging.info('Closing app, setting some values in the DB')
+    dbwriter.shutdown()
+    eventloop.shutdown()
+    dbpool.close_all()
     sys.exit(exit_code)
@@ -7,13 +7,24 @@ import json
 import logging
 import socket
 import datetime
+import threading
 import valid
 import dbfunctions
+import dbwriter
 import configuration
+import eventloop
+import framing
 import inter
+import routes
 from PyQt5 import QtCore
 
 MAX_BYTES = 4096
+# Seconds to wait before starting the next connection attempt when racing addresses (RFC 8305 recommends 250 ms)
+HAPPY_EYEBALLS_DELAY = 0.25
+# Seconds the server keeps an idle persistent session open
+SESSION_IDLE_TIMEOUT = 60
+# Seconds the client keeps an idle persistent session in the pool, less than the server so the client closes first
+CLIENT_SESSION_IDLE_TIMEOUT = 30
 
 
 def address_and_family(writer: asyncio.StreamWriter):
@@ -42,11 +53,10 @@ def address_and_family_from_transport(transport: asyncio.transports.BaseTranspor
         return None, None
 
 
-def parse_request(raw_request: bytes):
-    """This function parses the incomming client request"""
-    str_request = raw_request.decode('UTF-8')
+def parse_request(raw_request):
+    """This function parses the incomming client request, given as bytes or str"""
     try:
-        json_request = json.loads(str_request)
+        json_request = json.loads(raw_request)
         subject = json_request['subject']
         if subject == 'message':
             str_sent_timestamp = json_request['sent_timestamp']
@@ -72,6 +82,8 @@ def parse_request(raw_request: bytes):
             request = {'subject': subject}
         else:
             raise ValueError(f"Invalid subject: '{subject}'")
+        if 'id' in json_request:
+            request['id'] = json_request['id']
     except Exception:
         raise
     else:
@@ -119,9 +131,7 @@ async def get_contact_information(ip_address, port=42000, timeout=3):
             request = '{"subject":"get_contact_information"}'.encode('UTF-8')
             writer.write(request)
             await writer.drain()
-            data = await asyncio.wait_for(reader.read(MAX_BYTES), timeout)
-            reply = data.decode('UTF-8')
-            json_contact = json.loads(reply)
+            json_contact = await asyncio.wait_for(framing.read_json(reader), timeout)
             address, family = address_and_family(writer)
             contact = {
                 'name': json_contact['name'],
@@ -150,18 +160,311 @@ async def get_contact_information(ip_address, port=42000, timeout=3):
         raise e
 
 
-async def message_to(ip_address, sender, sent_timestamp, content, receiver, port=42000, timeout=3):
-    """This functions send a `message` request to an specific socket address."""
+async def happy_eyeballs(candidates, attempt, delay=HAPPY_EYEBALLS_DELAY, discard=None, on_failure=None):
+    """This function races `attempt(candidate)` for every candidate in the style of RFC 8305 (Happy Eyeballs).
+
+    The attempts are started in order, a new one starts every `delay` seconds or as soon as the previous one fails. The
+    result of the first attempt that succeeds is returned as a (candidate, result) tuple and the rest of the attempts are
+    cancelled, `discard(result)` is called for the attempts that succeeded too late to be used and
+    `on_failure(candidate, exception)` for the attempts that failed. If every attempt fails the last exception is raised.
+    """
+    candidates = list(candidates)
+    if not candidates:
+        raise ValueError('There are no candidates to race')
+
+    loop = asyncio.get_running_loop()
+    running = {}
+    exceptions = []
+    next_candidate = 0
+    try:
+        while next_candidate < len(candidates) or running:
+            if next_candidate < len(candidates):
+                candidate = candidates[next_candidate]
+                next_candidate += 1
+                running[loop.create_task(attempt(candidate))] = candidate
+
+            stagger = delay if next_candidate < len(candidates) else None
+            done, _ = await asyncio.wait(running, timeout=stagger, return_when=asyncio.FIRST_COMPLETED)
+            winner = None
+            for finished in done:
+                candidate = running.pop(finished)
+                if finished.exception():
+                    logging.debug(f"Attempt with '{candidate}' failed: {finished.exception()}")
+                    exceptions.append(finished.exception())
+                    if on_failure:
+                        on_failure(candidate, finished.exception())
+                elif winner is None:
+                    winner = candidate, finished.result()
+                elif discard:
+                    discard(finished.result())
+
+            if winner:
+                return winner
+    finally:
+        for unfinished in running:
+            unfinished.cancel()
+        for unfinished, result in zip(running, await asyncio.gather(*running, return_exceptions=True)):
+            if discard and not unfinished.cancelled() and not isinstance(result, BaseException):
+                discard(result)
+
+    raise exceptions[-1]
+
+
+def candidate_address(candidate, port):
+    """This function returns the (ip_address, port) of a race candidate, which is an IP address or an (ip_address, port)
+    tuple when the candidate does not use the default port of the race"""
+    if isinstance(candidate, tuple):
+        return candidate
+    return candidate, port
+
+
+async def open_connection_racing(ip_addresses, port=42000, timeout=3, delay=HAPPY_EYEBALLS_DELAY, on_failure=None):
+    """This function races TCP connections to several IP addresses of the same contact and returns the
+    (ip_address, reader, writer) of the first handshake that completes."""
+    async def connect(candidate):
+        return await asyncio.wait_for(asyncio.open_connection(*candidate_address(candidate, port)), timeout)
+
+    def close(connection):
+        connection[1].close()
+
+    ip_address, (reader, writer) = await happy_eyeballs(ip_addresses, connect, delay, discard=close,
+                                                        on_failure=on_failure)
+    return ip_address, reader, writer
+
+
+async def get_contact_information_racing(ip_addresses, port=42000, timeout=3, mac_address=None,
+                                         delay=HAPPY_EYEBALLS_DELAY):
+    """This functions races `get_contact_information` requests to several IP addresses of the same contact and
+    returns the (ip_address, contact) of the first reply, if `mac_address` is given the replies of other users are
+    discarded."""
+    async def request(ip_address):
+        contact = await get_contact_information(ip_address, port, timeout)
+        if mac_address and contact['mac_address'] != mac_address:
+            raise ValueError(f"Unexpected user '{contact['mac_address']}' replied from {ip_address}")
+        return contact
+
+    return await happy_eyeballs(ip_addresses, request, delay)
+
+
+async def send_message(reader, writer, sender, sent_timestamp, content, receiver, timeout=3):
+    """This functions sends a `message` request through an open connection and waits for the confirmation."""
+    request = f'{{"subject":"message","sent_timestamp":"{sent_timestamp}","content":"{content}","sender":"{sender}","receiver":"{receiver}"}}'.encode(
+        'UTF-8')
+    writer.write(request)
+    await writer.drain()
+    return await asyncio.wait_for(framing.read_json(reader), timeout)
+
+
+class SessionUnsupported(Exception):
+    """This exception is raised when a peer closes a new persistent session without replying, like the old servers"""
+
+
+class InboxSession:
+    """This class is the client side of a persistent session with an inbox server, the requests are written as
+    length-prefixed frames and many of them can wait for their replies at the same time"""
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, idle_timeout, on_close=None):
+        self.reader = reader
+        self.writer = writer
+        self.idle_timeout = idle_timeout
+        self.on_close = on_close
+        self.pending = {}
+        self.next_id = 0
+        self.replied = False
+        self.closed = False
+        self.idle_handle = None
+        self.reader_task = asyncio.get_running_loop().create_task(self.read_replies())
+        self.restart_idle_timer()
+
+    async def read_replies(self):
+        """This method reads the replies of the server and hands them to the requests waiting for them"""
+        error = ConnectionResetError('The session was closed')
+        try:
+            while True:
+                reply = json.loads(await framing.read_frame(self.reader))
+                self.replied = True
+                waiter = self.pending.pop(reply.pop('id', None), None)
+                if waiter and not waiter.done():
+                    waiter.set_result(reply)
+        except asyncio.CancelledError:
+            pass
+        except asyncio.IncompleteReadError:
+            pass
+        except Exception as e:
+            error = e
+        finally:
+            for waiter in self.pending.values():
+                if not waiter.done():
+                    waiter.set_exception(error)
+            self.pending.clear()
+            self.close()
+
+    async def request(self, request: dict, timeout=3):
+        """This method sends a request through the session and waits for its reply"""
+        if self.closed:
+            raise ConnectionResetError('The session was closed')
+        self.next_id += 1
+        request_id = self.next_id
+        waiter = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = waiter
+        self.restart_idle_timer()
+        try:
+            self.writer.write(framing.encode_frame(dict(request, id=request_id)))
+            await self.writer.drain()
+            return await asyncio.wait_for(waiter, timeout)
+        finally:
+            self.pending.pop(request_id, None)
+
+    def restart_idle_timer(self):
+        """This method closes the session if it is not used in `idle_timeout` seconds"""
+        if self.idle_handle:
+            self.idle_handle.cancel()
+        self.idle_handle = asyncio.get_running_loop().call_later(self.idle_timeout, self.close)
+
+    def close(self):
+        """This method closes the session"""
+        if not self.closed:
+            self.closed = True
+            self.idle_handle.cancel()
+            self.reader_task.cancel()
+            self.writer.close()
+            if self.on_close:
+                self.on_close(self)
+
+
+class SessionPool:
+    """This class keeps a persistent session per peer (ip_address, port), it must be used from the shared event loop"""
+    def __init__(self, idle_timeout=CLIENT_SESSION_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.legacy_peers = set()
+        self.opening_locks = {}
+
+    def get(self, ip_address, port):
+        """This method returns the open session with a peer or None"""
+        session = self.sessions.get((ip_address, port))
+        if session and not session.closed:
+            return session
+        return None
+
+    def add(self, ip_address, port, reader, writer) -> InboxSession:
+        """This method starts a session over an open connection and keeps it in the pool"""
+        old_session = self.sessions.get((ip_address, port))
+        if old_session:
+            old_session.close()
+
+        def forget(session):
+            if self.sessions.get((ip_address, port)) is session:
+                del self.sessions[(ip_address, port)]
+
+        session = InboxSession(reader, writer, self.idle_timeout, on_close=forget)
+        self.sessions[(ip_address, port)] = session
+        return session
+
+    def opening_lock(self, ip_address, port) -> asyncio.Lock:
+        """This method returns the lock held while a session with a peer is started, the requests sent to the peer at
+        the same time wait for it and share the session instead of replacing it with their own connections"""
+        lock = self.opening_locks.get((ip_address, port))
+        if lock is None:
+            lock = self.opening_locks[(ip_address, port)] = asyncio.Lock()
+        return lock
+
+    def supports_sessions(self, ip_address, port):
+        """This method tells if a peer has not been detected as an old server"""
+        return (ip_address, port) not in self.legacy_peers
+
+    def mark_legacy(self, ip_address, port):
+        """This method remembers that a peer is an old server that only accepts a request per connection"""
+        logging.info(f'{ip_address}:{port} does not support persistent sessions')
+        self.legacy_peers.add((ip_address, port))
+
+    def close(self):
+        """This method closes every session of the pool"""
+        for session in list(self.sessions.values()):
+            session.close()
+
+
+_session_pool = None
+_session_pool_lock = threading.Lock()
+
+
+def get_session_pool() -> SessionPool:
+    """This function returns the pool of persistent sessions of the application"""
+    global _session_pool
+    with _session_pool_lock:
+        if _session_pool is None:
+            _session_pool = SessionPool()
+        return _session_pool
+
+
+async def start_session(pool: SessionPool, ip_address, port, connection, request: dict, timeout=3):
+    """This function starts a persistent session with a peer over an open connection and sends its first request,
+    SessionUnsupported is raised if the peer is an old server."""
+    session = pool.add(ip_address, port, *connection)
+    try:
+        return await session.request(request, timeout)
+    except (ConnectionError, asyncio.IncompleteReadError) as e:
+        if not session.replied:
+            pool.mark_legacy(ip_address, port)
+            raise SessionUnsupported(f'{ip_address}:{port} closed the session without replying') from e
+        raise
+
+
+async def session_request(pool: SessionPool, ip_address, port, request: dict, timeout=3, connection=None):
+    """This function sends a request through the persistent session with a peer, the session is reused if the pool has
+    one or started over `connection` or a new connection otherwise. SessionUnsupported is raised if the peer is an old
+    server.
+
+    Only a request at a time starts the session of a peer, the first reply tells if the peer supports sessions, the
+    requests sent at the same time wait for it and are then sent through the same session."""
+    if connection is None:
+        session = pool.get(ip_address, port)
+        if session:
+            try:
+                return await session.request(request, timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                logging.info(f'The session with {ip_address}:{port} was closed, starting a new one')
+    try:
+        async with pool.opening_lock(ip_address, port):
+            if not pool.supports_sessions(ip_address, port):
+                raise SessionUnsupported(f'{ip_address}:{port} does not support persistent sessions')
+            session = pool.get(ip_address, port)
+            if session is None:
+                if connection is None:
+                    connection = await asyncio.wait_for(asyncio.open_connection(ip_address, port), timeout)
+                session_connection, connection = connection, None
+                return await start_session(pool, ip_address, port, session_connection, request, timeout)
+    finally:
+        if connection is not None:
+            # The connection raced by the caller is not needed, a session was started while it was opened
+            connection[1].close()
+    return await session.request(request, timeout)
+
+
+def message_request(sender, sent_timestamp, content, receiver):
+    """This function builds a `message` request"""
+    return {
+        'subject': 'message',
+        'sent_timestamp': sent_timestamp,
+        'content': content,
+        'sender': sender,
+        'receiver': receiver
+    }
+
+
+async def message_to(ip_address, sender, sent_timestamp, content, receiver, port=42000, timeout=3, pool=None):
+    """This functions send a `message` request to an specific socket address, through a persistent session if a
+    SessionPool is given."""
+    if pool and pool.supports_sessions(ip_address, port):
+        try:
+            return await session_request(pool, ip_address, port,
+                                         message_request(sender, sent_timestamp, content, receiver), timeout)
+        except SessionUnsupported:
+            logging.info('Sending the message in a single request connection')
+
     received_confirmation = None
     try:
         reader, writer = await asyncio.wait_for(asyncio.open_connection(ip_address, port), timeout)
-        request = f'{{"subject":"message","sent_timestamp":"{sent_timestamp}","content":"{content}","sender":"{sender}","receiver":"{receiver}"}}'.encode(
-            'UTF-8')
-        writer.write(request)
-        await writer.drain()
-        data = await asyncio.wait_for(reader.read(MAX_BYTES), timeout)
-        reply = data.decode('UTF-8')
-        received_confirmation = json.loads(reply)
+        received_confirmation = await send_message(reader, writer, sender, sent_timestamp, content, receiver, timeout)
     except Exception:
         raise
     else:
@@ -171,6 +474,46 @@ async def message_to(ip_address, sender, sent_timestamp, content, receiver, port
         await writer.wait_closed()
 
 
+async def message_to_racing(ip_addresses, sender, sent_timestamp, content, receiver, port=42000, timeout=3,
+                            delay=HAPPY_EYEBALLS_DELAY, on_failure=None, pool=None):
+    """This functions races the connection to several IP addresses of the same contact and sends the `message`
+    request only through the first connection established, it returns the (ip_address, received_confirmation).
+
+    If a SessionPool is given and it has an open session with one of the addresses the message is sent through it
+    without racing, otherwise the winner connection becomes a persistent session."""
+    if pool:
+        request = message_request(sender, sent_timestamp, content, receiver)
+        for candidate in ip_addresses:
+            address, candidate_port = candidate_address(candidate, port)
+            if pool.get(address, candidate_port):
+                try:
+                    return candidate, await session_request(pool, address, candidate_port, request, timeout)
+                except Exception as e:
+                    logging.info(f'Could not use the session with {address}:{candidate_port}: {e}')
+                break
+
+    ip_address, reader, writer = await open_connection_racing(ip_addresses, port, timeout, delay, on_failure)
+    address, candidate_port = candidate_address(ip_address, port)
+    if pool and pool.supports_sessions(address, candidate_port):
+        try:
+            received_confirmation = await session_request(pool, address, candidate_port, request, timeout,
+                                                          connection=(reader, writer))
+        except SessionUnsupported:
+            received_confirmation = await message_to(address, sender, sent_timestamp, content, receiver,
+                                                     candidate_port, timeout)
+        return ip_address, received_confirmation
+
+    try:
+        received_confirmation = await send_message(reader, writer, sender, sent_timestamp, content, receiver, timeout)
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+    return ip_address, received_confirmation
+
+
 async def confirm_received(writer, receiver, received_timestamp):
     """This functions writes a `received_confirmation` to a client socket."""
     confirmation = f'{{"received_timestamp":"{received_timestamp}","receiver":"{receiver}"}}'.encode('UTF-8')
@@ -239,10 +582,8 @@ async def handle_client(reader, writer):
     data = await reader.read(MAX_BYTES)
     request = parse_request(data)
     if request:
-        conn = dbfunctions.get_connection()
-        mac_address, name, ipv4_address, ipv6_address, inbox_port, ftp_port = dbfunctions.get_configuration(
-            conn, 'mac_address', 'username', 'ipv4_address', 'ipv6_address', 'inbox_port', 'ftp_port')
-        conn.close()
+        mac_address, name, ipv4_address, ipv6_address, inbox_port, ftp_port = dbfunctions.cached_configuration(
+            'mac_address', 'username', 'ipv4_address', 'ipv6_address', 'inbox_port', 'ftp_port')
         if mac_address:
             if request['subject'] == 'message':
                 peer_address, peer_family = address_and_family(writer)
@@ -289,9 +630,19 @@ class InboxServerSignals(QtCore.QObject):
 
 
 class InboxServerProtocol(asyncio.Protocol):
-    """This is the class that defines the thread where the message receiver server runs"""
+    """This is the class that defines the thread where the message receiver server runs.
+
+    A client whose first byte is '{' is an old client that sends a single JSON request and expects the connection to be
+    closed after the reply, any other client speaks the persistent session protocol: length-prefixed frames carrying
+    JSON requests with an `id` that is echoed in the replies, many of them pipelined on the same connection, which is
+    closed after SESSION_IDLE_TIMEOUT seconds without requests. The requests are decoded incrementally, so they can
+    arrive split in several segments or several of them in the same segment."""
     def __init__(self, signals: InboxServerSignals):
         self.signals = signals
+        self.transport = None
+        self.decoder = None
+        self.reply_function = None
+        self.idle_handle = None
 
     def connection_made(self, transport: asyncio.transports.BaseTransport) -> None:
         """When a client connects to the server"""
@@ -299,75 +650,69 @@ class InboxServerProtocol(asyncio.Protocol):
         logging.info('Connection from {}'.format(peername))
         self.transport = transport
 
+    def connection_lost(self, exc) -> None:
+        """When the connection with the client is closed"""
+        if self.idle_handle:
+            self.idle_handle.cancel()
+
     def data_received(self, data: bytes) -> None:
         """When a client sends data to the server"""
-        request = parse_request(data)
+        if self.decoder is None:
+            if data[:1] == b'{':
+                self.decoder, self.reply_function = framing.JsonDecoder(), self.reply
+            else:
+                self.decoder, self.reply_function = framing.FrameDecoder(), self.reply_frame
+
+        try:
+            requests = self.decoder.feed(data)
+        except framing.FrameError as e:
+            logging.error(f'Closing the connection, {e}')
+            self.transport.close()
+            return
+
+        for raw_request in requests:
+            if not self.handle_request(raw_request, self.reply_function) or isinstance(self.decoder, framing.JsonDecoder):
+                self.transport.close()
+                return
+        self.restart_idle_timer()
+
+    def restart_idle_timer(self):
+        """This method closes the session if the client does not send another request in SESSION_IDLE_TIMEOUT seconds"""
+        if self.idle_handle:
+            self.idle_handle.cancel()
+        self.idle_handle = asyncio.get_running_loop().call_later(SESSION_IDLE_TIMEOUT, self.transport.close)
+
+    def reply(self, reply: dict, request: dict):
+        """This method writes the reply to an old client"""
+        self.transport.write(json.dumps(reply).encode('UTF-8'))
+
+    def reply_frame(self, reply: dict, request: dict):
+        """This method writes the reply to a request of a persistent session"""
+        self.transport.write(framing.encode_frame(dict(reply, id=request.get('id'))))
+
+    def handle_request(self, data, reply) -> bool:
+        """This method processes a request and writes its reply calling `reply(reply, request)`, it returns False if the
+        request could not be processed"""
+        try:
+            request = parse_request(data)
+        except Exception as e:
+            logging.error(f"Could not parse the request: {e}")
+            return False
         if request:
-            conn = dbfunctions.get_connection()
-            mac_address, name, ipv4_address, ipv6_address, inbox_port, ftp_port = dbfunctions.get_configuration(
-                conn, 'mac_address', 'username', 'ipv4_address', 'ipv6_address', 'inbox_port', 'ftp_port')
-            conn.close()
+            mac_address, name, ipv4_address, ipv6_address, inbox_port, ftp_port = dbfunctions.cached_configuration(
+                'mac_address', 'username', 'ipv4_address', 'ipv6_address', 'inbox_port', 'ftp_port')
             if mac_address:
                 peer_address, peer_family = address_and_family_from_transport(self.transport)
                 if request['subject'] == 'message':
                     received_timestamp = datetime.datetime.now().isoformat()
 
                     ### CONFIRM RECEIVED
-                    confirmation = f'{{"received_timestamp":"{received_timestamp}","receiver":"{mac_address}"}}'.encode(
-                        'UTF-8')
-                    self.transport.write(confirmation)
+                    reply({"received_timestamp": received_timestamp, "receiver": mac_address}, request)
                     ### CONFIRM RECEIVED
 
                     ### RECEIVE MESSAGE
                     if mac_address == request['receiver']:
-                        try:
-                            conn = dbfunctions.get_connection()
-                            try:
-                                exists = dbfunctions.get_contact(conn, request['sender'], 'name')
-                            except Exception as e:
-                                exists = False
-                            else:
-                                exists = True
-
-                            is_stranger = False
-                            if not exists:
-                                logging.info(f"The contact {request['sender']} does not exist, adding him to db")
-                                is_stranger = True
-                                if peer_address:
-                                    if peer_family == socket.AF_INET:
-                                        dbfunctions.insert_contact(conn, request['sender'], name='Stranger',
-                                                                   ipv4_address=peer_address)
-                                        logging.info(f"The contact {request['sender']} was added")
-                                    elif peer_family == socket.AF_INET6:
-                                        dbfunctions.insert_contact(conn, request['sender'], name='Stranger',
-                                                                   ipv6_address=peer_address)
-                                        logging.info(f"The contact {request['sender']} was added")
-                                    else:
-                                        dbfunctions.insert_contact(conn, request['sender'], name='Stranger')
-                                        logging.info(f"The contact {request['sender']} was added")
-                                else:
-                                    dbfunctions.insert_contact(conn, request['sender'], name='Stranger')
-                                    logging.info(f"The contact {request['sender']} was added")
-
-                            ipv = None
-                            if peer_address:
-                                if peer_family == socket.AF_INET:
-                                    ipv = 4
-                                    dbfunctions.update_contact(conn, request['sender'], ipv4_address=peer_address)
-                                elif peer_family == socket.AF_INET6:
-                                    ipv = 6
-                                    dbfunctions.update_contact(conn, request['sender'], ipv6_address=peer_address)
-
-                            dbfunctions.insert_received_message(conn, received_timestamp, request['sender'],
-                                                                request['content'],
-                                                                request['sent_timestamp'])
-                            signal_info = {"mac_address": request['sender'], "is_stranger": is_stranger, "ipv": ipv,
-                                           "ip": peer_address}
-                            self.signals.on_message_received.emit(signal_info)
-                        except Exception as e:
-                            logging.error(e)
-                        finally:
-                            conn.close()
+                        dbwriter.get_writer().put(request, received_timestamp, peer_address, peer_family, self.signals)
                     else:
                         logging.info(f"I received a message that was for '{request['receiver']}'")
                     ### RECEIVE MESSAGE
@@ -376,22 +721,22 @@ class InboxServerProtocol(asyncio.Protocol):
                     self.signals.on_get_contact_information.emit(peer_address)
 
                     ### DELIVER CONTACT INFORMATION
-                    contact_info = json.dumps({
+                    reply({
                         "name": name,
                         "mac_address": mac_address,
                         "ipv4_address": ipv4_address,
                         "ipv6_address": ipv6_address,
                         "inbox_port": inbox_port,
                         "ftp_port": ftp_port
-                    }).encode('UTF-8')
-                    self.transport.write(contact_info)
+                    }, request)
                     ### DELIVER CONTACT INFORMATION
             else:
                 logging.critical(f"Could not obtain the user information from the database")
+                return False
         else:
             logging.error(f"Could not parse the request")
-
-        self.transport.close()
+            return False
+        return True
 
 
 async def run_inbox_server(ip, port, signals):
@@ -419,17 +764,17 @@ class InboxServerThread(QtCore.QRunnable):
             self.signals.on_error.emit(e)
 
 class SmartSendMessageSignals(QtCore.QObject):
-    """This class defines the signals or events of a SmartSendMessageThread"""
+    """This class defines the signals or events of a SmartSendMessageTask"""
     # remote_name, remote_mac
     on_fail = QtCore.pyqtSignal(str, str)
     # received_confirmation, sent_timestamp, message, IPv used (4, 6, 6lleui64), contact_information
     on_success = QtCore.pyqtSignal(dict, str, str, str, dict)
 
 
-class SmartSendMessageThread(QtCore.QRunnable):
-    """This is the class that defines the thread to send a message."""
-    def __init__(self, ip4, ip6, port, remote_mac, local_mac, inter_ip, inter_port, inter_password, message, name, timeout=3):
-        super(SmartSendMessageThread, self).__init__()
+class SmartSendMessageTask:
+    """This is the class that defines the task to send a message, it runs in the shared event loop."""
+    def __init__(self, ip4, ip6, port, remote_mac, local_mac, inter_ip, inter_port, inter_password, message, name, timeout=3,
+                 racing=True, persistent_sessions=False):
         self.name = name
         self.port = port
         self.remote_mac = remote_mac
@@ -443,104 +788,212 @@ class SmartSendMessageThread(QtCore.QRunnable):
         self.i_requested_info_before = False
         self.message = message
         self.timeout = timeout
+        self.racing = racing
+        self.pool = get_session_pool() if persistent_sessions else None
         self.signals = SmartSendMessageSignals()
         self.new_contact_info = {}
 
-    def run(self) -> None:
-        """This method is called when the SmartSentMessageThread starts"""
+    def start(self) -> eventloop.CoroutineSignals:
+        """This method starts sending the message in the shared event loop"""
+        return eventloop.submit_to_qt(self.send(), on_error=self.unexpected_error, owner=self)
+
+    def unexpected_error(self, e):
+        """This method is called when sending the message failed with an unexpected error"""
+        logging.error(f'Could not send the message to {self.name} {self.remote_mac}: {e!r}')
+        self.signals.on_fail.emit(self.name, self.remote_mac)
+
+    async def send(self):
+        """This method sends the message racing the addresses of the contact or trying them one after another"""
+        if self.racing:
+            await self.sm_race()
+        else:
+            route = await eventloop.run_blocking(routes.preferred_route, self.remote_mac)
+            if route:
+                await self.sm_route(*route)
+            else:
+                await self.sm_addresses()
+
+    async def sm_addresses(self):
+        """This method tries the addresses of the contact one after another"""
         if self.ip4 and self.ip6:
-            self.sm_ip4_ip6()
+            await self.sm_ip4_ip6()
         elif self.ip4 and not self.ip6:
-            self.sm_ip4_noip6()
+            await self.sm_ip4_noip6()
         elif not self.ip4 and self.ip6:
-            self.sm_noip4_ip6()
+            await self.sm_noip4_ip6()
         elif not self.ip4 and not self.ip6:
-            self.sm_noip4_noip6()
+            await self.sm_noip4_noip6()
+
+    def candidates(self):
+        """This method returns the ((address, port), IPv used) pairs to reach the contact in order of preference, the
+        route that worked the last time goes first and the addresses that failed recently are skipped"""
+        candidates = []
+        for address, ipv in ((self.ip4, '4'), (self.ip6, '6'), (self.ip6lleui64, '6lleui64')):
+            if address and (address, self.port) not in [candidate for candidate, _ in candidates]:
+                candidates.append(((address, self.port), ipv))
+        route = routes.preferred_route(self.remote_mac)
+        if route:
+            address, port, ipv = route
+            candidates = [candidate for candidate in candidates if candidate[0] != (address, port)]
+            candidates.insert(0, ((address, port), ipv))
+        fresh = [candidate for candidate in candidates if not routes.failed_recently(self.remote_mac, *candidate[0])]
+        return fresh or candidates
+
+    async def remember(self, address, port, ipv, success):
+        """This method records in the route cache if an address of the contact worked or not"""
+        if success:
+            await eventloop.run_blocking(routes.record_success, self.remote_mac, address, port, ipv)
+        else:
+            await eventloop.run_blocking(routes.record_failure, self.remote_mac, address, port, ipv)
+
+    async def sm_race(self):
+        """This method races the connection to every address of the contact and sends the message by the first one"""
+        candidates = await eventloop.run_blocking(self.candidates)
+        families = dict(candidates)
+        failed = []
+        logging.info(f"Racing the connection to {self.name} using "
+                     f"{', '.join(f'{address}:{port}' for address, port in families)}")
+        try:
+            sent_timestamp = datetime.datetime.now().isoformat()
+            candidate, recv_conf = await message_to_racing(
+                list(families), self.local_mac, sent_timestamp, self.message, self.remote_mac, self.port, self.timeout,
+                on_failure=lambda failure, e: failed.append(failure), pool=self.pool)
+        except Exception as e:
+            for failure in failed:
+                await self.remember(*failure, families[failure], False)
+            logging.info(f'Could not send the message by any address, requesting information')
+            await self.req_information()
+        else:
+            for failure in failed:
+                await self.remember(*failure, families[failure], False)
+            logging.info(f'The message was sent using {candidate[0]}:{candidate[1]}')
+            if recv_conf.get('receiver') == self.remote_mac:
+                logging.info('The message was delivered to the correct contact')
+                await self.remember(*candidate, families[candidate], True)
+                self.signals.on_success.emit(recv_conf, sent_timestamp, self.message, families[candidate],
+                                             self.new_contact_info)
+            else:
+                logging.info('The message was delivered to the incorrect contact, requesting information')
+                await self.remember(*candidate, families[candidate], False)
+                await self.req_information()
+
+    async def sm_route(self, address, port, ipv):
+        """This method send the message using the route that worked the last time"""
+        logging.info(f'Trying with the last route that worked for {self.name}: {address}:{port}')
+        try:
+            sent_timestamp = datetime.datetime.now().isoformat()
+            recv_conf = await message_to(address, self.local_mac, sent_timestamp, self.message, self.remote_mac, port,
+                                         self.timeout, self.pool)
+        except Exception as e:
+            logging.info(f'Could not send the message by the last route that worked')
+            await self.remember(address, port, ipv, False)
+            await self.sm_addresses()
+        else:
+            logging.info(f'The message was sent')
+            if recv_conf.get('receiver') == self.remote_mac:
+                logging.info('The message was delivered to the correct contact')
+                await self.remember(address, port, ipv, True)
+                self.signals.on_success.emit(recv_conf, sent_timestamp, self.message, ipv, self.new_contact_info)
+            else:
+                logging.info('The message was delivered to the incorrect contact, trying with the other addresses')
+                await self.remember(address, port, ipv, False)
+                await self.sm_addresses()
 
-    def sm_ip4_ip6(self):
+    async def sm_ip4_ip6(self):
         """This method send the message using the IPv4 address"""
         logging.info(f'{self.name} has IPv4 and IPv6 address, trying with IPv4')
         try:
             sent_timestamp = datetime.datetime.now().isoformat()
-            recv_conf = asyncio.run(message_to(self.ip4, self.local_mac, sent_timestamp, self.message, self.remote_mac, self.port, self.timeout))
+            recv_conf = await message_to(self.ip4, self.local_mac, sent_timestamp, self.message, self.remote_mac, self.port, self.timeout, self.pool)
         except Exception as e:
             logging.info(f'Could not send the message by IPv4')
-            self.sm_noip4_ip6()
+            await self.remember(self.ip4, self.port, '4', False)
+            await self.sm_noip4_ip6()
         else:
             logging.info(f'The message was sent')
             if recv_conf.get('receiver') == self.remote_mac:
                 logging.info('The message was delivered to the correct contact')
+                await self.remember(self.ip4, self.port, '4', True)
                 self.signals.on_success.emit(recv_conf, sent_timestamp, self.message, '4', self.new_contact_info)
             else:
                 logging.info('The message was delivered to the incorrect contact, requesting information')
-                self.req_information()
+                await self.remember(self.ip4, self.port, '4', False)
+                await self.req_information()
 
-    def sm_noip4_ip6(self):
+    async def sm_noip4_ip6(self):
         """This method send the message using the IPv6 address"""
         logging.info(f'{self.name} has IPv6 address, trying with IPv6')
         try:
             sent_timestamp = datetime.datetime.now().isoformat()
-            recv_conf = asyncio.run(message_to(self.ip6, self.local_mac, sent_timestamp, self.message, self.remote_mac, self.port, self.timeout))
+            recv_conf = await message_to(self.ip6, self.local_mac, sent_timestamp, self.message, self.remote_mac, self.port, self.timeout, self.pool)
         except Exception as e:
             logging.info(f'Could not send the message by IPv6')
-            self.sm_noip4_noip6()
+            await self.remember(self.ip6, self.port, '6', False)
+            await self.sm_noip4_noip6()
         else:
             logging.info(f'The message was sent')
             if recv_conf.get('receiver') == self.remote_mac:
                 logging.info('The message was delivered to the correct contact')
+                await self.remember(self.ip6, self.port, '6', True)
                 self.signals.on_success.emit(recv_conf, sent_timestamp, self.message, '6', self.new_contact_info)
                 # Avisa que la IPv4 deberia ser eliminada
                 # Recurrí a IPv4, IPv6 , solo la ultima funciono, por lo tanto deberias eliminar la IPv4
             else:
                 logging.info('The message was delivered to the incorrect contact, requesting information')
-                self.req_information()
+                await self.remember(self.ip6, self.port, '6', False)
+                await self.req_information()
 
-    def sm_ip4_noip6(self):
+    async def sm_ip4_noip6(self):
         """This method send the message using the IPv4 address"""
         logging.info(f'{self.name} has IPv4 address, trying with IPv4')
         try:
             sent_timestamp = datetime.datetime.now().isoformat()
-            recv_conf = asyncio.run(message_to(self.ip4, self.local_mac, sent_timestamp, self.message, self.remote_mac, self.port, self.timeout))
+            recv_conf = await message_to(self.ip4, self.local_mac, sent_timestamp, self.message, self.remote_mac, self.port, self.timeout, self.pool)
         except Exception as e:
             logging.info(f'Could not send the message by IPv4')
-            self.sm_noip4_noip6()
+            await self.remember(self.ip4, self.port, '4', False)
+            await self.sm_noip4_noip6()
         else:
             logging.info(f'The message was sent')
             if recv_conf.get('receiver') == self.remote_mac:
                 logging.info('The message was delivered to the correct contact')
+                await self.remember(self.ip4, self.port, '4', True)
                 self.signals.on_success.emit(recv_conf, sent_timestamp, self.message, '4', self.new_contact_info)
             else:
                 logging.info('The message was delivered to the incorrect contact, requesting information')
-                self.req_information()
+                await self.remember(self.ip4, self.port, '4', False)
+                await self.req_information()
 
-    def sm_noip4_noip6(self):
+    async def sm_noip4_noip6(self):
         """This method send the message using the IPv6 link local EUI-64 address"""
         logging.info(f'{self.name} has not IPv4 or IPv6 address, trying with IPv6 LL EUI-64 address')
         if self.ip6 == self.ip6lleui64:
             logging.info(f'The IPv6 address is the same as the IPv6 LL EUI-64 address, requesting information')
-            self.req_information()
+            await self.req_information()
         else:
             logging.info(f'The IPv6 address is different to the IPv6 LL EUI-64 address')
             try:
                 sent_timestamp = datetime.datetime.now().isoformat()
-                recv_conf = asyncio.run(
-                    message_to(self.ip6lleui64, self.local_mac, sent_timestamp, self.message, self.remote_mac, self.port,
-                               self.timeout))
+                recv_conf = await message_to(self.ip6lleui64, self.local_mac, sent_timestamp, self.message,
+                                             self.remote_mac, self.port, self.timeout, self.pool)
             except Exception as e:
                 logging.info(f'Could not send the message by IPv6 LL EUI-64, requesting information')
-                self.req_information()
+                await self.remember(self.ip6lleui64, self.port, '6lleui64', False)
+                await self.req_information()
             else:
                 logging.info(f'The message was sent')
                 if recv_conf.get('receiver') == self.remote_mac:
                     logging.info('The message was delivered to the correct contact')
+                    await self.remember(self.ip6lleui64, self.port, '6lleui64', True)
                     self.signals.on_success.emit(recv_conf, sent_timestamp, self.message, '6lleui64', self.new_contact_info)
                     # Recurrí a IPv4, IPv6 e IPv6 LL, solo la ultima funciono, por lo tanto deberias actualizar
                     # la ipv6 y eliminar la IPv4
                 else:
                     logging.info('The message was delivered to the incorrect contact, requesting information')
-                    self.req_information()
+                    await self.remember(self.ip6lleui64, self.port, '6lleui64', False)
+                    await self.req_information()
 
-    def req_information(self):
+    async def req_information(self):
         """This method request information to an Interlocutor server"""
         # Ive tried with IPv4, IPv6 and IPv6 LL EUI-64 and no one has worked.
         # Im going to ask for information to the Interlocutor
@@ -552,8 +1005,8 @@ class SmartSendMessageThread(QtCore.QRunnable):
             logging.info(f'Requesting information to Interlocutor server {self.inter_ip}...')
             try:
                 req = inter.get_by_mac(self.remote_mac)
-                ci = asyncio.run(
-                    req.send_to(self.inter_ip, self.inter_port, timeout=self.timeout, password=self.inter_password))
+                ci = await req.send_to(self.inter_ip, self.inter_port, timeout=self.timeout,
+                                       password=self.inter_password)
             except Exception as e:
                 logging.info('Could not request information to the Interlocutor server')
                 self.signals.on_fail.emit(self.name, self.remote_mac)
@@ -575,7 +1028,7 @@ class SmartSendMessageThread(QtCore.QRunnable):
                         else:
                             try:
                                 logging.info(f'Requesting information to {self.name} using {ip4}:{port}...')
-                                ci = asyncio.run(get_contact_information(ip4, port, self.timeout))
+                                ci = await get_contact_information(ip4, port, self.timeout)
                             except Exception as e:
                                 logging.info('Could not request information')
                                 self.signals.on_fail.emit(self.name, self.remote_mac)
@@ -588,14 +1041,7 @@ class SmartSendMessageThread(QtCore.QRunnable):
                                         self.ip6 = ci['ipv6_address']
                                         self.port = ci['inbox_port']
                                         self.new_contact_info = ci
-                                        if self.ip4 and self.ip6:
-                                            self.sm_ip4_ip6()
-                                        elif self.ip4 and not self.ip6:
-                                            self.sm_ip4_noip6()
-                                        elif not self.ip4 and self.ip6:
-                                            self.sm_noip4_ip6()
-                                        elif not self.ip4 and not self.ip6:
-                                            self.sm_noip4_noip6()
+                                        await self.send()
                                     except Exception as e:
                                         self.signals.on_fail.emit(self.name, self.remote_mac)
                                 else:
@@ -4,7 +4,7 @@
 
 import asyncio
 import logging
-import json
+import framing
 
 _THE_MOST_COMMON_NAME_IN_THE_WORLD = 'Muhammad'
 _GET = 'get'
@@ -42,10 +42,8 @@ class _Base:
 
         # Read / Receive
         try:
-            reply = await asyncio.wait_for(reader.read(65_535), timeout)
-            logging.info(f'{len(reply)} byte(s) were received')
-            reply = reply.decode('UTF-8')
-            reply = json.loads(reply)
+            reply = await asyncio.wait_for(framing.read_json(reader), timeout)
+            logging.info(f'The reply to the {self.method} was received')
             return reply
         except Exception as e:
             raise e
@@ -0,0 +1,595 @@
+# Author: Jorge Alarcon Alvarez
+# Email: jorge4larcon@gmail.com
+"""This module defines the item models of the tables of the user interface, they keep the rows in plain Python objects
+and give the views only the rows they show, instead of creating a widget or an item for every cell."""
+
+import datetime
+import logging
+import contactindex
+import dbfunctions
+import valid
+from PyQt5 import QtCore, QtWidgets
+
+
+class ContactsTableModel(QtCore.QAbstractTableModel):
+    """This model shows the contacts of the database, they are read in pages of FETCH_SIZE contacts ordered by name as
+    the view is scrolled, the edits are validated and saved in the database and the rows are updated in place.
+
+    The search index of the contacts is built in another thread (see task.BuildContactSearchIndexThread) and given to
+    the model with setSearchIndex, meanwhile the searches query the database and the changes to the index are kept to
+    apply them to the new one."""
+    NAME, MAC_ADDRESS, IPV4_ADDRESS, IPV6_ADDRESS, INBOX_PORT, FTP_PORT, CHAT, FILES, UPDATE, DELETE = range(10)
+    HEADERS = ['Name', 'MAC address', 'IPv4 address', 'IPv6 address', 'Inbox port', 'FTP port', 'CHAT', 'FILES',
+               'UPDATE', 'DELETE']
+    FIELDS = ['name', 'mac_address', 'ipv4_address', 'ipv6_address', 'inbox_port', 'ftp_port']
+    ACTIONS = {CHAT: 'Chat', FILES: 'Files', UPDATE: 'Update', DELETE: 'Delete'}
+    EDITABLE = (NAME, IPV4_ADDRESS, IPV6_ADDRESS, INBOX_PORT, FTP_PORT)
+    FETCH_SIZE = 256
+
+    # mac_address, field, new value
+    contactEdited = QtCore.pyqtSignal(str, str, 'PyQt_PyObject')
+    # error message
+    editFailed = QtCore.pyqtSignal(str)
+    searchIndexReady = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None):
+        super(ContactsTableModel, self).__init__(parent)
+        self.contacts = []
+        self.rows = {}
+        self.lastKey = None
+        self.exhausted = False
+        self.searchIndex = None
+        self.searchIndexChanges = []
+        self.searchIndexGeneration = 0
+
+    def reload(self) -> int:
+        """This method forgets the contacts read, the view reads them again from the first page, and discards the
+        search index, it returns the generation of the index to build"""
+        self.beginResetModel()
+        self.contacts, self.rows = [], {}
+        self.lastKey, self.exhausted = None, False
+        self.searchIndex, self.searchIndexChanges = None, []
+        self.searchIndexGeneration += 1
+        self.endResetModel()
+        return self.searchIndexGeneration
+
+    def setSearchIndex(self, generation, index):
+        """This method replaces the search index with one built with every contact of the database, after applying
+        to it the changes made while it was being built"""
+        if generation != self.searchIndexGeneration:  # The contacts were reloaded again meanwhile
+            return
+        for method, mac_address, fields in self.searchIndexChanges:
+            getattr(index, method)(mac_address, **fields)
+        self.searchIndex, self.searchIndexChanges = index, []
+        self.searchIndexReady.emit()
+
+    def indexContact(self, method, mac_address, **fields):
+        """This method adds, updates or removes a contact of the search index, or keeps the change if the index is
+        being built"""
+        if self.searchIndex is None:
+            self.searchIndexChanges.append((method, mac_address, fields))
+        else:
+            getattr(self.searchIndex, method)(mac_address, **fields)
+
+    def searchContacts(self, pattern, fields=contactindex.FIELDS) -> set:
+        """This method returns the MAC addresses of the contacts with a field of `fields` starting with the pattern"""
+        if self.searchIndex is not None:
+            return self.searchIndex.search(pattern, fields)
+        conn = dbfunctions.get_connection()
+        try:
+            return dbfunctions.search_contacts(conn, pattern, fields, contactindex.SEARCH_LIMIT)
+        finally:
+            conn.close()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.contacts)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.HEADERS[section]
+        return super(ContactsTableModel, self).headerData(section, orientation, role)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = index.column()
+        if column in self.ACTIONS:
+            if role == QtCore.Qt.DisplayRole:
+                return self.ACTIONS[column]
+            if role == QtCore.Qt.TextAlignmentRole:
+                return QtCore.Qt.AlignCenter
+            return None
+        if role in (QtCore.Qt.DisplayRole, QtCore.Qt.EditRole):
+            value = self.contacts[index.row()][self.FIELDS[column]]
+            if column in (self.INBOX_PORT, self.FTP_PORT):
+                return value if value is not None else 0
+            return value if value is not None else ''
+        return None
+
+    def flags(self, index):
+        flags = super(ContactsTableModel, self).flags(index)
+        if index.isValid() and index.column() in self.EDITABLE:
+            flags |= QtCore.Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        """This method validates and saves in the database the value edited in a cell"""
+        if not index.isValid() or role != QtCore.Qt.EditRole or index.column() not in self.EDITABLE:
+            return False
+        contact = self.contacts[index.row()]
+        field = self.FIELDS[index.column()]
+        if value == contact[field]:
+            return False
+        try:
+            if field == 'name':
+                valid.is_name(value, exception=True)
+            elif field == 'ipv4_address' and value:
+                valid.is_ipv4_address(value, exception=True)
+            elif field == 'ipv6_address' and value:
+                valid.is_ipv6_address(value, exception=True)
+            elif field in ('inbox_port', 'ftp_port') and not 0 <= int(value) <= 65535:
+                raise ValueError(f"Invalid port: '{value}'")
+            conn = dbfunctions.get_connection()
+            try:
+                dbfunctions.update_contact(conn, contact['mac_address'], **{field: value})
+            finally:
+                conn.close()
+        except Exception as e:
+            logging.error(e)
+            self.editFailed.emit(f'{e}')
+            return False
+
+        logging.info(f"New value '{value}' for field '{field}' for user '{contact['mac_address']}'")
+        contact[field] = value
+        self.indexContact('update', contact['mac_address'], **{field: value})
+        self.dataChanged.emit(index, index, [QtCore.Qt.DisplayRole, QtCore.Qt.EditRole])
+        self.contactEdited.emit(contact['mac_address'], field, value)
+        return True
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        """This method reads the next page of contacts"""
+        if parent.isValid() or self.exhausted:
+            return
+        conn = dbfunctions.get_connection()
+        try:
+            page = dbfunctions.contacts_page(conn, self.lastKey, self.FETCH_SIZE)
+        finally:
+            conn.close()
+        if len(page) < self.FETCH_SIZE:
+            self.exhausted = True
+        if page:
+            self.lastKey = page[-1]['name'], page[-1]['mac_address']
+        # The contacts added since the view was loaded are already at the end
+        self._appendContacts(contact for contact in page if contact['mac_address'] not in self.rows)
+
+    def fetchContacts(self, mac_addresses):
+        """This method reads the contacts of `mac_addresses` that have not been read yet, so a search can show the
+        contacts of the pages not fetched"""
+        missing = [mac_address for mac_address in mac_addresses if mac_address not in self.rows]
+        if not missing:
+            return
+        conn = dbfunctions.get_connection()
+        try:
+            contacts = [{field: contact[field] for field in self.FIELDS}
+                        for contact in dbfunctions.iter_contacts(conn, missing)]
+        finally:
+            conn.close()
+        self._appendContacts(contacts)
+
+    def _appendContacts(self, contacts):
+        contacts = list(contacts)
+        if not contacts:
+            return
+        first = len(self.contacts)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(contacts) - 1)
+        for row, contact in enumerate(contacts, start=first):
+            self.contacts.append(contact)
+            self.rows[contact['mac_address']] = row
+        self.endInsertRows()
+
+    def contact(self, mac_address):
+        """This method returns the contact with a MAC address if it has been read, otherwise it returns None"""
+        row = self.rows.get(mac_address)
+        return self.contacts[row] if row is not None else None
+
+    def contactAt(self, row):
+        """This method returns the contact of a row"""
+        return self.contacts[row]
+
+    def addContact(self, mac_address, name, ipv4_address, ipv6_address, inbox_port, ftp_port):
+        """This method adds a contact at the end of the table, or updates it if it is already there"""
+        fields = {'name': name, 'ipv4_address': ipv4_address, 'ipv6_address': ipv6_address,
+                  'inbox_port': inbox_port, 'ftp_port': ftp_port}
+        self.indexContact('add', mac_address, **fields)
+        if mac_address in self.rows:
+            self.updateContact(mac_address, **fields)
+            return
+        row = len(self.contacts)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self.contacts.append({'mac_address': mac_address, **fields})
+        self.rows[mac_address] = row
+        self.endInsertRows()
+
+    def updateContact(self, mac_address, **fields):
+        """This method updates in place the fields of a contact shown, it does not change the database"""
+        self.indexContact('update', mac_address, **fields)
+        row = self.rows.get(mac_address)
+        if row is None:
+            return
+        contact = self.contacts[row]
+        columns = [self.FIELDS.index(field) for field in fields if field in self.FIELDS]
+        contact.update((field, value) for field, value in fields.items() if field in self.FIELDS)
+        if columns:
+            self.dataChanged.emit(self.index(row, min(columns)), self.index(row, max(columns)))
+
+    def removeContact(self, mac_address):
+        """This method removes a contact from the table"""
+        self.indexContact('remove', mac_address)
+        row = self.rows.pop(mac_address, None)
+        if row is None:
+            return
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        del self.contacts[row]
+        for following_row in range(row, len(self.contacts)):
+            self.rows[self.contacts[following_row]['mac_address']] = following_row
+        self.endRemoveRows()
+
+
+class ContactsProxyModel(QtCore.QSortFilterProxyModel):
+    """This proxy sorts the contacts and shows only the ones found by the search index of the ContactsTableModel"""
+    def __init__(self, parent=None):
+        super(ContactsProxyModel, self).__init__(parent)
+        self.matches = None
+        self.pattern, self.fields = '', contactindex.FIELDS
+
+    def setSourceModel(self, model):
+        super(ContactsProxyModel, self).setSourceModel(model)
+        model.searchIndexReady.connect(self.searchAgain)
+
+    def search(self, pattern, fields=contactindex.FIELDS):
+        """This method shows only the contacts with a field of `fields` starting with the pattern, or every contact
+        if the pattern is empty"""
+        self.pattern, self.fields = pattern, fields
+        model = self.sourceModel()
+        if pattern.strip():
+            self.matches = model.searchContacts(pattern, fields)
+            model.fetchContacts(self.matches)
+        else:
+            self.matches = None
+        self.invalidateFilter()
+
+    def searchAgain(self):
+        """This method repeats the last search with the search index once it is ready"""
+        if self.pattern.strip():
+            self.search(self.pattern, self.fields)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.matches is None:
+            return True
+        return self.sourceModel().contactAt(source_row)['mac_address'] in self.matches
+
+
+class ConversationsModel(QtCore.QAbstractListModel):
+    """This model shows the conversations, the most recent first. The messages that arrive are queued and applied
+    together after COALESCE_INTERVAL milliseconds, so a burst of messages moves the rows and repaints the view once"""
+    COALESCE_INTERVAL = 16
+    ROW_HEIGHT = 40
+
+    # MAC addresses of the conversations that received messages
+    conversationsUpdated = QtCore.pyqtSignal(list)
+
+    def __init__(self, parent=None):
+        super(ConversationsModel, self).__init__(parent)
+        self.conversations = []
+        self.pending = {}
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.COALESCE_INTERVAL)
+        self.timer.timeout.connect(self.applyPending)
+
+    def reload(self, limit=10):
+        """This method reads the last conversations of the database"""
+        conn = dbfunctions.get_connection()
+        try:
+            conversations = dbfunctions.last_sent_received_messages(conn, limit)
+        finally:
+            conn.close()
+        self.timer.stop()
+        self.beginResetModel()
+        self.pending = {}
+        self.conversations = [{**conversation, 'unread': 0} for conversation in conversations]
+        self.endResetModel()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.conversations)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return 'Contacts'
+        return super(ConversationsModel, self).headerData(section, orientation, role)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        conversation = self.conversations[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            unread = f" ({conversation['unread']})" if conversation['unread'] else ''
+            return f"{conversation['name']}{unread}\n{conversation['mac_address']}"
+        if role == QtCore.Qt.ToolTipRole and conversation['timestamp']:
+            return conversation['timestamp'].strftime('%b %d %Y %I:%M %p')
+        if role == QtCore.Qt.FontRole and conversation['unread']:
+            font = QtWidgets.QApplication.font()
+            font.setBold(True)
+            return font
+        if role == QtCore.Qt.SizeHintRole:
+            return QtCore.QSize(0, self.ROW_HEIGHT)
+        return None
+
+    def row(self, mac_address):
+        """This method returns the row of a conversation, or -1 if it is not shown"""
+        for row, conversation in enumerate(self.conversations):
+            if conversation['mac_address'] == mac_address:
+                return row
+        return -1
+
+    def conversationAt(self, row):
+        """This method returns the conversation of a row"""
+        return self.conversations[row]
+
+    def messageArrived(self, mac_address, name, timestamp=None, unread=True):
+        """This method queues a message of a conversation, the conversation is moved to the top when the queue is
+        applied"""
+        if isinstance(timestamp, str):
+            timestamp = datetime.datetime.fromisoformat(timestamp)
+        pending = self.pending.setdefault(mac_address, {'name': name, 'timestamp': timestamp, 'unread': 0})
+        pending['name'] = name
+        if timestamp and (pending['timestamp'] is None or timestamp > pending['timestamp']):
+            pending['timestamp'] = timestamp
+        pending['unread'] += 1 if unread else 0
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def applyPending(self):
+        """This method moves the conversations with new messages to the top and updates their timestamps and unread
+        counts"""
+        self.timer.stop()
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        # The oldest is moved first, so the most recent ends at the top
+        never = datetime.datetime.min
+        for mac_address, update in sorted(pending.items(), key=lambda item: item[1]['timestamp'] or never):
+            row = self.row(mac_address)
+            if row == -1:
+                self.beginInsertRows(QtCore.QModelIndex(), 0, 0)
+                self.conversations.insert(0, {'mac_address': mac_address, 'name': update['name'],
+                                              'timestamp': update['timestamp'], 'unread': update['unread']})
+                self.endInsertRows()
+                continue
+            if row != 0:
+                self.beginMoveRows(QtCore.QModelIndex(), row, row, QtCore.QModelIndex(), 0)
+                self.conversations.insert(0, self.conversations.pop(row))
+                self.endMoveRows()
+            conversation = self.conversations[0]
+            conversation['name'] = update['name']
+            conversation['timestamp'] = update['timestamp'] or conversation['timestamp']
+            conversation['unread'] += update['unread']
+        self.dataChanged.emit(self.index(0), self.index(len(pending) - 1))
+        self.conversationsUpdated.emit(list(pending))
+
+    def addConversation(self, mac_address, name):
+        """This method shows a conversation at the top if it is not shown yet, it returns its row"""
+        row = self.row(mac_address)
+        if row != -1:
+            return row
+        self.beginInsertRows(QtCore.QModelIndex(), 0, 0)
+        self.conversations.insert(0, {'mac_address': mac_address, 'name': name, 'timestamp': None, 'unread': 0})
+        self.endInsertRows()
+        return 0
+
+    def markRead(self, mac_address):
+        """This method clears the unread count of a conversation"""
+        row = self.row(mac_address)
+        if row != -1 and self.conversations[row]['unread']:
+            self.conversations[row]['unread'] = 0
+            self.dataChanged.emit(self.index(row), self.index(row))
+
+    def rename(self, mac_address, name):
+        """This method changes the name shown in a conversation"""
+        row = self.row(mac_address)
+        if row != -1:
+            self.conversations[row]['name'] = name
+            self.dataChanged.emit(self.index(row), self.index(row))
+        if mac_address in self.pending:
+            self.pending[mac_address]['name'] = name
+
+    def removeConversation(self, mac_address):
+        """This method removes a conversation"""
+        self.pending.pop(mac_address, None)
+        row = self.row(mac_address)
+        if row != -1:
+            self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+            del self.conversations[row]
+            self.endRemoveRows()
+
+
+class NotificationsModel(QtCore.QAbstractTableModel):
+    """This model shows the last `capacity` notifications in a ring buffer, the oldest ones are evicted when it is full
+    and, if there is a log, written to it. The notifications are queued and added together after BATCH_INTERVAL
+    milliseconds, so a burst of events inserts the rows and repaints the view once"""
+    CAPACITY = 5000
+    BATCH_INTERVAL = 100
+    HEADERS = ['Time', 'Notification']
+
+    # notifications added by a batch
+    notificationsAdded = QtCore.pyqtSignal(int)
+
+    def __init__(self, capacity=CAPACITY, log_path=None, parent=None):
+        super(NotificationsModel, self).__init__(parent)
+        self.capacity = capacity
+        self.log_path = log_path
+        self.buffer = [None] * capacity
+        self.start = 0
+        self.count = 0
+        self.pending = []
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.BATCH_INTERVAL)
+        self.timer.timeout.connect(self.applyPending)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else self.count
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.HEADERS[section]
+        return super(NotificationsModel, self).headerData(section, orientation, role)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role not in (QtCore.Qt.DisplayRole, QtCore.Qt.ToolTipRole):
+            return None
+        time, notification = self.notificationAt(index.row())
+        if index.column() == 0:
+            return time.strftime('%b %d %Y %I:%M %p')
+        return notification
+
+    def notificationAt(self, row):
+        """This method returns the (time, notification) of a row, the oldest is the first"""
+        return self.buffer[(self.start + row) % self.capacity]
+
+    def addNotification(self, notification, time=None):
+        """This method queues a notification, it is shown with the next batch"""
+        self.pending.append((time or datetime.datetime.now(), notification))
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def applyPending(self):
+        """This method adds the queued notifications, evicting the oldest ones if the buffer is full"""
+        self.timer.stop()
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+        evicted = []
+        if len(pending) > self.capacity:  # The first ones of the batch would be evicted right away
+            evicted = pending[:-self.capacity]
+            pending = pending[-self.capacity:]
+        overflow = self.count + len(pending) - self.capacity
+        if overflow > 0:
+            self.beginRemoveRows(QtCore.QModelIndex(), 0, overflow - 1)
+            evicted[:0] = [self.notificationAt(row) for row in range(overflow)]
+            for row in range(overflow):
+                self.buffer[(self.start + row) % self.capacity] = None
+            self.start = (self.start + overflow) % self.capacity
+            self.count -= overflow
+            self.endRemoveRows()
+        self.beginInsertRows(QtCore.QModelIndex(), self.count, self.count + len(pending) - 1)
+        for row, entry in enumerate(pending, start=self.count):
+            self.buffer[(self.start + row) % self.capacity] = entry
+        self.count += len(pending)
+        self.endInsertRows()
+        if evicted:
+            self.logEvicted(evicted)
+        self.notificationsAdded.emit(len(pending))
+
+    def logEvicted(self, notifications):
+        """This method appends the evicted notifications to the log, if there is one"""
+        if not self.log_path:
+            return
+        try:
+            with open(self.log_path, 'a', encoding='UTF-8') as log:
+                log.writelines(f"{time.isoformat()}\t{notification}\n" for time, notification in notifications)
+        except OSError as e:
+            logging.error(f'Could not write the notifications log: {e}')
+            self.log_path = None
+
+    def clear(self):
+        """This method removes all the notifications, without logging them"""
+        self.beginResetModel()
+        self.buffer = [None] * self.capacity
+        self.start, self.count, self.pending = 0, 0, []
+        self.endResetModel()
+
+
+class FtpFilesTableModel(QtCore.QAbstractTableModel):
+    """This model shows the entries of a directory of a FTP server, they are added in batches as they are listed"""
+    NAME, TYPE, SIZE, ACTIONS = range(4)
+    HEADERS = ['File name', 'Type', 'Size', 'Actions']
+
+    def __init__(self, parent=None):
+        super(FtpFilesTableModel, self).__init__(parent)
+        self.entries = []
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.HEADERS[section]
+        return super(FtpFilesTableModel, self).headerData(section, orientation, role)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        filename, facts = self.entries[index.row()]
+        column = index.column()
+        if role == QtCore.Qt.TextAlignmentRole and column == self.ACTIONS:
+            return QtCore.Qt.AlignCenter
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if column == self.NAME:
+            return filename
+        if column == self.TYPE:
+            return facts.get('type', '')
+        if column == self.SIZE:
+            return f"{facts.get('size', 0)} bytes"
+        return 'Open folder' if self.isFolder(index.row()) else 'Download file'
+
+    def isFolder(self, row):
+        """This method tells if the entry of a row is a directory"""
+        return self.entries[row][1].get('type') == 'dir'
+
+    def entryAt(self, row):
+        """This method returns the (filename, facts) of a row"""
+        return self.entries[row]
+
+    def setEntries(self, entries):
+        """This method replaces the entries shown"""
+        self.beginResetModel()
+        self.entries = list(entries)
+        self.endResetModel()
+
+    def appendEntries(self, entries):
+        """This method adds a batch of entries at the end"""
+        if not entries:
+            return
+        first = len(self.entries)
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(entries) - 1)
+        self.entries.extend(entries)
+        self.endInsertRows()
+
+
+class ButtonDelegate(QtWidgets.QStyledItemDelegate):
+    """This delegate paints the text of a cell as a push button, the clicks are received by the view"""
+    def paint(self, painter, option, index):
+        button = QtWidgets.QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.text = index.data()
+        button.state = QtWidgets.QStyle.State_Enabled | QtWidgets.QStyle.State_Raised
+        style = option.widget.style() if option.widget else QtWidgets.QApplication.style()
+        style.drawControl(QtWidgets.QStyle.CE_PushButton, button, painter, option.widget)
+
+    def sizeHint(self, option, index):
+        size = super(ButtonDelegate, self).sizeHint(option, index)
+        return QtCore.QSize(size.width() + 24, size.height() + 8)
@@ -0,0 +1,75 @@
+# Author: Jorge Alarcon Alvarez
+# Email: jorge4larcon@gmail.com
+"""This module applies the retention policy of the messages: the messages older than the policy of their contact are
+moved to the archive database, next to `hotline.db`, and the pages they leave free are returned to the file system with
+an incremental vacuum, so the database and the queries of the conversations stay small after years of use."""
+
+import logging
+import threading
+import dbfunctions
+import dbpool
+from PyQt5 import QtCore
+
+# Milliseconds between two runs of the retention policy, and before the first one
+RETENTION_INTERVAL = 6 * 60 * 60 * 1000
+FIRST_RETENTION_DELAY = 2 * 60 * 1000
+# Messages moved to the archive in a transaction
+BATCH_SIZE = 500
+# Pages returned to the file system in a run, 4096 pages of 4 KiB are 16 MiB
+VACUUM_PAGES = 4096
+
+_running = threading.Lock()
+
+
+def apply_retention(now=None, batch_size=BATCH_SIZE, vacuum_pages=VACUUM_PAGES):
+    """This function archives the messages that the retention policy does not keep and runs an incremental vacuum, it
+    returns the number of messages archived and of pages freed, or (0, 0) if the policy is already being applied"""
+    if not _running.acquire(blocking=False):
+        return 0, 0
+    try:
+        conn = dbfunctions.get_connection()
+        archived = 0
+        cutoffs = dbfunctions.retention_cutoffs(conn, now)
+        if cutoffs:
+            dbfunctions.attach_archive(conn)
+            try:
+                for mac_address, cutoff in cutoffs.items():
+                    moved = dbpool.retry_if_locked(dbfunctions.archive_messages, conn, mac_address, cutoff, batch_size)
+                    if moved:
+                        logging.info(f'Archived {moved} message(s) of {mac_address}')
+                    archived += moved
+            finally:
+                dbfunctions.detach_archive(conn)
+        freed = dbpool.retry_if_locked(dbfunctions.incremental_vacuum, conn, vacuum_pages)
+        if archived or freed:
+            dbfunctions.checkpoint(conn)
+        conn.close()
+        return archived, freed
+    finally:
+        _running.release()
+
+
+class RetentionSignals(QtCore.QObject):
+    """These are the signals of the RetentionThread"""
+    # archived messages, freed pages
+    on_finished = QtCore.pyqtSignal(int, int)
+    on_error = QtCore.pyqtSignal('PyQt_PyObject')
+
+
+class RetentionThread(QtCore.QRunnable):
+    """This thread applies the retention policy in the background"""
+    def __init__(self):
+        super(RetentionThread, self).__init__()
+        self.signals = RetentionSignals()
+
+    @QtCore.pyqtSlot()
+    def run(self) -> None:
+        """This method defines the actions of the thread when started"""
+        try:
+            archived, freed = apply_retention()
+        except Exception as e:
+            logging.error(f'Could not apply the retention policy: {e}')
+            self.signals.on_error.emit(e)
+        else:
+            logging.info(f'Retention policy applied: {archived} message(s) archived, {freed} page(s) freed')
+            self.signals.on_finished.emit(archived, freed)
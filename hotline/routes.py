@@ -0,0 +1,112 @@
+# Author: Jorge Alarcon Alvarez
+# Email: jorge4larcon@gmail.com
+"""This module remembers, for every contact, which address, port and IP family worked the last time a message was sent,
+so the next message tries that route first, and which addresses failed recently, so they are not tried again soon.
+
+The routes are kept in memory and persisted in the `Route` table of the database."""
+
+import datetime
+import logging
+import threading
+import dbfunctions
+
+# How long a route that worked is preferred over the rest of the addresses of the contact
+ROUTE_TTL = datetime.timedelta(hours=12)
+# How long an address that failed is skipped
+NEGATIVE_TTL = datetime.timedelta(minutes=5)
+
+_routes = {}
+_lock = threading.Lock()
+
+
+def _parse_timestamp(timestamp):
+    """This function converts a timestamp read from the database to a datetime object"""
+    if timestamp:
+        return datetime.datetime.fromisoformat(timestamp)
+    return None
+
+
+def _contact_routes(mac_address):
+    """This function returns the routes of a contact, loading them from the database the first time, it must be called
+    holding the lock"""
+    contact_routes = _routes.get(mac_address)
+    if contact_routes is None:
+        contact_routes = {}
+        try:
+            conn = dbfunctions.get_connection()
+            try:
+                for row in dbfunctions.routes(conn, mac_address):
+                    contact_routes[(row['address'], row['port'])] = {
+                        'family': row['family'],
+                        'last_success': _parse_timestamp(row['last_success']),
+                        'last_failure': _parse_timestamp(row['last_failure'])
+                    }
+            finally:
+                conn.close()
+        except Exception as e:
+            logging.error(f'Could not load the routes of {mac_address}: {e}')
+        _routes[mac_address] = contact_routes
+    return contact_routes
+
+
+def preferred_route(mac_address):
+    """This function returns the (address, port, family) that worked the last time for a contact, if it has not expired
+    and it has not failed since then, otherwise it returns None"""
+    now = datetime.datetime.now()
+    with _lock:
+        best = None
+        for (address, port), route in _contact_routes(mac_address).items():
+            last_success, last_failure = route['last_success'], route['last_failure']
+            if not last_success or now - last_success > ROUTE_TTL:
+                continue
+            if last_failure and last_failure > last_success:
+                continue
+            if best is None or last_success > best[3]:
+                best = address, port, route['family'], last_success
+    return best[:3] if best else None
+
+
+def failed_recently(mac_address, address, port):
+    """This function tells if an address of a contact failed in the last NEGATIVE_TTL and has not worked since then"""
+    now = datetime.datetime.now()
+    with _lock:
+        route = _contact_routes(mac_address).get((address, port))
+        if not route or not route['last_failure'] or now - route['last_failure'] > NEGATIVE_TTL:
+            return False
+        return not route['last_success'] or route['last_success'] < route['last_failure']
+
+
+def _record(mac_address, address, port, family, success):
+    """This function updates a route of a contact in memory and in the database"""
+    now = datetime.datetime.now()
+    with _lock:
+        route = _contact_routes(mac_address).setdefault((address, port), {'last_success': None, 'last_failure': None})
+        route['family'] = family
+        route['last_success' if success else 'last_failure'] = now
+    try:
+        conn = dbfunctions.get_connection()
+        try:
+            dbfunctions.record_route(conn, mac_address, address, port, family, success, now.isoformat())
+        finally:
+            conn.close()
+    except Exception as e:
+        logging.error(f'Could not save the route {address}:{port} of {mac_address}: {e}')
+
+
+def record_success(mac_address, address, port, family):
+    """This function remembers that a message was delivered to a contact using an address"""
+    _record(mac_address, address, port, family, True)
+
+
+def record_failure(mac_address, address, port, family):
+    """This function remembers that a message could not be delivered to a contact using an address"""
+    _record(mac_address, address, port, family, False)
+
+
+def forget(mac_address=None):
+    """This function forgets the routes kept in memory of a contact, or of every contact"""
+    with _lock:
+        if mac_address is None:
+            _routes.clear()
+        else:
+            _routes.pop(mac_address, None)
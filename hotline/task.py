@@ -4,12 +4,19 @@
 
 from PyQt5 import QtCore
 import inbox
-import asyncio
+import eventloop
+import contactindex
+import dbfunctions
 import ftplib
 import os
 import inter
 import logging
 import configuration
+import posixpath
+import threading
+import time
+import json
+from collections import deque
 
 
 # def recvall(sock: socket.socket, length):
@@ -20,7 +27,7 @@ import configuration
 #             raise EOFError()
 
 class GetContactInformationForChatSignals(QtCore.QObject):
-    """This class defines the signals of a GetContactInformationForChatThread"""
+    """This class defines the signals of a GetContactInformationForChatTask"""
     # remote_name
     on_error = QtCore.pyqtSignal(str, 'PyQt_PyObject')
     # remote_mac, local_mac, remote_name, message, contact_info
@@ -28,10 +35,9 @@ class GetContactInformationForChatSignals(QtCore.QObject):
     on_finished = QtCore.pyqtSignal()
 
 
-class GetContactInformationForChatThread(QtCore.QRunnable):
-    """This class defines the GetContactInformationForChatThread thread"""
+class GetContactInformationForChatTask:
+    """This class defines the GetContactInformationForChatTask task, it runs in the shared event loop"""
     def __init__(self, remote_ip, remote_port, remote_name, remote_mac, message, local_mac):
-        super(GetContactInformationForChatThread, self).__init__()
         self.remote_ip = remote_ip
         self.remote_port = remote_port
         self.remote_name = remote_name
@@ -40,29 +46,26 @@ class GetContactInformationForChatThread(QtCore.QRunnable):
         self.message = message
         self.signals = GetContactInformationForChatSignals()
 
-    def run(self) -> None:
-        """This method obtains contact information to start a chat"""
-        try:
-            result = asyncio.run(inbox.get_contact_information(self.remote_ip, self.remote_ip))
-        except Exception as e:
-            self.signals.on_error.emit(self.remote_name, e)
-        else:
-            self.signals.on_result.emit(self.remote_mac, self.local_mac, self.remote_name, self.message, result)
-        finally:
-            self.signals.on_finished.emit()
+    def start(self) -> eventloop.CoroutineSignals:
+        """This method starts obtaining the contact information to start a chat"""
+        return eventloop.submit_to_qt(
+            inbox.get_contact_information(self.remote_ip, self.remote_ip),
+            on_result=lambda result: self.signals.on_result.emit(self.remote_mac, self.local_mac, self.remote_name,
+                                                                 self.message, result),
+            on_error=lambda e: self.signals.on_error.emit(self.remote_name, e),
+            on_finished=self.signals.on_finished.emit, owner=self)
 
 
 class RequestContactInformationSignals(QtCore.QObject):
-    """These are the signals emitted by the RequestContactInformationThread"""
+    """These are the signals emitted by the RequestContactInformationTask"""
     on_fail = QtCore.pyqtSignal(str, str)
     on_success = QtCore.pyqtSignal(dict)
 
 
-class RequestContactInformationThread(QtCore.QRunnable):
-    """This thread requests contact information to another contact"""
+class RequestContactInformationTask:
+    """This task requests contact information to another contact, it runs in the shared event loop"""
     def __init__(self, ip4, ip6, mac, name, port, inter_server_ip, inter_server_port, inter_server_password,
-                 timeout=3):
-        super(RequestContactInformationThread, self).__init__()
+                 timeout=3, racing=True):
         self.ip6 = ip6
         self.ip4 = ip4
         self.port = port
@@ -70,95 +73,129 @@ class RequestContactInformationThread(QtCore.QRunnable):
         self.mac = mac
         self.ip6lleui64 = configuration.generate_ipv6_linklocal_eui64_address(self.mac)
         self.timeout = timeout
+        self.racing = racing
         self.inter_server_ip = inter_server_ip
         self.inter_server_port = inter_server_port
         self.inter_server_password = inter_server_password
 
         self.signals = RequestContactInformationSignals()
 
-    def run(self) -> None:
-        """This is the method that is called when the thread starts"""
+    def start(self) -> eventloop.CoroutineSignals:
+        """This method starts requesting the contact information in the shared event loop"""
+        return eventloop.submit_to_qt(self.request(), on_error=self.unexpected_error, owner=self)
+
+    def unexpected_error(self, e):
+        """This method is called when the information request failed with an unexpected error"""
+        logging.error(f'Could not request information to {self.name} {self.mac}: {e!r}')
+        self.signals.on_fail.emit(self.name, self.mac)
+
+    async def request(self):
+        """This method requests the contact information racing the addresses or trying them one after another"""
         logging.info(f"Requesting information to {self.name} {self.mac}")
-        if self.ip4 and self.ip6:
-            self.ir_ip4_ip6()
+        if self.racing:
+            await self.ir_race()
+        elif self.ip4 and self.ip6:
+            await self.ir_ip4_ip6()
         elif self.ip4 and not self.ip6:
-            self.ir_ip4_noip6()
+            await self.ir_ip4_noip6()
         elif not self.ip4 and self.ip6:
-            self.ir_noip4_ip6()
+            await self.ir_noip4_ip6()
         elif not self.ip4 and not self.ip6:
-            self.ir_noip4_noip6()
+            await self.ir_noip4_noip6()
+
+    async def ir_race(self):
+        """This function is called to request contact information racing every address of the contact"""
+        addresses = []
+        for address in (self.ip4, self.ip6, self.ip6lleui64):
+            if address and address not in addresses:
+                addresses.append(address)
+        try:
+            logging.info(f"Requesting information to {self.name} racing {', '.join(addresses)}")
+            address, ci = await inbox.get_contact_information_racing(addresses, self.port, self.timeout,
+                                                                     mac_address=self.mac)
+        except Exception as e:
+            logging.info('Information request failed')
+            if self.inter_server_ip:
+                logging.info('Interlocutor address provided, requesting contact information to the server')
+                await self.ir_interlocutor()
+            else:
+                logging.info('Could not obtain the contact information')
+                self.signals.on_fail.emit(self.name, self.mac)
+        else:
+            logging.info(f'Information request succeeded using {address}')
+            self.signals.on_success.emit(ci)
 
-    def ir_ip4_ip6(self):
+    async def ir_ip4_ip6(self):
         """This function is called to request contact information"""
         logging.info(f"{self.name} has IPv4 and IPv6 address")
         try:
             logging.info(f"Requesting information to {self.name} using {self.ip4}")
-            ci = asyncio.run(inbox.get_contact_information(self.ip4, self.port, self.timeout))
+            ci = await inbox.get_contact_information(self.ip4, self.port, self.timeout)
         except Exception as e:
             logging.info(f'Information request failed')
-            self.ir_noip4_ip6()
+            await self.ir_noip4_ip6()
         else:
             if ci['mac_address'] == self.mac:
                 logging.info('Information request succeeded')
                 self.signals.on_success.emit(ci)
             else:
                 logging.info(f'Unexpected user replied to the information request')
-                self.ir_noip4_ip6()
+                await self.ir_noip4_ip6()
 
-    def ir_noip4_ip6(self):
+    async def ir_noip4_ip6(self):
         """This function is called to request contact information"""
         logging.info(f"{self.name} has IPv6 address")
         try:
             logging.info(f"Requesting information to {self.name} using {self.ip6}")
-            ci = asyncio.run(inbox.get_contact_information(self.ip6, self.port, self.timeout))
+            ci = await inbox.get_contact_information(self.ip6, self.port, self.timeout)
         except Exception as e:
             logging.info('Information request failed, generating IPv6 Link Local EUI-64 address')
             if self.ip6lleui64 == self.ip6:
                 logging.info('The IPv6 Link Local EUI-64 address is the same as the IPv6 address used')
                 if self.inter_server_ip:
                     logging.info('Interlocutor address provided, requesting contact information to the server')
-                    self.ir_interlocutor()
+                    await self.ir_interlocutor()
                 else:
                     logging.info('Could not obtain the contact information')
                     self.signals.on_fail.emit(self.name, self.mac)
             else:
                 logging.info('Trying to request information using IPv6 Link Local EUI-64 address')
-                self.ir_noip4_noip6()
+                await self.ir_noip4_noip6()
         else:
             if ci['mac_address'] == self.mac:
                 logging.info('Information request succeeded')
                 self.signals.on_success.emit(ci)
             else:
                 logging.info(f'Unexpected user replied to the information request')
-                self.ir_noip4_noip6()
+                await self.ir_noip4_noip6()
 
-    def ir_ip4_noip6(self):
+    async def ir_ip4_noip6(self):
         """This function is called to request contact information"""
         logging.info(f"{self.name} has IPv4 address")
         try:
             logging.info(f"Requesting information to {self.name} using {self.ip4}")
-            ci = asyncio.run(inbox.get_contact_information(self.ip4, self.port, self.timeout))
+            ci = await inbox.get_contact_information(self.ip4, self.port, self.timeout)
         except Exception as e:
             logging.info('Information request failed')
-            self.ir_noip4_noip6()
+            await self.ir_noip4_noip6()
         else:
             if ci['mac_address'] == self.mac:
                 logging.info('Information request succeeded')
                 self.signals.on_success.emit(ci)
             else:
                 logging.info(f'Unexpected user replied to the information request')
-                self.ir_noip4_noip6()
+                await self.ir_noip4_noip6()
 
-    def ir_noip4_noip6(self):
+    async def ir_noip4_noip6(self):
         """This function is called to request contact information"""
         try:
             logging.info(f"Requesting contact information using IPv6 Link Local EUI-64 address...")
-            ci = asyncio.run(inbox.get_contact_information(self.ip6lleui64, self.port, self.timeout))
+            ci = await inbox.get_contact_information(self.ip6lleui64, self.port, self.timeout)
         except Exception as e:
             logging.info('Information request failed')
             if self.inter_server_ip:
                 logging.info('Interlocutor address provided, requesting contact information to the server')
-                self.ir_interlocutor()
+                await self.ir_interlocutor()
             else:
                 logging.info('Could not obtain the contact information')
                 self.signals.on_fail.emit(self.name, self.mac)
@@ -170,19 +207,18 @@ class RequestContactInformationThread(QtCore.QRunnable):
                 logging.info(f'Unexpected user replied to the information request')
                 if self.inter_server_ip:
                     logging.info('Interlocutor address provided, requesting contact information to the server')
-                    self.ir_interlocutor()
+                    await self.ir_interlocutor()
                 else:
                     logging.info('Could not obtain the contact information')
                     self.signals.on_fail.emit(self.name, self.mac)
 
-    def ir_interlocutor(self):
+    async def ir_interlocutor(self):
         """This function is called to request contact information"""
         try:
             logging.info(f"Sending a 'GET by MAC' request to the Interlocutor server {self.inter_server_ip}:{self.inter_server_port}")
             req = inter.get_by_mac(self.mac)
-            ci = asyncio.run(
-                req.send_to(self.inter_server_ip, self.inter_server_port, timeout=self.timeout,
-                            password=self.inter_server_password))
+            ci = await req.send_to(self.inter_server_ip, self.inter_server_port, timeout=self.timeout,
+                                   password=self.inter_server_password)
         except Exception as e:
             logging.info('Could not obtain the contact information')
             self.signals.on_fail.emit(self.name, self.mac)
@@ -205,7 +241,7 @@ class RequestContactInformationThread(QtCore.QRunnable):
                     else:
                         try:
                             logging.info('Requesting contact information with the address provided')
-                            ci = asyncio.run(inbox.get_contact_information(ip4, port, self.timeout))
+                            ci = await inbox.get_contact_information(ip4, port, self.timeout)
                         except Exception as e:
                             logging.info('Could not obtain the contact information')
                             self.signals.on_fail.emit(self.name, self.mac)
@@ -222,32 +258,315 @@ class RequestContactInformationThread(QtCore.QRunnable):
 
 
 class GetContactInformationSignals(QtCore.QObject):
-    """These are the signals emitted by the GetContactInformationThread"""
+    """These are the signals emitted by the GetContactInformationTask"""
     on_error = QtCore.pyqtSignal(str, int)
     on_result = QtCore.pyqtSignal(dict)
     on_finished = QtCore.pyqtSignal()
 
 
-class GetContactInformationThread(QtCore.QRunnable):
-    """This thread gets contact information from another contact"""
+class GetContactInformationTask:
+    """This task gets contact information from another contact, it runs in the shared event loop"""
     def __init__(self, ip, port=42000, timeout=3):
-        super(GetContactInformationThread, self).__init__()
         self.ip = ip
         self.port = port
         self.timeout = timeout
         self.signals = GetContactInformationSignals()
 
+    def start(self) -> eventloop.CoroutineSignals:
+        """This method starts getting the contact information in the shared event loop"""
+        return eventloop.submit_to_qt(inbox.get_contact_information(self.ip, self.port, self.timeout),
+                                      on_result=self.signals.on_result.emit,
+                                      on_error=lambda e: self.signals.on_error.emit(self.ip, self.port),
+                                      on_finished=self.signals.on_finished.emit, owner=self)
+
+
+class BuildContactSearchIndexSignals(QtCore.QObject):
+    """These are the signals emitted by the BuildContactSearchIndexThread"""
+    # generation, contactindex.ContactSearchIndex
+    on_result = QtCore.pyqtSignal(int, 'PyQt_PyObject')
+    on_error = QtCore.pyqtSignal('PyQt_PyObject')
+
+
+class BuildContactSearchIndexThread(QtCore.QRunnable):
+    """This thread builds the search index of the contacts with every contact of the database"""
+    def __init__(self, generation):
+        super(BuildContactSearchIndexThread, self).__init__()
+        self.generation = generation
+        self.signals = BuildContactSearchIndexSignals()
+
     @QtCore.pyqtSlot()
     def run(self):
         """This is the method that is called when the thread starts"""
+        conn = dbfunctions.get_connection()
         try:
-            result = asyncio.run(inbox.get_contact_information(self.ip, self.port, self.timeout))
+            index = contactindex.ContactSearchIndex(dbfunctions.iter_contacts(conn))
         except Exception as e:
-            self.signals.on_error.emit(self.ip, self.port)
+            self.signals.on_error.emit(e)
         else:
-            self.signals.on_result.emit(result)
+            self.signals.on_result.emit(self.generation, index)
         finally:
-            self.signals.on_finished.emit()
+            conn.close()
+
+
+# The user of the FTP servers of the contacts
+FTP_USER = 'hotline'
+FTP_PASSWORD = 'hotpassword'
+# Times a transfer is tried when the connection drops, it is resumed from where it stopped, and seconds to wait before
+# the first retry, doubled for every next one
+TRANSFER_ATTEMPTS = 5
+RETRY_DELAY = 2
+# Suffix of a file being downloaded, it is renamed when the download finishes
+PARTIAL_SUFFIX = '.part'
+# Connections a download may open to the FTP server at most, the files of at least SEGMENTED_MIN_SIZE bytes are
+# downloaded in segments of SEGMENT_SIZE bytes over several connections. The segments downloaded are kept in a file
+# with the SEGMENTS_SUFFIX next to the partial file, so the download can be resumed
+DOWNLOAD_CONNECTIONS = 4
+SEGMENTED_MIN_SIZE = 32 * 1024 * 1024
+SEGMENT_SIZE = 8 * 1024 * 1024
+SEGMENTS_SUFFIX = '.segments'
+# Bytes read from the data connection at once
+BLOCK_SIZE = 256 * 1024
+
+
+def remote_size(ftp_conn: ftplib.FTP, filename):
+    """This function returns the size of a file in the FTP server, or None if it does not exist"""
+    try:
+        ftp_conn.voidcmd('TYPE I')
+        return ftp_conn.size(filename)
+    except ftplib.error_perm:
+        return None
+
+
+def reconnect(ftp_conn: ftplib.FTP, path):
+    """This function connects again a FTP connection that dropped and changes to the directory it was in"""
+    ftp_conn.close()
+    ftp_conn.connect(host=ftp_conn.host, port=ftp_conn.port, timeout=ftp_conn.timeout)
+    ftp_conn.login(user=FTP_USER, passwd=FTP_PASSWORD)
+    ftp_conn.cwd(path)
+
+
+def with_retries(ftp_conn: ftplib.FTP, transfer):
+    """This function calls transfer(attempt) until it finishes, reconnecting if the connection drops, at most
+    TRANSFER_ATTEMPTS times, the transfers resume from the bytes already transferred"""
+    path = ftp_conn.pwd()
+    for attempt in range(TRANSFER_ATTEMPTS):
+        try:
+            if attempt:
+                reconnect(ftp_conn, path)
+            return transfer(attempt)
+        except (OSError, EOFError, ftplib.error_temp) as e:
+            # The errors of the local files have a filename, only the ones of the connection are retried
+            if attempt == TRANSFER_ATTEMPTS - 1 or getattr(e, 'filename', None) is not None:
+                raise
+            delay = RETRY_DELAY * 2 ** attempt
+            logging.warning(f'The transfer with {ftp_conn.host}:{ftp_conn.port} was interrupted ({e}), '
+                            f'resuming in {delay} seconds')
+            time.sleep(delay)
+
+
+class SegmentedDownload:
+    """This class downloads a file in segments over up to `max_connections` connections to the FTP server, every
+    segment is requested with REST and written in its place of the preallocated partial file.
+
+    It starts with the connection given and opens another one while the throughput grows, it stops opening them when
+    the server refuses one, it has a limit of connections per IP address."""
+    def __init__(self, ftp_conn: ftplib.FTP, name, size, path, max_connections=DOWNLOAD_CONNECTIONS,
+                 segment_size=SEGMENT_SIZE):
+        self.ftp_conn = ftp_conn
+        self.name = name
+        self.size = size
+        self.path = path
+        self.max_connections = max_connections
+        self.segment_size = segment_size
+        self.directory = ftp_conn.pwd()
+        self.lock = threading.Lock()
+        self.done = self.load_progress()
+        self.segments = deque(segment for segment in range(-(-size // segment_size)) if segment not in self.done)
+        self.threads = []
+        self.connections = 0
+        self.ramping = True
+        self.errors = []
+        self.fd = None
+        # The throughput is measured from the time the last connection was opened
+        self.ramp_time = time.monotonic()
+        self.ramp_bytes = 0
+        self.ramp_segments = 0
+        self.last_throughput = 0
+
+    def load_progress(self):
+        """This method returns the segments of a previous download of the file that finished"""
+        try:
+            with open(self.path + SEGMENTS_SUFFIX, encoding='UTF-8') as f:
+                progress = json.load(f)
+            if progress['size'] == self.size and progress['segment_size'] == self.segment_size and \
+                    os.path.getsize(self.path) == self.size:
+                return set(progress['done'])
+        except (OSError, ValueError, KeyError):
+            pass
+        return set()
+
+    def save_progress(self):
+        """This method writes the segments downloaded, it is called with the lock held"""
+        progress = {'size': self.size, 'segment_size': self.segment_size, 'done': sorted(self.done)}
+        with open(self.path + SEGMENTS_SUFFIX, 'w', encoding='UTF-8') as f:
+            json.dump(progress, f)
+
+    def write_at(self, data, offset):
+        """This method writes data at an offset of the partial file, with a positional write if the system has it"""
+        if hasattr(os, 'pwrite'):
+            while data:
+                written = os.pwrite(self.fd, data, offset)
+                data, offset = data[written:], offset + written
+        else:
+            with self.lock:
+                os.lseek(self.fd, offset, os.SEEK_SET)
+                while data:
+                    data = data[os.write(self.fd, data):]
+
+    def run(self):
+        """This method downloads the segments that are missing, it raises the last error if some could not be
+        downloaded"""
+        fresh = not self.done
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0))
+        try:
+            if fresh:
+                os.ftruncate(self.fd, self.size)
+                with self.lock:
+                    self.save_progress()
+            with self.lock:
+                self.start_worker(self.ftp_conn)
+            while True:
+                with self.lock:
+                    threads = [thread for thread in self.threads if thread.is_alive()]
+                if not threads:
+                    break
+                for thread in threads:
+                    thread.join()
+        finally:
+            os.close(self.fd)
+        if self.segments:
+            raise self.errors[-1] if self.errors else ConnectionError(f"Could not download '{self.name}'")
+        os.remove(self.path + SEGMENTS_SUFFIX)
+
+    def start_worker(self, ftp_conn=None):
+        """This method starts a thread that downloads segments, over a new connection if none is given, it is called
+        with the lock held"""
+        self.connections += 1
+        thread = threading.Thread(target=self.worker, args=(ftp_conn,), daemon=True)
+        self.threads.append(thread)
+        thread.start()
+
+    def connect(self):
+        """This method opens a new connection to the server in the directory of the file"""
+        ftp_conn = ftplib.FTP()
+        ftp_conn.connect(host=self.ftp_conn.host, port=self.ftp_conn.port, timeout=self.ftp_conn.timeout)
+        ftp_conn.login(user=FTP_USER, passwd=FTP_PASSWORD)
+        ftp_conn.cwd(self.directory)
+        return ftp_conn
+
+    def worker(self, ftp_conn):
+        """This method downloads segments until there are no more or the connection cannot be recovered"""
+        owned = ftp_conn is None
+        if owned:
+            try:
+                ftp_conn = self.connect()
+            except ftplib.error_temp as e:  # 421, the server does not accept more connections from this address
+                logging.info(f"Downloading '{self.name}' with {self.connections - 1} connection(s): {e}")
+                with self.lock:
+                    self.connections -= 1
+                    self.ramping = False
+                return
+            except (OSError, EOFError, ftplib.Error) as e:
+                with self.lock:
+                    self.connections -= 1
+                    self.ramping = False
+                    self.errors.append(e)
+                return
+        try:
+            while True:
+                with self.lock:
+                    if not self.segments:
+                        return
+                    segment = self.segments.popleft()
+                try:
+                    self.fetch(ftp_conn, segment)
+                except (OSError, EOFError, ftplib.error_temp) as e:
+                    with self.lock:
+                        self.segments.appendleft(segment)
+                        self.errors.append(e)
+                    if getattr(e, 'filename', None) is not None or not self.recover(ftp_conn, owned):
+                        return
+                else:
+                    with self.lock:
+                        self.done.add(segment)
+                        self.save_progress()
+                        self.segment_finished(segment)
+        finally:
+            with self.lock:
+                self.connections -= 1
+            if owned:
+                ftp_conn.close()
+
+    def recover(self, ftp_conn, owned):
+        """This method connects again a connection that dropped, it returns False if it could not"""
+        for attempt in range(TRANSFER_ATTEMPTS - 1):
+            time.sleep(RETRY_DELAY * 2 ** attempt)
+            try:
+                if owned:
+                    ftp_conn.close()
+                    ftp_conn.connect(host=self.ftp_conn.host, port=self.ftp_conn.port, timeout=self.ftp_conn.timeout)
+                    ftp_conn.login(user=FTP_USER, passwd=FTP_PASSWORD)
+                    ftp_conn.cwd(self.directory)
+                else:
+                    reconnect(ftp_conn, self.directory)
+                return True
+            except (OSError, EOFError, ftplib.Error) as e:
+                logging.warning(f"Could not reconnect to {self.ftp_conn.host}:{self.ftp_conn.port}: {e}")
+        return False
+
+    def fetch(self, ftp_conn: ftplib.FTP, segment):
+        """This method downloads a segment, the transfer is aborted when the segment has been received"""
+        start = segment * self.segment_size
+        length = min(self.segment_size, self.size - start)
+        ftp_conn.voidcmd('TYPE I')
+        try:  # So the peer does not report the aborted transfer as an incomplete download
+            ftp_conn.voidcmd(f'SITE RANGE {length}')
+        except ftplib.error_perm:  # The peer does not know the command
+            pass
+        data_conn = ftp_conn.transfercmd(f'RETR {self.name}', rest=start or None)
+        received = 0
+        try:
+            while received < length:
+                data = data_conn.recv(min(BLOCK_SIZE, length - received))
+                if not data:
+                    raise EOFError(f'The data connection closed {length - received} bytes before the end of the segment')
+                self.write_at(data, start + received)
+                received += len(data)
+        finally:
+            data_conn.close()
+        try:
+            ftp_conn.voidresp()
+        except ftplib.error_temp:  # 426, the transfer was aborted before the end of the file
+            pass
+        with self.lock:
+            self.ramp_bytes += length
+
+    def segment_finished(self, segment):
+        """This method opens another connection if the throughput grew with the last one, it is called with the lock
+        held"""
+        self.ramp_segments += 1
+        if not self.ramping or not self.segments or self.ramp_segments < self.connections:
+            return
+        if self.connections >= self.max_connections:
+            self.ramping = False
+            return
+        throughput = self.ramp_bytes / max(time.monotonic() - self.ramp_time, 1e-6)
+        if throughput < self.last_throughput * 1.1:  # The last connection did not help
+            self.ramping = False
+            return
+        self.last_throughput = throughput
+        self.ramp_time, self.ramp_bytes, self.ramp_segments = time.monotonic(), 0, 0
+        self.start_worker()
 
 
 class StartFtpClientConnectionSignals(QtCore.QObject):
@@ -273,7 +592,7 @@ class StartFtpClientConnectionThread(QtCore.QRunnable):
             ftp = ftplib.FTP()
             banner = ftp.connect(host=self.ip, port=self.port, timeout=self.timeout)
             self.signals.on_connect.emit(banner)
-            ftp.login(user='hotline', passwd='hotpassword')
+            ftp.login(user=FTP_USER, passwd=FTP_PASSWORD)
         except Exception as e:
             self.signals.on_error.emit(self.ip, self.port)
         else:
@@ -282,6 +601,90 @@ class StartFtpClientConnectionThread(QtCore.QRunnable):
             self.signals.on_finished.emit()
 
 
+class ListingCache:
+    """This cache keeps the listings of the directories of the FTP servers for `ttl` seconds, so going back to a folder
+    does not list it again"""
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self.listings = {}
+        self.lock = threading.Lock()
+
+    def get(self, host, port, path):
+        """This method returns the cached listing of a directory, or None if it is not cached or it has expired"""
+        with self.lock:
+            cached = self.listings.get((host, port, path))
+        if cached and time.monotonic() - cached[0] < self.ttl:
+            return cached[1]
+        return None
+
+    def put(self, host, port, path, entries):
+        """This method caches the listing of a directory and forgets the expired ones"""
+        now = time.monotonic()
+        with self.lock:
+            for key in [key for key, cached in self.listings.items() if now - cached[0] >= self.ttl]:
+                del self.listings[key]
+            self.listings[(host, port, path)] = now, entries
+
+    def invalidate(self, host, port, path=None):
+        """This method forgets the listing of a directory, or of every directory of a server"""
+        with self.lock:
+            for key in [key for key in self.listings if key[:2] == (host, port) and path in (None, key[2])]:
+                del self.listings[key]
+
+
+LISTING_CACHE = ListingCache()
+
+
+class ListDirectorySignals(QtCore.QObject):
+    """These are the signals emitted by a ListDirectoryThread"""
+    # path, entries (filename, facts) listed since the previous batch
+    on_batch = QtCore.pyqtSignal(str, list)
+    # path, every entry (filename, facts) of the directory, or None if it was not listed
+    on_result = QtCore.pyqtSignal(str, 'PyQt_PyObject')
+    # path, exception
+    on_error = QtCore.pyqtSignal(str, 'PyQt_PyObject')
+    on_end = QtCore.pyqtSignal()
+
+
+class ListDirectoryThread(QtCore.QRunnable):
+    """This thread changes the current directory of a FTP connection and lists it, the entries are emitted in batches
+    as they arrive and the listing is cached"""
+    def __init__(self, ftp_conn: ftplib.FTP, path=None, list_directory=True, batch_size=200):
+        super(ListDirectoryThread, self).__init__()
+        self.ftp_conn = ftp_conn
+        self.path = path
+        self.list_directory = list_directory
+        self.batch_size = batch_size
+        self.signals = ListDirectorySignals()
+
+    def run(self) -> None:
+        """This method is called when the thread starts"""
+        path = self.path or ''
+        try:
+            if self.path:
+                self.ftp_conn.cwd(self.path)
+            path = posixpath.normpath(self.ftp_conn.pwd())
+            entries = None
+            if self.list_directory:
+                entries, batch = [], []
+                for entry in self.ftp_conn.mlsd():
+                    batch.append(entry)
+                    if len(batch) >= self.batch_size:
+                        self.signals.on_batch.emit(path, batch)
+                        entries.extend(batch)
+                        batch = []
+                if batch:
+                    self.signals.on_batch.emit(path, batch)
+                    entries.extend(batch)
+                LISTING_CACHE.put(self.ftp_conn.host, self.ftp_conn.port, path, entries)
+        except Exception as e:
+            self.signals.on_error.emit(path, e)
+        else:
+            self.signals.on_result.emit(path, entries)
+        finally:
+            self.signals.on_end.emit()
+
+
 class UploadFileSignals(QtCore.QObject):
     """These are the signals emitted by a UploadFileThread"""
     # host, port, filename  <<< When you should freeze actions
@@ -295,19 +698,39 @@ class UploadFileSignals(QtCore.QObject):
 
 
 class UploadFileThread(QtCore.QRunnable):
-    """This thread uploads a file to a FTP server"""
-    def __init__(self, filename, ftp_conn: ftplib.FTP):
+    """This thread uploads a file to a FTP server, if the connection drops the upload is resumed appending to the part
+    already uploaded (APPE), and if `resume` is True the first attempt also appends to the file in the server"""
+    def __init__(self, filename, ftp_conn: ftplib.FTP, resume=False):
         super(UploadFileThread, self).__init__()
         self.filename = filename
         self.ftp_conn = ftp_conn
+        self.resume = resume
         self.signals = UploadFileSignals()
 
+    def upload(self, attempt):
+        """This method uploads the file, or the part of it that is not in the server"""
+        name = os.path.split(self.filename)[1]
+        with open(self.filename, 'rb') as f:
+            offset = 0
+            if attempt or self.resume:
+                offset = remote_size(self.ftp_conn, name) or 0
+                if offset > os.fstat(f.fileno()).st_size:
+                    offset = 0
+            if offset:
+                f.seek(offset)
+                try:
+                    self.ftp_conn.storbinary(f"APPE {name}", f)
+                    return
+                except ftplib.error_perm as e:  # The server does not let append, upload the whole file
+                    logging.warning(f"Could not resume the upload of '{name}': {e}")
+                    f.seek(0)
+            self.ftp_conn.storbinary(f"STOR {name}", f)
+
     def run(self):
         """This method is called when the thread starts"""
         try:
-            with open(self.filename, 'rb') as f:
-                self.signals.on_start.emit(self.ftp_conn.host, self.ftp_conn.port, self.filename)
-                self.ftp_conn.storbinary(f"STOR {os.path.split(self.filename)[1]}", f)
+            self.signals.on_start.emit(self.ftp_conn.host, self.ftp_conn.port, self.filename)
+            with_retries(self.ftp_conn, self.upload)
         except Exception as e:
             self.signals.on_error.emit(self.ftp_conn.host, self.ftp_conn.port, self.filename, e)
         else:
@@ -328,22 +751,42 @@ class DownloadFileSignals(QtCore.QObject):
 
 
 class DownloadFileThread(QtCore.QRunnable):
-    """This thread downloads a file from a FTP server"""
-    def __init__(self, filename, ftp_conn: ftplib.FTP, folder_to_save):
+    """This thread downloads a file from a FTP server to a PARTIAL_SUFFIX file, which is renamed when it is complete.
+    The download continues from the size of the partial file (REST), the one left by a dropped connection or by a
+    previous download. With more than one connection the large files are downloaded by a SegmentedDownload"""
+    def __init__(self, filename, ftp_conn: ftplib.FTP, folder_to_save, connections=1):
         super(DownloadFileThread, self).__init__()
         self.filename = filename
         self.ftp_conn = ftp_conn
         self.folder_to_save = folder_to_save
+        self.connections = connections
         self.signals = DownloadFileSignals()
 
+    def download(self, partial_path):
+        """This method downloads the part of the file that is not in the partial file, in segments over several
+        connections if the file is large or a segmented download of it was interrupted"""
+        name = os.path.split(self.filename)[1]
+        size = remote_size(self.ftp_conn, name)
+        if size and (os.path.isfile(partial_path + SEGMENTS_SUFFIX) or
+                     self.connections > 1 and size >= SEGMENTED_MIN_SIZE):
+            SegmentedDownload(self.ftp_conn, name, size, partial_path, self.connections).run()
+            return
+        offset = os.path.getsize(partial_path) if os.path.isfile(partial_path) else 0
+        if size is not None and offset > size:  # The partial file is not of this file
+            offset = 0
+        if offset and offset == size:
+            return
+        with open(partial_path, 'ab' if offset else 'wb') as fp:
+            self.ftp_conn.retrbinary(f'RETR {name}', fp.write, rest=offset or None)
+
     def run(self) -> None:
         """This method is called when the thread starts"""
         try:
             self.signals.on_start.emit(self.ftp_conn.host, self.ftp_conn.port, self.filename)
             # self.filename = f"{self.ftp_conn.pwd()}/{self.filename}"
             filepath = os.path.join(self.folder_to_save, self.filename)
-            with open(filepath, 'wb') as fp:
-                self.ftp_conn.retrbinary(f'RETR {os.path.split(self.filename)[1]}', fp.write)
+            with_retries(self.ftp_conn, lambda attempt: self.download(filepath + PARTIAL_SUFFIX))
+            os.replace(filepath + PARTIAL_SUFFIX, filepath)
         except Exception as e:
             self.signals.on_error.emit(self.ftp_conn.host, self.ftp_conn.port, self.filename, e)
         else:
@@ -353,16 +796,15 @@ class DownloadFileThread(QtCore.QRunnable):
 
 
 class SignUpRequestSiganls(QtCore.QObject):
-    """These are the signals emitted by a SignUpRequestThread"""
+    """These are the signals emitted by a SignUpRequestTask"""
     on_start = QtCore.pyqtSignal()
     on_error = QtCore.pyqtSignal('PyQt_PyObject')
     on_result = QtCore.pyqtSignal(dict)
 
 
-class SignUpRequestThread(QtCore.QRunnable):
-    """This thread makes a SignUp request to an Interlocutor server"""
+class SignUpRequestTask:
+    """This task makes a SignUp request to an Interlocutor server, it runs in the shared event loop"""
     def __init__(self, server_addr, server_port, server_password, c_mac, c_name, c_port, c_getonlybymac):
-        super(SignUpRequestThread, self).__init__()
         self.server_address = server_addr
         self.server_port = server_port
         self.server_password = server_password
@@ -373,30 +815,27 @@ class SignUpRequestThread(QtCore.QRunnable):
         self.c_port = c_port
         self.c_getonlybymac = c_getonlybymac
 
-    def run(self) -> None:
-        """This method is called when the thread starts"""
+    def start(self) -> eventloop.CoroutineSignals:
+        """This method starts the request in the shared event loop"""
         request = inter.sign_up(self.c_mac, self.c_name, self.c_port, self.c_getonlybymac)
-        try:
-            self.signals.on_start.emit()
-            result = asyncio.run(request.send_to(self.server_address, self.server_port, password=self.server_password))
-        except Exception as e:
-            self.signals.on_error.emit(e)
-        else:
-            self.signals.on_result.emit(result)
+        self.signals.on_start.emit()
+        return eventloop.submit_to_qt(request.send_to(self.server_address, self.server_port,
+                                                      password=self.server_password),
+                                      on_result=self.signals.on_result.emit, on_error=self.signals.on_error.emit,
+                                      owner=self)
 
 
 class GetRequestSignals(QtCore.QObject):
-    """These are the signals emitted by a GetRequestThread"""
+    """These are the signals emitted by a GetRequestTask"""
     on_start = QtCore.pyqtSignal()
     on_result = QtCore.pyqtSignal(dict)
     on_error = QtCore.pyqtSignal('PyQt_PyObject')
     on_finished = QtCore.pyqtSignal()
 
 
-class GetRequestThread(QtCore.QRunnable):
-    """This thread makes a Get request to an Interlocutor server"""
+class GetRequestTask:
+    """This task makes a Get request to an Interlocutor server, it runs in the shared event loop"""
     def __init__(self, server_addr, server_port, server_password, mac=None, username=None):
-        super(GetRequestThread, self).__init__()
         self.server_address = server_addr
         self.server_port = server_port
         self.server_password = server_password
@@ -406,47 +845,38 @@ class GetRequestThread(QtCore.QRunnable):
         else:
             self.request = inter.get_by_username(username)
 
-    def run(self) -> None:
-        """This method is called when the thread starts"""
-        try:
-            self.signals.on_start.emit()
-            result = asyncio.run(
-                self.request.send_to(self.server_address, self.server_port, password=self.server_password))
-        except Exception as e:
-            self.signals.on_error.emit(e)
-        else:
-            self.signals.on_result.emit(result)
-        finally:
-            self.signals.on_finished.emit()
+    def start(self) -> eventloop.CoroutineSignals:
+        """This method starts the request in the shared event loop"""
+        self.signals.on_start.emit()
+        return eventloop.submit_to_qt(
+            self.request.send_to(self.server_address, self.server_port, password=self.server_password),
+            on_result=self.signals.on_result.emit, on_error=self.signals.on_error.emit,
+            on_finished=self.signals.on_finished.emit, owner=self)
 
 
 class DropRequestSignals(QtCore.QObject):
-    """These are the signals emitted by a DropRequestThread"""
+    """These are the signals emitted by a DropRequestTask"""
     on_start = QtCore.pyqtSignal(str)
     on_error = QtCore.pyqtSignal('PyQt_PyObject', str)
     on_result = QtCore.pyqtSignal(dict)
     on_finished = QtCore.pyqtSignal()
 
 
-class DropRequestThread(QtCore.QRunnable):
-    """This thread makes a Drop request to an Interlocutor server"""
+class DropRequestTask:
+    """This task makes a Drop request to an Interlocutor server, it runs in the shared event loop"""
     def __init__(self, server_address, server_port, server_password, ip_to_drop):
-        super(DropRequestThread, self).__init__()
         self.signals = DropRequestSignals()
         self.server_address = server_address
         self.server_port = server_port
         self.server_password = server_password
         self.ip_to_drop = ip_to_drop
 
-    def run(self) -> None:
-        """This method is called when the thread starts"""
-        try:
-            request = inter.drop(self.ip_to_drop)
-            self.signals.on_start.emit(self.ip_to_drop)
-            result = asyncio.run(request.send_to(self.server_address, self.server_port, password=self.server_password))
-        except Exception as e:
-            self.signals.on_error.emit(e, self.ip_to_drop)
-        else:
-            self.signals.on_result.emit(result)
-        finally:
-            self.signals.on_finished.emit()
+    def start(self) -> eventloop.CoroutineSignals:
+        """This method starts the request in the shared event loop"""
+        request = inter.drop(self.ip_to_drop)
+        self.signals.on_start.emit(self.ip_to_drop)
+        return eventloop.submit_to_qt(request.send_to(self.server_address, self.server_port,
+                                                      password=self.server_password),
+                                      on_result=self.signals.on_result.emit,
+                                      on_error=lambda e: self.signals.on_error.emit(e, self.ip_to_drop),
+                                      on_finished=self.signals.on_finished.emit, owner=self)
@@ -24,29 +24,33 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5 import QtCore, QtGui, QtWidgets
 import logging
 import os
+import posixpath
 import dbfunctions
 import valid
 import sqlite3
 import ftp
-import datetime
 import configuration
 import task
 import ftplib
 import knownpaths
 import inbox
+import routes
+import retention
+import models
+import contactindex
 from socket import gethostname
 
 
 class FtpClientTabWidget(QtWidgets.QWidget):
     """This class defines a FTP client tab"""
     def __init__(self, ftp_conn: ftplib.FTP, container: QtWidgets.QTabBar, thread_pool: QtCore.QThreadPool,
-                 notificationsTable: QtWidgets.QTableWidget, tabWidget: QtWidgets.QTabBar, *args, **kwargs):
+                 notificationsModel: models.NotificationsModel, tabWidget: QtWidgets.QTabBar, *args, **kwargs):
         super(FtpClientTabWidget, self).__init__(*args, **kwargs)
         self.verticalLayout = QtWidgets.QVBoxLayout(self)
         self.innerLayout = QtWidgets.QVBoxLayout()
         self.ftp_conn = ftp_conn
         self.thread_pool = thread_pool
-        self.notificationsTableWidget = notificationsTable
+        self.notificationsModel = notificationsModel
         self.tabWidget = tabWidget
         self.topWindowFieldsLayout = QtWidgets.QFormLayout()
         self.container = container
@@ -55,14 +59,11 @@ class FtpClientTabWidget(QtWidgets.QWidget):
         self.topWindowFieldsLayout.setWidget(0, QtWidgets.QFormLayout.LabelRole, self.currentFolderLabel)
         self.currentFolderLineEdit = QtWidgets.QLineEdit(self)
         self.currentFolderLineEdit.setReadOnly(True)
-        self.currentFolderLineEdit.setText(self.ftp_conn.pwd())
         self.topWindowFieldsLayout.setWidget(0, QtWidgets.QFormLayout.FieldRole, self.currentFolderLineEdit)
         self.innerLayout.addLayout(self.topWindowFieldsLayout)
 
-        self.ftpServerFilesTableWidget = QtWidgets.QTableWidget(self)
-        self.ftpServerFilesTableWidget.setColumnCount(0)
-        self.ftpServerFilesTableWidget.setRowCount(0)
-        self.innerLayout.addWidget(self.ftpServerFilesTableWidget)
+        self.ftpServerFilesTableView = QtWidgets.QTableView(self)
+        self.innerLayout.addWidget(self.ftpServerFilesTableView)
 
         self.optionsLayout = QtWidgets.QHBoxLayout()
         self.goBackPushButton = QtWidgets.QPushButton(self)
@@ -85,15 +86,23 @@ class FtpClientTabWidget(QtWidgets.QWidget):
 
         self.innerLayout.addLayout(self.optionsLayout)
         self.verticalLayout.addLayout(self.innerLayout)
+        # The directories are listed by a ListDirectoryThread, the current one is known when it has changed to it
+        self.currentPath = None
+        self.streamingListing = False
+        self.busy = False
         self.setupftpServerFilesTable()
         self.loadDirContentInFtpServerFilesTable()
 
     def setupftpServerFilesTable(self):
         """This method sets up the tab with some initial values"""
-        headers = ['File name', 'Type', 'Size', 'Actions']
-        self.ftpServerFilesTableWidget.setColumnCount(len(headers))
-        self.ftpServerFilesTableWidget.setHorizontalHeaderLabels(headers)
-        header = self.ftpServerFilesTableWidget.horizontalHeader()
+        self.ftpServerFilesModel = models.FtpFilesTableModel(self)
+        self.ftpServerFilesTableView.setModel(self.ftpServerFilesModel)
+        self.ftpServerFilesTableView.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.ftpServerFilesButtonDelegate = models.ButtonDelegate(self.ftpServerFilesTableView)
+        self.ftpServerFilesTableView.setItemDelegateForColumn(models.FtpFilesTableModel.ACTIONS,
+                                                              self.ftpServerFilesButtonDelegate)
+        self.ftpServerFilesTableView.clicked.connect(self.ftpServerFilesTableClicked)
+        header = self.ftpServerFilesTableView.horizontalHeader()
         header.setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
         header.setSectionResizeMode(1, QtWidgets.QHeaderView.ResizeToContents)
         header.setSectionResizeMode(2, QtWidgets.QHeaderView.ResizeToContents)
@@ -108,26 +117,44 @@ class FtpClientTabWidget(QtWidgets.QWidget):
         if not os.path.isfile(filename):
             return
         logging.info(f"Filen selected: '{filename}'")
-        uploader = task.UploadFileThread(filename, self.ftp_conn)
+        uploader = task.UploadFileThread(filename, self.ftp_conn, self.askToResumeUpload(filename))
         uploader.signals.on_start.connect(self.uploadFileOnStart)
         uploader.signals.on_error.connect(self.uploadFileOnError)
         uploader.signals.on_finished.connect(self.uploadFileOnFinished)
         uploader.signals.on_end.connect(self.uploadFileOnEnd)
         self.thread_pool.start(uploader)
 
+    def askToResumeUpload(self, filename):
+        """This function asks if an upload must be resumed when the folder has a smaller file with the same name, the
+        part of a previous upload"""
+        name = os.path.split(filename)[1]
+        local_size = os.path.getsize(filename)
+        for row in range(self.ftpServerFilesModel.rowCount()):
+            remote_name, facts = self.ftpServerFilesModel.entryAt(row)
+            if remote_name == name and facts.get('type') == 'file':
+                remote_size = int(facts.get('size', 0))
+                if not 0 < remote_size < local_size:
+                    return False
+                answer = QtWidgets.QMessageBox.question(
+                    self, 'Resume upload',
+                    f"The folder already has {remote_size} of the {local_size} bytes of '{name}', resume the upload?",
+                    QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No, QtWidgets.QMessageBox.Yes)
+                return answer == QtWidgets.QMessageBox.Yes
+        return False
+
     def freezeControls(self):
-        """This function freezes the interface controls"""
+        """This function freezes the interface controls, the files can still be scrolled while they are listed"""
+        self.busy = True
         self.goBackPushButton.setEnabled(False)
         self.refreshPushButton.setEnabled(False)
         self.uploadPushButton.setEnabled(False)
-        self.ftpServerFilesTableWidget.setEnabled(False)
 
     def unfreezeControls(self):
         """This function unfreezes the interface controls"""
+        self.busy = False
         self.goBackPushButton.setEnabled(True)
         self.refreshPushButton.setEnabled(True)
         self.uploadPushButton.setEnabled(True)
-        self.ftpServerFilesTableWidget.setEnabled(True)
 
     @QtCore.pyqtSlot(str, int, str)
     def uploadFileOnStart(self, ip, port, filename):
@@ -147,6 +174,7 @@ class FtpClientTabWidget(QtWidgets.QWidget):
         """This callback is called when an upload has finished"""
         logging.info(f"'{filename}' was uploaded to {ip}:{port}")
         self.addNotificationToNotificationsTable(f"'{filename}' was uploaded to {ip}:{port}")
+        task.LISTING_CACHE.invalidate(self.ftp_conn.host, self.ftp_conn.port, self.currentPath)
 
     @QtCore.pyqtSlot()
     def uploadFileOnEnd(self):
@@ -154,98 +182,88 @@ class FtpClientTabWidget(QtWidgets.QWidget):
         logging.info('The upload thread has finished, reactivating buttons')
         self.unfreezeControls()
 
-    def loadDirContentInFtpServerFilesTable(self):
-        """This functions lists the content of a directory"""
-        self.freezeControls()
-        while self.ftpServerFilesTableWidget.rowCount():
-            self.ftpServerFilesTableWidget.removeRow(0)
+    def loadDirContentInFtpServerFilesTable(self, path=None, refresh=False):
+        """This functions changes to a directory, the current one if path is None, and lists its content in the
+        background. A listing cached in the last seconds is shown right away, a refreshed one is replaced when the new
+        listing arrives, otherwise the files are added as they arrive"""
+        cached = None
+        if path is not None and not refresh:
+            cached = task.LISTING_CACHE.get(self.ftp_conn.host, self.ftp_conn.port, path)
+        if cached is not None:
+            self.ftpServerFilesModel.setEntries(cached)
+            self.currentFolderLineEdit.setText(path)
+        elif not refresh or path != self.currentPath:
+            self.ftpServerFilesModel.setEntries([])
+        self.streamingListing = cached is None and not refresh
 
-        try:
-            for filename, fileinfo in self.ftp_conn.mlsd():
-                row = self.ftpServerFilesTableWidget.rowCount()
-                self.ftpServerFilesTableWidget.insertRow(row)
-
-                item = QtWidgets.QTableWidgetItem(filename)
-                item.setFlags((item.flags() ^ QtCore.Qt.ItemIsEditable))
-                self.ftpServerFilesTableWidget.setItem(row, 0, item)
-
-                item = QtWidgets.QTableWidgetItem(fileinfo['type'])
-                item.setFlags((item.flags() ^ QtCore.Qt.ItemIsEditable))
-                self.ftpServerFilesTableWidget.setItem(row, 1, item)
-
-                item = QtWidgets.QTableWidgetItem(f"{fileinfo['size']} bytes")
-                item.setFlags((item.flags() ^ QtCore.Qt.ItemIsEditable))
-                self.ftpServerFilesTableWidget.setItem(row, 2, item)
-
-                if fileinfo['type'] == 'dir':
-                    open_button = QtWidgets.QPushButton(self)
-                    open_button.setText('Open folder')
-                    open_button.clicked.connect(self.change_folder)
-                    self.ftpServerFilesTableWidget.setCellWidget(row, 3, open_button)
-                else:
-                    download_button = QtWidgets.QPushButton(self)
-                    download_button.setText('Download file')
-                    download_button.clicked.connect(self.downloadPushButtonAction)
-                    self.ftpServerFilesTableWidget.setCellWidget(row, 3, download_button)
-        except Exception as e:
-            msg = QtWidgets.QMessageBox(self)
-            msg.setIcon(QtWidgets.QMessageBox.Critical)
-            msg.setWindowTitle('Error')
-            msg.setText("The connection was interrumpted")
-            msg.setStandardButtons(QtWidgets.QMessageBox.Ok)
-            msg.setDefaultButton(QtWidgets.QMessageBox.Ok)
-            answer = msg.exec_()
-            self.erase_myself()
+        self.freezeControls()
+        listingThread = task.ListDirectoryThread(self.ftp_conn, path, list_directory=cached is None)
+        listingThread.signals.on_batch.connect(self.listDirectoryOnBatch)
+        listingThread.signals.on_result.connect(self.listDirectoryOnResult)
+        listingThread.signals.on_error.connect(self.listDirectoryOnError)
+        listingThread.signals.on_end.connect(self.unfreezeControls)
+        self.thread_pool.start(listingThread)
+
+    @QtCore.pyqtSlot(str, list)
+    def listDirectoryOnBatch(self, path, entries):
+        """This callback is called when a batch of files of a directory has been listed"""
+        if self.streamingListing:
+            self.ftpServerFilesModel.appendEntries(entries)
+
+    @QtCore.pyqtSlot(str, 'PyQt_PyObject')
+    def listDirectoryOnResult(self, path, entries):
+        """This callback is called when the current directory has changed and, if it was listed, all of its files
+        have arrived"""
+        self.currentPath = path
+        self.currentFolderLineEdit.setText(path)
+        if entries is not None and not self.streamingListing:
+            self.ftpServerFilesModel.setEntries(entries)
+
+    @QtCore.pyqtSlot(str, 'PyQt_PyObject')
+    def listDirectoryOnError(self, path, e):
+        """This callback is called when a directory could not be listed"""
+        logging.error(f"Could not list '{path}' in {self.ftp_conn.host}:{self.ftp_conn.port} error: {e}")
+        msg = QtWidgets.QMessageBox(self)
+        msg.setIcon(QtWidgets.QMessageBox.Critical)
+        msg.setWindowTitle('Error')
+        msg.setText("The connection was interrumpted")
+        msg.setStandardButtons(QtWidgets.QMessageBox.Ok)
+        msg.setDefaultButton(QtWidgets.QMessageBox.Ok)
+        answer = msg.exec_()
+        self.erase_myself()
 
-        self.unfreezeControls()
+    @QtCore.pyqtSlot(QtCore.QModelIndex)
+    def ftpServerFilesTableClicked(self, index):
+        """This function opens the folder or downloads the file whose button was clicked"""
+        if self.busy or index.column() != models.FtpFilesTableModel.ACTIONS:
+            return
+        filename, facts = self.ftpServerFilesModel.entryAt(index.row())
+        if self.ftpServerFilesModel.isFolder(index.row()):
+            self.change_folder(filename)
+        else:
+            self.download_file(filename)
 
-    @QtCore.pyqtSlot()
-    def change_folder(self):
+    def change_folder(self, dirname):
         """This function changes the actual directory"""
-        btn = self.sender()
-        if btn:
-            self.freezeControls()
-            row = self.ftpServerFilesTableWidget.indexAt(btn.pos()).row()
-            dirname = self.ftpServerFilesTableWidget.item(row, 0).text()
-            try:
-                self.ftp_conn.cwd(dirname)
-                self.currentFolderLineEdit.setText(self.ftp_conn.pwd())
-                self.loadDirContentInFtpServerFilesTable()
-            except Exception as e:
-                msg = QtWidgets.QMessageBox(self)
-                msg.setIcon(QtWidgets.QMessageBox.Critical)
-                msg.setWindowTitle('Error')
-                msg.setText("The connection was interrumpted")
-                msg.setStandardButtons(QtWidgets.QMessageBox.Ok)
-                msg.setDefaultButton(QtWidgets.QMessageBox.Ok)
-                answer = msg.exec_()
-                self.erase_myself()
-
-            self.unfreezeControls()
+        self.loadDirContentInFtpServerFilesTable(posixpath.join(self.currentPath or '', dirname))
 
     @QtCore.pyqtSlot()
     def refreshPushButtonAction(self):
         """This function refresh the files in the actual directory"""
-        self.loadDirContentInFtpServerFilesTable()
-
-    @QtCore.pyqtSlot()
-    def downloadPushButtonAction(self):
-        """This is the callback funtion that is called when downloadPushButton is clicked"""
-        btn = self.sender()
-        if btn:
-            row = self.ftpServerFilesTableWidget.indexAt(btn.pos()).row()
-            filename = self.ftpServerFilesTableWidget.item(row, 0).text()
+        self.loadDirContentInFtpServerFilesTable(self.currentPath, refresh=True)
 
-            download_dir = QtWidgets.QFileDialog.getExistingDirectory(self, 'Select a folder to save the file')
-            if not os.path.isdir(download_dir):
-                return
+    def download_file(self, filename):
+        """This function downloads a file of the actual directory"""
+        download_dir = QtWidgets.QFileDialog.getExistingDirectory(self, 'Select a folder to save the file')
+        if not os.path.isdir(download_dir):
+            return
 
-            downloadThread = task.DownloadFileThread(filename, self.ftp_conn, download_dir)
-            downloadThread.signals.on_start.connect(self.downloadFileOnStart)
-            downloadThread.signals.on_error.connect(self.downloadFileOnError)
-            downloadThread.signals.on_finished.connect(self.downloadFileOnFinished)
-            downloadThread.signals.on_end.connect(self.downloadFileOnEnd)
-            self.thread_pool.start(downloadThread)
+        downloadThread = task.DownloadFileThread(filename, self.ftp_conn, download_dir, task.DOWNLOAD_CONNECTIONS)
+        downloadThread.signals.on_start.connect(self.downloadFileOnStart)
+        downloadThread.signals.on_error.connect(self.downloadFileOnError)
+        downloadThread.signals.on_finished.connect(self.downloadFileOnFinished)
+        downloadThread.signals.on_end.connect(self.downloadFileOnEnd)
+        self.thread_pool.start(downloadThread)
 
     @QtCore.pyqtSlot(str, int, str)
     def downloadFileOnStart(self, ip, port, filename):
@@ -274,22 +292,10 @@ class FtpClientTabWidget(QtWidgets.QWidget):
     @QtCore.pyqtSlot()
     def goBackPushButtonAction(self):
         """This is a callback called when goBackButton is clicked"""
-        self.freezeControls()
-        try:
-            self.ftp_conn.cwd('..')
-            self.currentFolderLineEdit.setText(self.ftp_conn.pwd())
-            self.loadDirContentInFtpServerFilesTable()
-        except Exception as e:
-            msg = QtWidgets.QMessageBox(self)
-            msg.setIcon(QtWidgets.QMessageBox.Critical)
-            msg.setWindowTitle('Error')
-            msg.setText("The connection was interrumpted")
-            msg.setStandardButtons(QtWidgets.QMessageBox.Ok)
-            msg.setDefaultButton(QtWidgets.QMessageBox.Ok)
-            answer = msg.exec_()
-            self.erase_myself()
-
-        self.unfreezeControls()
+        if self.currentPath is None:
+            self.loadDirContentInFtpServerFilesTable('..')
+        else:
+            self.loadDirContentInFtpServerFilesTable(posixpath.dirname(self.currentPath.rstrip('/')) or '/')
 
     def erase_myself(self):
         """This function removes the tab from the tab widget"""
@@ -297,17 +303,7 @@ class FtpClientTabWidget(QtWidgets.QWidget):
 
     def addNotificationToNotificationsTable(self, notification, time=None):
         """This function adds a notification to the Notifications table"""
-        if not time:
-            time = datetime.datetime.now()
-        row = self.notificationsTableWidget.rowCount()
-        self.notificationsTableWidget.insertRow(row)
-        item = QtWidgets.QTableWidgetItem(time.strftime('%b %d %Y %I:%M %p'))
-        item.setFlags(item.flags() ^ QtCore.Qt.ItemIsEditable)
-        self.notificationsTableWidget.setItem(row, 0, item)
-        item = QtWidgets.QTableWidgetItem(notification)
-        item.setFlags(item.flags() ^ QtCore.Qt.ItemIsEditable)
-        self.notificationsTableWidget.setItem(row, 1, item)
-        self.tabWidget.setTabText(5, "Notifications*")
+        self.notificationsModel.addNotification(notification, time)
 
 
 class Ui_HotlineMainWindow(object):
@@ -341,11 +337,9 @@ class Ui_HotlineMainWindow(object):
         self.verticalLayout_23.setObjectName("verticalLayout_23")
         self.verticalLayout_21 = QtWidgets.QVBoxLayout()
         self.verticalLayout_21.setObjectName("verticalLayout_21")
-        self.conversationsTableWidget = QtWidgets.QTableWidget(self.conversationsGroupBox)
-        self.conversationsTableWidget.setObjectName("conversationsTableWidget")
-        self.conversationsTableWidget.setColumnCount(0)
-        self.conversationsTableWidget.setRowCount(0)
-        self.verticalLayout_21.addWidget(self.conversationsTableWidget)
+        self.conversationsTableView = QtWidgets.QTableView(self.conversationsGroupBox)
+        self.conversationsTableView.setObjectName("conversationsTableView")
+        self.verticalLayout_21.addWidget(self.conversationsTableView)
         self.verticalLayout_23.addLayout(self.verticalLayout_21)
         self.horizontalLayout_16.addWidget(self.conversationsGroupBox)
         self.chatGroupBox = QtWidgets.QGroupBox(self.tabChats)
@@ -409,13 +403,14 @@ class Ui_HotlineMainWindow(object):
         self.searchContactCriteriaComboBox.setObjectName("searchContactCriteriaComboBox")
         self.searchContactCriteriaComboBox.addItem("")
         self.searchContactCriteriaComboBox.addItem("")
+        self.searchContactCriteriaComboBox.addItem("")
+        self.searchContactCriteriaComboBox.addItem("")
+        self.searchContactCriteriaComboBox.addItem("")
         self.horizontalLayout.addWidget(self.searchContactCriteriaComboBox)
         self.verticalLayout_3.addLayout(self.horizontalLayout)
-        self.contactsTableWidget = QtWidgets.QTableWidget(self.contactsDbGroupBox)
-        self.contactsTableWidget.setObjectName("contactsTableWidget")
-        self.contactsTableWidget.setColumnCount(0)
-        self.contactsTableWidget.setRowCount(0)
-        self.verticalLayout_3.addWidget(self.contactsTableWidget)
+        self.contactsTableView = QtWidgets.QTableView(self.contactsDbGroupBox)
+        self.contactsTableView.setObjectName("contactsTableView")
+        self.verticalLayout_3.addWidget(self.contactsTableView)
         self.verticalLayout_27.addLayout(self.verticalLayout_3)
         self.verticalLayout_2.addWidget(self.contactsDbGroupBox)
         self.newContactGroupBox = QtWidgets.QGroupBox(self.tabContacts)
@@ -633,6 +628,24 @@ class Ui_HotlineMainWindow(object):
         self.ftpUsersCanUploadFilesCheckBox = QtWidgets.QCheckBox(self.ftpServerConfigGroupBox)
         self.ftpUsersCanUploadFilesCheckBox.setObjectName("ftpUsersCanUploadFilesCheckBox")
         self.formLayout_5.setWidget(5, QtWidgets.QFormLayout.FieldRole, self.ftpUsersCanUploadFilesCheckBox)
+        self.keepPartialUploadsLabel = QtWidgets.QLabel(self.ftpServerConfigGroupBox)
+        self.keepPartialUploadsLabel.setObjectName("keepPartialUploadsLabel")
+        self.formLayout_5.setWidget(6, QtWidgets.QFormLayout.LabelRole, self.keepPartialUploadsLabel)
+        self.ftpKeepPartialUploadsCheckBox = QtWidgets.QCheckBox(self.ftpServerConfigGroupBox)
+        self.ftpKeepPartialUploadsCheckBox.setObjectName("ftpKeepPartialUploadsCheckBox")
+        self.formLayout_5.setWidget(6, QtWidgets.QFormLayout.FieldRole, self.ftpKeepPartialUploadsCheckBox)
+        self.serverBackendLabel = QtWidgets.QLabel(self.ftpServerConfigGroupBox)
+        self.serverBackendLabel.setObjectName("serverBackendLabel")
+        self.formLayout_5.setWidget(7, QtWidgets.QFormLayout.LabelRole, self.serverBackendLabel)
+        self.ftpServerBackendComboBox = QtWidgets.QComboBox(self.ftpServerConfigGroupBox)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Fixed, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.ftpServerBackendComboBox.sizePolicy().hasHeightForWidth())
+        self.ftpServerBackendComboBox.setSizePolicy(sizePolicy)
+        self.ftpServerBackendComboBox.setMinimumSize(QtCore.QSize(110, 0))
+        self.ftpServerBackendComboBox.setObjectName("ftpServerBackendComboBox")
+        self.formLayout_5.setWidget(7, QtWidgets.QFormLayout.FieldRole, self.ftpServerBackendComboBox)
         self.verticalLayout_5.addLayout(self.formLayout_5)
         self.verticalLayout_19.addWidget(self.ftpServerConfigGroupBox)
         self.groupBox_7 = QtWidgets.QGroupBox(self.tabFTP)
@@ -804,6 +817,26 @@ class Ui_HotlineMainWindow(object):
         self.myContactInfoInboxPortSpinBox.setProperty("value", 42000)
         self.myContactInfoInboxPortSpinBox.setObjectName("myContactInfoInboxPortSpinBox")
         self.formLayout_7.setWidget(2, QtWidgets.QFormLayout.FieldRole, self.myContactInfoInboxPortSpinBox)
+        self.persistentSessionsLabel = QtWidgets.QLabel(self.groupBox_2)
+        self.persistentSessionsLabel.setObjectName("persistentSessionsLabel")
+        self.formLayout_7.setWidget(5, QtWidgets.QFormLayout.LabelRole, self.persistentSessionsLabel)
+        self.myContactInfoPersistentSessionsCheckBox = QtWidgets.QCheckBox(self.groupBox_2)
+        self.myContactInfoPersistentSessionsCheckBox.setObjectName("myContactInfoPersistentSessionsCheckBox")
+        self.formLayout_7.setWidget(5, QtWidgets.QFormLayout.FieldRole, self.myContactInfoPersistentSessionsCheckBox)
+        self.retentionDaysLabel = QtWidgets.QLabel(self.groupBox_2)
+        self.retentionDaysLabel.setObjectName("retentionDaysLabel")
+        self.formLayout_7.setWidget(6, QtWidgets.QFormLayout.LabelRole, self.retentionDaysLabel)
+        self.myContactInfoRetentionDaysSpinBox = QtWidgets.QSpinBox(self.groupBox_2)
+        self.myContactInfoRetentionDaysSpinBox.setMaximum(36500)
+        self.myContactInfoRetentionDaysSpinBox.setObjectName("myContactInfoRetentionDaysSpinBox")
+        self.formLayout_7.setWidget(6, QtWidgets.QFormLayout.FieldRole, self.myContactInfoRetentionDaysSpinBox)
+        self.retentionMaxMessagesLabel = QtWidgets.QLabel(self.groupBox_2)
+        self.retentionMaxMessagesLabel.setObjectName("retentionMaxMessagesLabel")
+        self.formLayout_7.setWidget(7, QtWidgets.QFormLayout.LabelRole, self.retentionMaxMessagesLabel)
+        self.myContactInfoRetentionMaxMessagesSpinBox = QtWidgets.QSpinBox(self.groupBox_2)
+        self.myContactInfoRetentionMaxMessagesSpinBox.setMaximum(10000000)
+        self.myContactInfoRetentionMaxMessagesSpinBox.setObjectName("myContactInfoRetentionMaxMessagesSpinBox")
+        self.formLayout_7.setWidget(7, QtWidgets.QFormLayout.FieldRole, self.myContactInfoRetentionMaxMessagesSpinBox)
         self.verticalLayout_6.addLayout(self.formLayout_7)
         self.verticalLayout_22.addWidget(self.groupBox_2)
         spacerItem4 = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
@@ -886,11 +919,9 @@ class Ui_HotlineMainWindow(object):
         self.groupBox_5.setObjectName("groupBox_5")
         self.verticalLayout_13 = QtWidgets.QVBoxLayout(self.groupBox_5)
         self.verticalLayout_13.setObjectName("verticalLayout_13")
-        self.notificationsTableWidget = QtWidgets.QTableWidget(self.groupBox_5)
-        self.notificationsTableWidget.setObjectName("notificationsTableWidget")
-        self.notificationsTableWidget.setColumnCount(0)
-        self.notificationsTableWidget.setRowCount(0)
-        self.verticalLayout_13.addWidget(self.notificationsTableWidget)
+        self.notificationsTableView = QtWidgets.QTableView(self.groupBox_5)
+        self.notificationsTableView.setObjectName("notificationsTableView")
+        self.verticalLayout_13.addWidget(self.notificationsTableView)
         self.verticalLayout_14.addWidget(self.groupBox_5)
         self.tabWidget.addTab(self.tabNotifications, "")
         self.verticalLayout.addWidget(self.tabWidget)
@@ -918,15 +949,18 @@ class Ui_HotlineMainWindow(object):
         HotlineMainWindow.setTabOrder(self.myContactInfoIpAddressLineEdit, self.myContactInfoInboxPortSpinBox)
         HotlineMainWindow.setTabOrder(self.myContactInfoInboxPortSpinBox, self.myContactInfoMacAddressLineEdit)
         HotlineMainWindow.setTabOrder(self.myContactInfoMacAddressLineEdit, self.myContactInfoGetOnlyByMacCheckBox)
-        HotlineMainWindow.setTabOrder(self.myContactInfoGetOnlyByMacCheckBox, self.interSignUpPushButton)
+        HotlineMainWindow.setTabOrder(self.myContactInfoGetOnlyByMacCheckBox, self.myContactInfoPersistentSessionsCheckBox)
+        HotlineMainWindow.setTabOrder(self.myContactInfoPersistentSessionsCheckBox, self.myContactInfoRetentionDaysSpinBox)
+        HotlineMainWindow.setTabOrder(self.myContactInfoRetentionDaysSpinBox, self.myContactInfoRetentionMaxMessagesSpinBox)
+        HotlineMainWindow.setTabOrder(self.myContactInfoRetentionMaxMessagesSpinBox, self.interSignUpPushButton)
         HotlineMainWindow.setTabOrder(self.interSignUpPushButton, self.interSearchLineEdit)
         HotlineMainWindow.setTabOrder(self.interSearchLineEdit, self.interSearchPushButton)
         HotlineMainWindow.setTabOrder(self.interSearchPushButton, self.interDbTableWidget)
         HotlineMainWindow.setTabOrder(self.interDbTableWidget, self.searchContactLineEdit)
         HotlineMainWindow.setTabOrder(self.searchContactLineEdit, self.tabWidget)
         HotlineMainWindow.setTabOrder(self.tabWidget, self.searchContactCriteriaComboBox)
-        HotlineMainWindow.setTabOrder(self.searchContactCriteriaComboBox, self.contactsTableWidget)
-        HotlineMainWindow.setTabOrder(self.contactsTableWidget, self.newContactNameLineEdit)
+        HotlineMainWindow.setTabOrder(self.searchContactCriteriaComboBox, self.contactsTableView)
+        HotlineMainWindow.setTabOrder(self.contactsTableView, self.newContactNameLineEdit)
         HotlineMainWindow.setTabOrder(self.newContactNameLineEdit, self.newContactMacAddressLineEdit)
         HotlineMainWindow.setTabOrder(self.newContactMacAddressLineEdit, self.newContactIpv4AddressLineEdit)
         HotlineMainWindow.setTabOrder(self.newContactIpv4AddressLineEdit, self.newContactIpv6AddressLineEdit)
@@ -937,13 +971,13 @@ class Ui_HotlineMainWindow(object):
         HotlineMainWindow.setTabOrder(self.chatTextEdit, self.messageLineEdit)
         HotlineMainWindow.setTabOrder(self.messageLineEdit, self.sendMessagePushButton)
         HotlineMainWindow.setTabOrder(self.sendMessagePushButton, self.findContactPushButton)
-        HotlineMainWindow.setTabOrder(self.findContactPushButton, self.conversationsTableWidget)
-        HotlineMainWindow.setTabOrder(self.conversationsTableWidget, self.ftpFolderLineEdit)
+        HotlineMainWindow.setTabOrder(self.findContactPushButton, self.conversationsTableView)
+        HotlineMainWindow.setTabOrder(self.conversationsTableView, self.ftpFolderLineEdit)
         HotlineMainWindow.setTabOrder(self.ftpFolderLineEdit, self.ftpConnectedUsersTableWidget)
         HotlineMainWindow.setTabOrder(self.ftpConnectedUsersTableWidget, self.ftpFilesTableWidget)
         HotlineMainWindow.setTabOrder(self.ftpFilesTableWidget, self.interSearchCriteriaComboBox)
         HotlineMainWindow.setTabOrder(self.interSearchCriteriaComboBox, self.downloadsTabWidget)
-        HotlineMainWindow.setTabOrder(self.downloadsTabWidget, self.notificationsTableWidget)
+        HotlineMainWindow.setTabOrder(self.downloadsTabWidget, self.notificationsTableView)
 
     def retranslateUi(self, HotlineMainWindow):
         """This method translates the user interface"""
@@ -959,8 +993,11 @@ class Ui_HotlineMainWindow(object):
         self.contactsDbGroupBox.setTitle(_translate("HotlineMainWindow", "Contacts database"))
         self.searchContactLineEdit.setPlaceholderText(_translate("HotlineMainWindow", "Type here to search contacts"))
         self.findContactPushButton.setText(_translate("HotlineMainWindow", "Find"))
-        self.searchContactCriteriaComboBox.setItemText(0, _translate("HotlineMainWindow", "Name"))
-        self.searchContactCriteriaComboBox.setItemText(1, _translate("HotlineMainWindow", "MAC address"))
+        self.searchContactCriteriaComboBox.setItemText(0, _translate("HotlineMainWindow", "Any field"))
+        self.searchContactCriteriaComboBox.setItemText(1, _translate("HotlineMainWindow", "Name"))
+        self.searchContactCriteriaComboBox.setItemText(2, _translate("HotlineMainWindow", "MAC address"))
+        self.searchContactCriteriaComboBox.setItemText(3, _translate("HotlineMainWindow", "IPv4 address"))
+        self.searchContactCriteriaComboBox.setItemText(4, _translate("HotlineMainWindow", "IPv6 address"))
         self.newContactGroupBox.setTitle(_translate("HotlineMainWindow", "New contact"))
         self.nameLabel.setText(_translate("HotlineMainWindow", "Name:"))
         self.newContactNameLineEdit.setPlaceholderText(_translate("HotlineMainWindow", "Muhammad"))
@@ -983,6 +1020,10 @@ class Ui_HotlineMainWindow(object):
         self.folderLabel.setText(_translate("HotlineMainWindow", "Folder:"))
         self.ftpFolderLineEdit.setPlaceholderText(_translate("HotlineMainWindow", "C:\\Users\\muhammad\\"))
         self.usersCanUploadFilesLabel.setText(_translate("HotlineMainWindow", "Users can upload files:"))
+        self.keepPartialUploadsLabel.setText(_translate("HotlineMainWindow", "Resumable uploads:"))
+        self.ftpKeepPartialUploadsCheckBox.setToolTip(_translate("HotlineMainWindow", "Keep the part of an upload received before the connection dropped, so it can be resumed"))
+        self.serverBackendLabel.setText(_translate("HotlineMainWindow", "Concurrency:"))
+        self.ftpServerBackendComboBox.setToolTip(_translate("HotlineMainWindow", "Serve every connection in the same thread, in its own thread or in its own process"))
         self.groupBox_7.setTitle(_translate("HotlineMainWindow", "Banner"))
         self.ftpBannerPlainTextEdit.setPlaceholderText(
             _translate("HotlineMainWindow", "Type here a creative banner message :)"))
@@ -1004,6 +1045,12 @@ class Ui_HotlineMainWindow(object):
         self.mACAddressLabel.setText(_translate("HotlineMainWindow", "MAC address:"))
         self.onlyByMACLabel.setText(_translate("HotlineMainWindow", "Get only by MAC:"))
         self.inboxPortLabel_2.setText(_translate("HotlineMainWindow", "Inbox port:"))
+        self.persistentSessionsLabel.setText(_translate("HotlineMainWindow", "Persistent sessions:"))
+        self.retentionDaysLabel.setText(_translate("HotlineMainWindow", "Keep messages for:"))
+        self.myContactInfoRetentionDaysSpinBox.setSpecialValueText(_translate("HotlineMainWindow", "Forever"))
+        self.myContactInfoRetentionDaysSpinBox.setSuffix(_translate("HotlineMainWindow", " days"))
+        self.retentionMaxMessagesLabel.setText(_translate("HotlineMainWindow", "Messages kept per contact:"))
+        self.myContactInfoRetentionMaxMessagesSpinBox.setSpecialValueText(_translate("HotlineMainWindow", "All"))
         self.groupBox_11.setTitle(_translate("HotlineMainWindow", "Options"))
         self.interSignUpPushButton.setText(_translate("HotlineMainWindow", "Sign up"))
         self.groupBox_3.setTitle(_translate("HotlineMainWindow", "Interlocutor database"))
@@ -1024,13 +1071,27 @@ class Ui_HotlineMainWindow(object):
 
 class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
     """This class adds functionality to the user interface"""
+    # Fields searched for every item of searchContactCriteriaComboBox, the first one searches all of them
+    CONTACT_SEARCH_FIELDS = {1: ('name',), 2: ('mac_address',), 3: ('ipv4_address',), 4: ('ipv6_address',)}
+    # The items of the FTP server concurrency combo box, the backends not available on this system are left out
+    FTP_SERVER_BACKENDS = ((ftp.BACKEND_ASYNC, 'Async'), (ftp.BACKEND_THREADED, 'Threads'),
+                           (ftp.BACKEND_MULTIPROCESS, 'Processes'))
+
     def __init__(self, *args, **kwargs):
         QtWidgets.QMainWindow.__init__(self, *args, **kwargs)
         self.setupUi(self)
 
-        self.searchCriteria = 'Name'
-        self.findContactSearchPattern = ''
-        self.lastMatchingRow = None
+        # The chat view loads the history of the conversation in pages, the older ones when scrolling to the top
+        self.chatHistoryPageSize = 50
+        self.chatOldestMessage = None
+        self.chatHasOlderMessages = False
+        self.chatLoadingOlderMessages = False
+
+        # The notifications table keeps the last notifications, the ones evicted are written to a log next to the
+        # database. It is created first because every tab adds notifications
+        log_path = os.path.join(os.path.dirname(os.path.abspath(dbfunctions.DB_PATH)), 'notifications.log')
+        self.notificationsModel = models.NotificationsModel(models.NotificationsModel.CAPACITY, log_path, self)
+        self.notificationsModel.notificationsAdded.connect(self.notificationsModelOnNotificationsAdded)
 
         # Each Qt application has one global QThreadPool object, which can be accessed by calling globalInstance() .
         self.threadPool = QtCore.QThreadPool()  # QThreadPool.globalInstance()
@@ -1049,10 +1110,38 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
         self.setupNotificationsTab()
         self.setupDownloadsTab()
         self.start_inbox_server()
+        self.setupRetention()
 
         if "err" in kwargs:
             self.addNotificationToNotificationsTable(kwargs["err"])
 
+    def setupRetention(self):
+        """This method schedules the retention policy of the messages, it runs a while after the application starts
+        and then periodically"""
+        self.retentionTimer = QtCore.QTimer(self)
+        self.retentionTimer.timeout.connect(self.start_retention)
+        self.retentionTimer.start(retention.RETENTION_INTERVAL)
+        QtCore.QTimer.singleShot(retention.FIRST_RETENTION_DELAY, self.start_retention)
+
+    @QtCore.pyqtSlot()
+    def start_retention(self):
+        """This method applies the retention policy of the messages in the background"""
+        retentionThread = retention.RetentionThread()
+        retentionThread.signals.on_finished.connect(self.retentionThreadOnFinished)
+        retentionThread.signals.on_error.connect(self.retentionThreadOnError)
+        self.threadPool.start(retentionThread)
+
+    @QtCore.pyqtSlot(int, int)
+    def retentionThreadOnFinished(self, archived, freed):
+        """A callback when the retention policy was applied"""
+        if archived:
+            self.addNotificationToNotificationsTable(f"{archived} old message(s) were moved to the archive")
+
+    @QtCore.pyqtSlot('PyQt_PyObject')
+    def retentionThreadOnError(self, e):
+        """A callback when the retention policy could not be applied"""
+        self.addNotificationToNotificationsTable(f"Could not archive the old messages: {e}")
+
     def setupDownloadsTab(self):
         """This method sets up the downloads tab"""
         self.downloadsTabWidget.tabCloseRequested.connect(self.close_download_tab)
@@ -1104,37 +1193,51 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
         # If the contact was a stranger, he was added to contacts and the ip information has been updated in the
         # database, so if its the current user of the chat update the messages, and if its not an stranger, update the info
         # in the table
-        if msginfo['is_stranger']:  # Add him to the contacts table and the first chat is going to be him
+        chat_is_open = self.chatMateMacAddressLabel.text() == msginfo["mac_address"] and \
+            self.tabWidget.currentIndex() == 0
+        if msginfo['is_stranger']:  # Add him to the contacts table, his conversation is added unread at the top
             conn = dbfunctions.get_connection()
             name, ip4, ip6, inbox_p, ftp_p = dbfunctions.get_contact(conn, msginfo['mac_address'], 'name',
                                                                      'ipv4_address', 'ipv6_address', 'inbox_port',
                                                                      'ftp_port')
             conn.close()
             self.addContactToContactsTable(name, msginfo["mac_address"], ip4, ip6, inbox_p, ftp_p)
-            self.addConversationToConversationsTable(msginfo["mac_address"], name)
-        else:  # Update the contacts table, and if he is the active chat, update the messages
-            for row in range(self.contactsTableWidget.rowCount()):
-                if self.contactsTableWidget.item(row, 1).text() == msginfo['mac_address']:
-                    name = self.contactsTableWidget.item(row, 0).text()
-                    if msginfo['ipv'] == 6:
-                        self.contactsTableWidget.item(row, 3).setText(msginfo['ip'])
-                    elif msginfo['ipv'] == 4:
-                        self.contactsTableWidget.item(row, 2).setText(msginfo['ip'])
-
-                    break
-
-            if self.chatMateMacAddressLabel.text() == msginfo["mac_address"]:
-                for row in range(self.conversationsTableWidget.rowCount()):
-                    if self.conversationsTableWidget.item(row, 0).text().split('\n')[1] == msginfo["mac_address"]:
-                        self.conversationsTableWidget.cellClicked.emit(row, 0)
-                        break
+            self.conversationsModel.messageArrived(msginfo["mac_address"], name, msginfo['timestamp'],
+                                                   not chat_is_open)
+        else:  # Update the contacts table, the conversation is moved to the top with the next burst of messages
+            name = self.contactName(msginfo['mac_address'])
+            # The inbox server has already saved the address in the database
+            if msginfo['ipv'] == 6:
+                self.contactsModel.updateContact(msginfo['mac_address'], ipv6_address=msginfo['ip'])
+            elif msginfo['ipv'] == 4:
+                self.contactsModel.updateContact(msginfo['mac_address'], ipv4_address=msginfo['ip'])
+            self.conversationsModel.messageArrived(msginfo["mac_address"], name, msginfo['timestamp'],
+                                                   not chat_is_open)
 
         # Notify the user
-        if self.chatMateMacAddressLabel.text() == msginfo["mac_address"] and self.tabWidget.currentIndex() == 0:
-            pass
-        else:
+        if not chat_is_open:
             self.addNotificationToNotificationsTable(f'You have new messages from {name} {msginfo["mac_address"]}')
 
+    def saveContact(self, mac_address, **fields):
+        """This method saves the fields of a contact in the database and updates them in the contacts table"""
+        conn = dbfunctions.get_connection()
+        try:
+            dbfunctions.update_contact(conn, mac_address, **fields)
+        finally:
+            conn.close()
+        self.contactsModel.updateContact(mac_address, **fields)
+
+    def contactName(self, mac_address):
+        """This method returns the name of a contact, from the contacts table if it has been read"""
+        contact = self.contactsModel.contact(mac_address)
+        if contact:
+            return contact['name']
+        conn = dbfunctions.get_connection()  # The contact has not been read by the table yet
+        try:
+            return dbfunctions.get_contact(conn, mac_address, 'name')
+        finally:
+            conn.close()
+
     @QtCore.pyqtSlot(str)
     def inboxServerThreadOnGetContactInformation(self, remote_ip):
         """A callback when inbox server when someone requesting """
@@ -1161,6 +1264,7 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
         self.chatGroupBox.setTitle('')
         self.chatMateMacAddressLabel.setText('')
         self.chatMateFilesPushButton.clicked.connect(self.start_ftp_client_connection_fast)
+        self.chatTextEdit.verticalScrollBar().valueChanged.connect(self.chatScrolled)
         self.setupConversationsTable()
         self.loadConversationsTable()
         self.sendMessagePushButton.clicked.connect(self.sendMessagePushButtonAction)
@@ -1170,6 +1274,8 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
         """This method sets up the contacts tab"""
         self.addNewContactPushButton.clicked.connect(self.addNewContactPushButtonAction)
         self.findContactPushButton.clicked.connect(self.findContactInTable)
+        self.searchContactLineEdit.textChanged.connect(self.findContactInTable)
+        self.searchContactCriteriaComboBox.currentIndexChanged.connect(self.findContactInTable)
         self.setupContactsTable()
         self.loadContactsTable()
 
@@ -1240,12 +1346,14 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
         inter_ip = self.interIpAddressLineEdit.text()
         inter_port = self.interPortSpinBox.value()
         inter_password = self.interPasswordLineEdit.text()
+        persistent_sessions = self.myContactInfoPersistentSessionsCheckBox.isChecked()
 
-        smartSendMessageThread = inbox.SmartSendMessageThread(ipv4, ipv6, inbox_p, remote_mac, user_mac, inter_ip,
-                                                              inter_port, inter_password, message, name, timeout=3)
-        smartSendMessageThread.signals.on_success.connect(self.smartSendMessageOnSuccess)
-        smartSendMessageThread.signals.on_fail.connect(self.smartSendMessageOnFail)
-        self.threadPool.start(smartSendMessageThread)
+        smartSendMessageTask = inbox.SmartSendMessageTask(ipv4, ipv6, inbox_p, remote_mac, user_mac, inter_ip,
+                                                          inter_port, inter_password, message, name, timeout=3,
+                                                          persistent_sessions=persistent_sessions)
+        smartSendMessageTask.signals.on_success.connect(self.smartSendMessageOnSuccess)
+        smartSendMessageTask.signals.on_fail.connect(self.smartSendMessageOnFail)
+        smartSendMessageTask.start()
 
     @QtCore.pyqtSlot(str, str)
     def smartSendMessageOnFail(self, remote_name, remote_mac):
@@ -1266,362 +1374,201 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
                                         received_confirmation['received_timestamp'])
         conn.close()
 
+        receiver = received_confirmation['receiver']
         if contact_information:  # Update the contact (ipv4, ipv6, inbox_port, ftp_port)
-            for row in range(self.contactsTableWidget.rowCount()):
-                if self.contactsTableWidget.item(row, 1).text() == received_confirmation['receiver']:
-                    if ipv_used == '4':  # Actualiza todas las IP
-                        self.contactsTableWidget.item(row, 2).setText(contact_information['ipv4_address'])
-                        self.contactsTableWidget.item(row, 3).setText(contact_information['ipv6_address'])
-                    elif ipv_used == '6':  # Elimina la IPv4
-                        self.contactsTableWidget.item(row, 2).setText('')
-                        self.contactsTableWidget.item(row, 3).setText(contact_information['ipv6_address'])
-                    elif ipv_used == '6lleui64':  # Elimina la IPv4 y actualiza la IPv6 a esta direccion
-                        self.contactsTableWidget.item(row, 2).setText('')
-                        ipv6lleui64 = configuration.generate_ipv6_linklocal_eui64_address(
-                            received_confirmation['receiver'])
-                        self.contactsTableWidget.item(row, 3).setText(ipv6lleui64)
-
-                    self.contactsTableWidget.cellWidget(row, 4).setValue(contact_information['inbox_port'])
-                    self.contactsTableWidget.cellWidget(row, 5).setValue(contact_information['ftp_port'])
-
-                    conn = dbfunctions.get_connection()
-                    dbfunctions.update_contact(
-                        conn,
-                        received_confirmation['receiver'],
-                        inbox_port=contact_information['inbox_port'],
-                        ftp_port=contact_information['ftp_port']
-                    )
-                    conn.close()
-                    break
+            if ipv_used == '4':  # Actualiza todas las IP
+                self.saveContact(receiver, ipv4_address=contact_information['ipv4_address'],
+                                 ipv6_address=contact_information['ipv6_address'])
+            elif ipv_used == '6':  # Elimina la IPv4
+                self.saveContact(receiver, ipv4_address='', ipv6_address=contact_information['ipv6_address'])
+            elif ipv_used == '6lleui64':  # Elimina la IPv4 y actualiza la IPv6 a esta direccion
+                ipv6lleui64 = configuration.generate_ipv6_linklocal_eui64_address(receiver)
+                self.saveContact(receiver, ipv4_address='', ipv6_address=ipv6lleui64)
+
+            self.saveContact(receiver, inbox_port=contact_information['inbox_port'],
+                             ftp_port=contact_information['ftp_port'])
         else:
-            for row in range(self.contactsTableWidget.rowCount()):
-                if self.contactsTableWidget.item(row, 1).text() == received_confirmation['receiver']:
-                    if ipv_used == '4':  # La Ipv4 funciono, no actualices las IP
-                        pass
-                    elif ipv_used == '6':  # La IPv4 no funciono, pero la 6 si, elimina la IPv4
-                        self.contactsTableWidget.item(row, 2).setText('')
-                    elif ipv_used == '6lleui64':  # La IPv4 y la IPv6 no funcionaron, pero la IPv6 ll eui64 si, elimina la 4 y actualiza la 6
-                        self.contactsTableWidget.item(row, 2).setText('')
-                        ipv6lleui64 = configuration.generate_ipv6_linklocal_eui64_address(
-                            received_confirmation['receiver'])
-                        self.contactsTableWidget.item(row, 3).setText(ipv6lleui64)
-
-                    break
-
-        if self.chatMateMacAddressLabel.text() == received_confirmation['receiver']:
-            for row in range(self.conversationsTableWidget.rowCount()):
-                if self.conversationsTableWidget.item(row, 0).text().split('\n')[1] == received_confirmation[
-                    'receiver']:
-                    self.conversationsTableWidget.cellClicked.emit(row, 0)
-                    break
+            if ipv_used == '4':  # La Ipv4 funciono, no actualices las IP
+                pass
+            elif ipv_used == '6':  # La IPv4 no funciono, pero la 6 si, elimina la IPv4
+                self.saveContact(receiver, ipv4_address='')
+            elif ipv_used == '6lleui64':  # La IPv4 y la IPv6 no funcionaron, pero la IPv6 ll eui64 si, elimina la 4 y actualiza la 6
+                ipv6lleui64 = configuration.generate_ipv6_linklocal_eui64_address(receiver)
+                self.saveContact(receiver, ipv4_address='', ipv6_address=ipv6lleui64)
 
-        self.messageLineEdit.setText('')
+        self.conversationsModel.messageArrived(receiver, self.contactName(receiver), sent_timestamp, False)
 
-    @QtCore.pyqtSlot(int, int)
-    def open_conversation_from_table_cell(self, row, col):
-        text = self.conversationsTableWidget.item(row, col).text().split('\n')
-        name = text[0]
-        mac_address = text[1]
+        self.messageLineEdit.setText('')
 
-        # if mac_address == self.chatMateMacAddressLabel.text():
-        #     logging.info('The conversation is opened, update the messages')
-        #     self.
-        #     return
+    @QtCore.pyqtSlot(QtCore.QModelIndex)
+    def conversationsTableClicked(self, index):
+        """This method opens the conversation clicked in the conversations table"""
+        conversation = self.conversationsModel.conversationAt(index.row())
+        self.open_conversation(conversation['mac_address'], conversation['name'])
+        self.conversationsModel.markRead(conversation['mac_address'])
+
+    @QtCore.pyqtSlot(list)
+    def conversationsModelOnUpdated(self, mac_addresses):
+        """A callback when a burst of messages has been applied to the conversations table"""
+        mac_address = self.chatMateMacAddressLabel.text()
+        if mac_address in mac_addresses:
+            self.open_conversation(mac_address, self.chatGroupBox.title())
+        self.selectConversation(self.chatMateMacAddressLabel.text())
+
+    def selectConversation(self, mac_address):
+        """This method selects the row of a conversation in the conversations table"""
+        row = self.conversationsModel.row(mac_address)
+        if row == -1:
+            self.conversationsTableView.clearSelection()
+        else:
+            self.conversationsTableView.selectRow(row)
 
+    def open_conversation(self, mac_address, name):
+        # Clearing the chat scrolls it to the top, it must not load the history of the previous conversation
+        self.chatHasOlderMessages = False
         self.chatTextEdit.setText('')
         logging.info(f"Opening conversation with '{name}' '{mac_address}'")
         self.chatGroupBox.setTitle(name)
         self.chatMateMacAddressLabel.setText(mac_address)
-        conn = dbfunctions.get_connection()
-        messages = dbfunctions.last_sent_or_received_messages_from_contact(conn, mac_address, 50)
-        conn.close()
-        text = ''
-        for message in reversed(messages):
-            if message['type'] == 'received':
-                text = f"[{message['timestamp'].strftime('%b %d %Y %I:%M %p')}] {message['name']}: {message['content']}"
-                # text = f"S[{message['sent_timestamp'].strftime('%b %d %Y %I:%M %p')}]  R[{message['timestamp'].strftime('%b %d %Y %I:%M %p')}] {message['name']}: {message['content']}"
-                # text += f"""<b>R[ {message['timestamp'].strftime('%b %d %Y %I:%M %p')} ] {message['name']}: </b> <p>{message['content']}</p><br>"""
-
-            else:
-                text = f"[{message['received_timestamp'].strftime('%b %d %Y %I:%M %p')}] Me: {message['content']}"
-                # text = f"S[{message['timestamp'].strftime('%b %d %Y %I:%M %p')}]  R[{message['received_timestamp'].strftime('%b %d %Y %I:%M %p')}] Me: {message['content']}"
-                # text += f"""<b>S[ {message['timestamp'].strftime('%b %d %Y %I:%M %p')} ] {message['name']}: </b> <p>{message['content']}</p><br>"""
-
-            self.chatTextEdit.append(text)
-        # self.chatTextEdit.setHtml(text)
+        self.chatOldestMessage = None
+        self.chatHasOlderMessages = True
+        self.loadOlderChatMessages()
+        scroll_bar = self.chatTextEdit.verticalScrollBar()
+        scroll_bar.setValue(scroll_bar.maximum())
         self.messageLineEdit.setFocus()
 
-    @QtCore.pyqtSlot(int, int)
-    def update_contact_from_table_cell(self, row, cell):
-        mac_address = self.contactsTableWidget.item(row, 1).text()
-        new_value = self.contactsTableWidget.item(row, cell).text()
-        if cell == 0:  # name changed
-            conn = dbfunctions.get_connection()
-            try:
-                valid.is_name(new_value, exception=True)
-                dbfunctions.update_contact(conn, mac_address, name=new_value)
-            except Exception as e:
-                logging.error(e)
-                msg = QtWidgets.QMessageBox(
-                    QtWidgets.QMessageBox.Critical,
-                    'Error',
-                    f'{e}',
-                    QtWidgets.QMessageBox.Ok
-                )
-                answer = msg.exec_()
-                try:
-                    self.contactsTableWidget.item(row, cell).setText(dbfunctions.get_contact(conn, mac_address, 'name'))
-                except Exception as e:
-                    logging.error(e)
-                    msg = QtWidgets.QMessageBox(
-                        QtWidgets.QMessageBox.Critical,
-                        'Error',
-                        f'{e}',
-                        QtWidgets.QMessageBox.Ok
-                    )
-                    answer = msg.exec_()
-                    return
-            else:
-                logging.info(f"New value '{new_value}' for field 'name' for user '{mac_address}'")
-                row_position = -1
-                for row in range(self.conversationsTableWidget.rowCount()):
-                    if self.conversationsTableWidget.item(row, 0).text().split('\n')[1] == mac_address:
-                        self.conversationsTableWidget.item(row, 0).setText(f"{new_value}\n{mac_address}")
-                        row_position = row
-                        break
-
-                if self.chatMateMacAddressLabel.text() == mac_address:
-                    if row_position != -1:
-                        self.conversationsTableWidget.cellClicked.emit(row_position, 0)
-
-                    self.chatGroupBox.setTitle(new_value)
+    def chatMessageText(self, name, message_type, timestamp, other_timestamp, content):
+        """This method formats a message of the conversation history"""
+        if message_type == 'received':
+            return f"[{timestamp.strftime('%b %d %Y %I:%M %p')}] {name}: {content}"
+        return f"[{other_timestamp.strftime('%b %d %Y %I:%M %p')}] Me: {content}"
 
-            finally:
-                conn.close()
-        elif cell == 2:
-            conn = dbfunctions.get_connection()
-            try:
-                if not new_value == '':
-                    valid.is_ipv4_address(new_value, exception=True)
-                dbfunctions.update_contact(conn, mac_address, ipv4_address=new_value)
-            except Exception as e:
-                logging.error(e)
-                msg = QtWidgets.QMessageBox(
-                    QtWidgets.QMessageBox.Critical,
-                    'Error',
-                    f'{e}',
-                    QtWidgets.QMessageBox.Ok
-                )
-                answer = msg.exec_()
-                try:
-                    self.contactsTableWidget.item(row, cell).setText(
-                        dbfunctions.get_contact(conn, mac_address, 'ipv4_address'))
-                except Exception as e:
-                    logging.error(e)
-                    msg = QtWidgets.QMessageBox(
-                        QtWidgets.QMessageBox.Critical,
-                        'Error',
-                        f'{e}',
-                        QtWidgets.QMessageBox.Ok
-                    )
-                    answer = msg.exec_()
-                    return
-            else:
-                logging.info(f"New value '{new_value}' for field 'ipv4_address' for user '{mac_address}'")
-            finally:
-                conn.close()
-        elif cell == 3:
-            conn = dbfunctions.get_connection()
-            try:
-                if not new_value == '':
-                    valid.is_ipv6_address(new_value, exception=True)
-                dbfunctions.update_contact(conn, mac_address, ipv6_address=new_value)
-            except Exception as e:
-                logging.error(e)
-                msg = QtWidgets.QMessageBox(
-                    QtWidgets.QMessageBox.Critical,
-                    'Error',
-                    f'{e}',
-                    QtWidgets.QMessageBox.Ok
-                )
-                answer = msg.exec_()
-                try:
-                    self.contactsTableWidget.item(row, cell).setText(
-                        dbfunctions.get_contact(conn, mac_address, 'ipv6_address'))
-                except Exception as e:
-                    logging.error(e)
-                    msg = QtWidgets.QMessageBox(
-                        QtWidgets.QMessageBox.Critical,
-                        'Error',
-                        f'{e}',
-                        QtWidgets.QMessageBox.Ok
-                    )
-                    answer = msg.exec_()
-                    return
-            else:
-                logging.info(f"New value '{new_value}' for field 'ipv6_address' for user '{mac_address}'")
-            finally:
-                conn.close()
+    def loadOlderChatMessages(self):
+        """This method adds to the top of the chat the page of messages previous to the oldest one shown"""
+        mac_address = self.chatMateMacAddressLabel.text()
+        if not mac_address or not self.chatHasOlderMessages or self.chatLoadingOlderMessages:
+            return
 
-    # @QtCore.pyqtSlot(int)
-    # def update_contact_inbox_port(self, port):
-    @QtCore.pyqtSlot()
-    def update_contact_inbox_port(self):
-        spin = self.sender()
-        if spin:
-            port = spin.value()
-            row = self.contactsTableWidget.indexAt(spin.pos()).row()
-            mac_address = self.contactsTableWidget.item(row, 1).text()
-            logging.info(f"New value '{port}' for field 'inbox_port' for user '{mac_address}'")
+        self.chatLoadingOlderMessages = True
+        try:
             conn = dbfunctions.get_connection()
-            try:
-                dbfunctions.update_contact(conn, mac_address, inbox_port=port)
-            except Exception as e:
-                logging.error(e)
-                msg = QtWidgets.QMessageBox(
-                    QtWidgets.QMessageBox.Critical,
-                    'Error',
-                    f'{e}',
-                    QtWidgets.QMessageBox.Ok
-                )
-                answer = msg.exec_()
-            finally:
-                conn.close()
+            messages = dbfunctions.conversation_history(conn, mac_address, self.chatOldestMessage,
+                                                        self.chatHistoryPageSize)
+            conn.close()
+            if len(messages) < self.chatHistoryPageSize:
+                self.chatHasOlderMessages = False
+            if not messages:
+                return
 
-    # @QtCore.pyqtSlot(int)
-    # def update_contact_ftp_port(self, port):
-    @QtCore.pyqtSlot()
-    def update_contact_ftp_port(self):
-        spin = self.sender()
-        if spin:
-            port = spin.value()
-            row = self.contactsTableWidget.indexAt(spin.pos()).row()
-            mac_address = self.contactsTableWidget.item(row, 1).text()
-            logging.info(f"New value '{port}' for field 'ftp_port' for user '{mac_address}'")
-            conn = dbfunctions.get_connection()
-            try:
-                dbfunctions.update_contact(conn, mac_address, ftp_port=port)
-            except Exception as e:
-                logging.error(e)
-                msg = QtWidgets.QMessageBox(
-                    QtWidgets.QMessageBox.Critical,
-                    'Error',
-                    f'{e}',
-                    QtWidgets.QMessageBox.Ok
-                )
-                answer = msg.exec_()
-            finally:
-                conn.close()
+            self.chatOldestMessage = messages[-1]
+            name = self.chatGroupBox.title()
+            text = '\n'.join(self.chatMessageText(name, *message[:4]) for message in reversed(messages))
+            if not self.chatTextEdit.document().isEmpty():
+                text += '\n'
+            scroll_bar = self.chatTextEdit.verticalScrollBar()
+            old_maximum, old_value = scroll_bar.maximum(), scroll_bar.value()
+            cursor = QtGui.QTextCursor(self.chatTextEdit.document())
+            cursor.movePosition(QtGui.QTextCursor.Start)
+            cursor.insertText(text)
+            # Keep the messages the user was reading in the same place of the screen
+            scroll_bar.setValue(old_value + scroll_bar.maximum() - old_maximum)
+        finally:
+            self.chatLoadingOlderMessages = False
 
-    @QtCore.pyqtSlot()
-    def start_chat_contact_row(self):
-        btn = self.sender()
-        if btn:
-            row = self.contactsTableWidget.indexAt(btn.pos()).row()
-            logging.info(f"Row selected: {row}")
-            mac_address = self.contactsTableWidget.item(row, 1).text()
-            name = self.contactsTableWidget.item(row, 0).text()
-            logging.info(f"Starting chat with '{name}' '{mac_address}'")
-            self.tabWidget.setCurrentIndex(0)
-            self.messageLineEdit.setFocus()
-            self.addConversationToConversationsTable(mac_address, name)
+    @QtCore.pyqtSlot(int)
+    def chatScrolled(self, value):
+        """This method loads the older messages of the conversation when the chat is scrolled to the top"""
+        if value == self.chatTextEdit.verticalScrollBar().minimum():
+            self.loadOlderChatMessages()
+
+    @QtCore.pyqtSlot(str, str, 'PyQt_PyObject')
+    def contactsModelOnContactEdited(self, mac_address, field, new_value):
+        """A callback when a contact was edited in the contacts table"""
+        if field != 'name':
+            return
+        self.conversationsModel.rename(mac_address, new_value)
+        if self.chatMateMacAddressLabel.text() == mac_address:
+            self.open_conversation(mac_address, new_value)
 
-    @QtCore.pyqtSlot()
-    def delete_contact_row(self):
-        btn = self.sender()
-        if btn:
-            row = self.contactsTableWidget.indexAt(btn.pos()).row()
-            mac_address = self.contactsTableWidget.item(row, 1).text()
-            logging.info(f"Deleting Contact '{mac_address}'...")
-            conn = dbfunctions.get_connection()
-            try:
-                dbfunctions.delete_contact(conn, mac_address)
-            except Exception as e:
-                logging.error(e)
-                msg = QtWidgets.QMessageBox(
-                    QtWidgets.QMessageBox.Critical,
-                    'Error',
-                    f'{e}',
-                    QtWidgets.QMessageBox.Ok
-                )
-                answer = msg.exec_()
-            else:
-                self.contactsTableWidget.removeRow(row)
+    @QtCore.pyqtSlot(str)
+    def contactsModelOnEditFailed(self, error):
+        """A callback when a value edited in the contacts table is not valid or could not be saved"""
+        msg = QtWidgets.QMessageBox(
+            QtWidgets.QMessageBox.Critical,
+            'Error',
+            error,
+            QtWidgets.QMessageBox.Ok
+        )
+        answer = msg.exec_()
 
-                for row in range(self.conversationsTableWidget.rowCount()):
-                    if mac_address == self.conversationsTableWidget.item(row, 0).text().split()[1]:
-                        self.conversationsTableWidget.removeRow(row)
-                        break
+    @QtCore.pyqtSlot(QtCore.QModelIndex)
+    def contactsTableClicked(self, index):
+        """A callback when a cell of the contacts table is clicked, the action columns work as buttons"""
+        source_index = self.contactsProxyModel.mapToSource(index)
+        if not source_index.isValid():
+            return
+        contact = self.contactsModel.contactAt(source_index.row())
+        column = source_index.column()
+        if column == models.ContactsTableModel.CHAT:
+            self.start_chat_contact_row(contact)
+        elif column == models.ContactsTableModel.FILES:
+            self.start_ftp_client_connection(contact)
+        elif column == models.ContactsTableModel.UPDATE:
+            self.start_information_request(contact)
+        elif column == models.ContactsTableModel.DELETE:
+            self.delete_contact_row(contact)
+
+    def start_chat_contact_row(self, contact):
+        mac_address = contact['mac_address']
+        name = contact['name']
+        logging.info(f"Starting chat with '{name}' '{mac_address}'")
+        self.tabWidget.setCurrentIndex(0)
+        self.messageLineEdit.setFocus()
+        self.addConversationToConversationsTable(mac_address, name)
 
-                if mac_address == self.chatMateMacAddressLabel.text():
-                    self.chatMateMacAddressLabel.setText('')
-                    self.chatGroupBox.setTitle('')
-                    self.chatTextEdit.setText('')
+    def delete_contact_row(self, contact):
+        mac_address = contact['mac_address']
+        logging.info(f"Deleting Contact '{mac_address}'...")
+        conn = dbfunctions.get_connection()
+        try:
+            dbfunctions.delete_contact(conn, mac_address)
+        except Exception as e:
+            logging.error(e)
+            msg = QtWidgets.QMessageBox(
+                QtWidgets.QMessageBox.Critical,
+                'Error',
+                f'{e}',
+                QtWidgets.QMessageBox.Ok
+            )
+            answer = msg.exec_()
+        else:
+            routes.forget(mac_address)
+            self.contactsModel.removeContact(mac_address)
 
-            finally:
-                conn.close()
+            self.conversationsModel.removeConversation(mac_address)
 
-    def nextMatchingRow(self, search_criteria, pattern: str, lastMatchingRow):
-        if search_criteria == 'Name':
-            for row in range(lastMatchingRow, self.contactsTableWidget.rowCount()):
-                name = self.contactsTableWidget.item(row, 0).text()
-                if pattern.lower() in name.lower():
-                    return row
+            if mac_address == self.chatMateMacAddressLabel.text():
+                self.chatMateMacAddressLabel.setText('')
+                self.chatGroupBox.setTitle('')
+                self.chatTextEdit.setText('')
 
-        elif search_criteria == 'MAC address':
-            for row in range(lastMatchingRow, self.contactsTableWidget.rowCount()):
-                mac = self.contactsTableWidget.item(row, 1).text()
-                if pattern.lower() in mac.lower():
-                    return row
+        finally:
+            conn.close()
 
     @QtCore.pyqtSlot()
     def findContactInTable(self):
-        self.contactsTableWidget.clearSelection()
-        newFindContactSearchPattern = self.searchContactLineEdit.text()
-        if not newFindContactSearchPattern:
-            self.lastMatchingRow = 0
-            print('No search pattern specified, restarting last matching row to 0 and exiting')
-            return
-
-        newSearchCriteria = self.searchContactCriteriaComboBox.currentText()
-        if self.searchCriteria != newSearchCriteria:
-            self.searchCriteria = newSearchCriteria
-            print('New search criteria = ', self.searchCriteria, 'setting the lastMatchingRow to 0')
-            self.lastMatchingRow = 0
-        else:  # Restart scrolling
-            print('The search criteria is the same, verifying the lastMatchingRow')
-            if newFindContactSearchPattern != self.findContactSearchPattern:
-                self.findContactSearchPattern = newFindContactSearchPattern
-                print('New search pattern = ', self.findContactSearchPattern, 'setting the lasMatchingRow to 0')
-                self.lastMatchingRow = 0
-            else:
-                print('The search pattern is the same')
-
-        row_to_scroll = self.nextMatchingRow(self.searchCriteria, self.findContactSearchPattern, self.lastMatchingRow)
-        if row_to_scroll == None:
-            self.lastMatchingRow = 0
-            row_to_scroll = self.nextMatchingRow(self.searchCriteria, self.findContactSearchPattern,
-                                                 self.lastMatchingRow)
-            if row_to_scroll == None:
-                print(
-                    f"None of the values of the '{self.searchCriteria}' matches with '{self.findContactSearchPattern}'")
-                return
-
-        print('scrolling to row:', row_to_scroll)
-        col = 0 if self.searchCriteria == 'Name' else 1
-        item_to_scroll = self.contactsTableWidget.item(row_to_scroll, col)
-        self.contactsTableWidget.scrollToItem(item_to_scroll, QtWidgets.QAbstractItemView.PositionAtTop)
-        self.contactsTableWidget.selectRow(row_to_scroll)
-        # item_to_scroll.setSelected(True)
-
-        self.lastMatchingRow = row_to_scroll + 1
-        print('last matching row:', self.lastMatchingRow)
+        """This method shows only the contacts whose name, MAC address, IPv4 or IPv6 address, depending on the search
+        criteria, starts with the search pattern, it is called as the user types"""
+        fields = self.CONTACT_SEARCH_FIELDS.get(self.searchContactCriteriaComboBox.currentIndex(), contactindex.FIELDS)
+        self.contactsProxyModel.search(self.searchContactLineEdit.text(), fields)
 
     def loadFtpConfiguration(self):
         conn = dbfunctions.get_connection()
-        ipv4, ipv6, max_conn, max_conn_per_ip, folder, banner, port, usr_can_upload = dbfunctions.get_configuration(
-            conn, 'ipv4_address', 'ipv6_address', 'ftp_max_connections', 'ftp_max_connections_per_ip', 'ftp_folder',
-            'ftp_banner', 'ftp_port', 'ftp_users_can_upload_files')
+        ipv4, ipv6, max_conn, max_conn_per_ip, folder, banner, port, usr_can_upload, keep_partial_uploads, backend = \
+            dbfunctions.get_configuration(conn, 'ipv4_address', 'ipv6_address', 'ftp_max_connections',
+                                          'ftp_max_connections_per_ip', 'ftp_folder', 'ftp_banner', 'ftp_port',
+                                          'ftp_users_can_upload_files', 'ftp_keep_partial_uploads',
+                                          'ftp_server_backend')
         conn.close()
         ip = ipv4 if ipv4 else (ipv6 if ipv6 else 'Could not obtain your IP address')
         max_conn = max_conn if max_conn else 10
@@ -1637,12 +1584,35 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
         self.ftpBannerPlainTextEdit.setPlainText(banner)
         self.ftpPortSpinBox.setValue(port)
         self.ftpUsersCanUploadFilesCheckBox.setChecked(users_can_upload_files)
+        self.ftpKeepPartialUploadsCheckBox.setChecked(bool(keep_partial_uploads))
+        for name, label in self.FTP_SERVER_BACKENDS:
+            if name in ftp.SERVER_BACKENDS:
+                self.ftpServerBackendComboBox.addItem(label, name)
+        index = self.ftpServerBackendComboBox.findData(backend if backend else ftp.BACKEND_ASYNC)
+        self.ftpServerBackendComboBox.setCurrentIndex(max(index, 0))
 
         self.ftpMaxConnectionsSpinBox.editingFinished.connect(self.save_ftp_max_connections_configuration)
         self.ftpMaxConnectionsPerIPSpinBox.editingFinished.connect(self.save_ftp_max_connections_per_ip_configuration)
         self.ftpPortSpinBox.editingFinished.connect(self.save_ftp_port_configuration)
         self.ftpFolderLineEdit.editingFinished.connect(self.save_ftp_folder_configuration)
         self.ftpUsersCanUploadFilesCheckBox.stateChanged.connect(self.save_ftp_users_can_upload_files_configuration)
+        self.ftpKeepPartialUploadsCheckBox.stateChanged.connect(self.save_ftp_keep_partial_uploads_configuration)
+        self.ftpServerBackendComboBox.currentIndexChanged.connect(self.save_ftp_server_backend_configuration)
+
+    @QtCore.pyqtSlot(int)
+    def save_ftp_server_backend_configuration(self, index):
+        new_value = self.ftpServerBackendComboBox.itemData(index)
+        conn = dbfunctions.get_connection()
+        dbfunctions.update_configuration(conn, ftp_server_backend=new_value)
+        conn.close()
+        logging.info(f"New value '{new_value}' for field 'ftp_server_backend'")
+
+    @QtCore.pyqtSlot(int)
+    def save_ftp_keep_partial_uploads_configuration(self, new_state):
+        conn = dbfunctions.get_connection()
+        dbfunctions.update_configuration(conn, ftp_keep_partial_uploads=bool(new_state))
+        conn.close()
+        logging.info(f"New value '{bool(new_state)}' for field 'ftp_keep_partial_uploads'")
 
     @QtCore.pyqtSlot(int)
     def save_ftp_users_can_upload_files_configuration(self, new_state):
@@ -1706,9 +1676,10 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
 
     def loadInterlocutorConfiguration(self):
         conn = dbfunctions.get_connection()
-        inter_address, inter_port, inter_pass, ipv4, username, inbox_port, mac_address, get_only_by_mac = dbfunctions.get_configuration(
+        inter_address, inter_port, inter_pass, ipv4, username, inbox_port, mac_address, get_only_by_mac, persistent_sessions, retention_days, retention_max_messages = dbfunctions.get_configuration(
             conn, 'interlocutor_address', 'interlocutor_port', 'interlocutor_password', 'ipv4_address', 'username',
-            'inbox_port', 'mac_address', 'get_only_by_mac')
+            'inbox_port', 'mac_address', 'get_only_by_mac', 'inbox_persistent_sessions', 'retention_days',
+            'retention_max_messages')
         conn.close()
         inter_address = inter_address if inter_address else ''
         inter_port = inter_port if inter_port is not None else 42000
@@ -1728,6 +1699,7 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
                 conn.close()
 
         get_only_by_mac = bool(get_only_by_mac)
+        persistent_sessions = bool(persistent_sessions)
         self.interIpAddressLineEdit.setText(inter_address)
         self.interPortSpinBox.setValue(inter_port)
         self.interPasswordLineEdit.setText(inter_password)
@@ -1736,6 +1708,9 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
         self.myContactInfoNameLineEdit.setText(username)
         self.myContactInfoInboxPortSpinBox.setValue(inbox_port)
         self.myContactInfoGetOnlyByMacCheckBox.setChecked(get_only_by_mac)
+        self.myContactInfoPersistentSessionsCheckBox.setChecked(persistent_sessions)
+        self.myContactInfoRetentionDaysSpinBox.setValue(retention_days or 0)
+        self.myContactInfoRetentionMaxMessagesSpinBox.setValue(retention_max_messages or 0)
 
         self.interIpAddressLineEdit.editingFinished.connect(self.save_inter_ip_address_configuration)
         self.interPortSpinBox.editingFinished.connect(self.save_inter_port_configuration)
@@ -1745,6 +1720,11 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
         self.myContactInfoInboxPortSpinBox.editingFinished.connect(self.save_my_contact_info_inbox_port_configuration)
         self.myContactInfoGetOnlyByMacCheckBox.stateChanged.connect(
             self.save_my_contact_info_get_only_by_mac_configuration)
+        self.myContactInfoPersistentSessionsCheckBox.stateChanged.connect(
+            self.save_my_contact_info_persistent_sessions_configuration)
+        self.myContactInfoRetentionDaysSpinBox.editingFinished.connect(self.save_retention_days_configuration)
+        self.myContactInfoRetentionMaxMessagesSpinBox.editingFinished.connect(
+            self.save_retention_max_messages_configuration)
 
     @QtCore.pyqtSlot(int)
     def save_my_contact_info_get_only_by_mac_configuration(self, new_state):
@@ -1753,6 +1733,29 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
         conn.close()
         logging.info(f"New value '{new_state}' for field 'get_only_by_mac'")
 
+    @QtCore.pyqtSlot(int)
+    def save_my_contact_info_persistent_sessions_configuration(self, new_state):
+        conn = dbfunctions.get_connection()
+        dbfunctions.update_configuration(conn, inbox_persistent_sessions=new_state)
+        conn.close()
+        logging.info(f"New value '{new_state}' for field 'inbox_persistent_sessions'")
+
+    @QtCore.pyqtSlot()
+    def save_retention_days_configuration(self):
+        new_value = self.myContactInfoRetentionDaysSpinBox.value() or None
+        conn = dbfunctions.get_connection()
+        dbfunctions.update_configuration(conn, retention_days=new_value)
+        conn.close()
+        logging.info(f"New value '{new_value}' for field 'retention_days'")
+
+    @QtCore.pyqtSlot()
+    def save_retention_max_messages_configuration(self):
+        new_value = self.myContactInfoRetentionMaxMessagesSpinBox.value() or None
+        conn = dbfunctions.get_connection()
+        dbfunctions.update_configuration(conn, retention_max_messages=new_value)
+        conn.close()
+        logging.info(f"New value '{new_value}' for field 'retention_max_messages'")
+
     @QtCore.pyqtSlot()
     def save_my_contact_info_inbox_port_configuration(self):
         new_port = self.myContactInfoInboxPortSpinBox.value()
@@ -1854,66 +1857,32 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
                 logging.info(f"New value '{new_ip}' for field 'interlocutor_address'")
 
     def setupConversationsTable(self):
-        conversationsTableHeaders = ['Contacts']
-        self.conversationsTableWidget.setColumnCount(len(conversationsTableHeaders))
-        self.conversationsTableWidget.setHorizontalHeaderLabels(conversationsTableHeaders)
-        self.conversationsTableWidget.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectItems)
-        self.conversationsTableWidget.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
-        conversationsTableHeader = self.conversationsTableWidget.horizontalHeader()
+        self.conversationsModel = models.ConversationsModel(self)
+        self.conversationsModel.conversationsUpdated.connect(self.conversationsModelOnUpdated)
+        self.conversationsTableView.setModel(self.conversationsModel)
+        self.conversationsTableView.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectItems)
+        self.conversationsTableView.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.conversationsTableView.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.conversationsTableView.verticalHeader().setDefaultSectionSize(models.ConversationsModel.ROW_HEIGHT)
+        self.conversationsTableView.clicked.connect(self.conversationsTableClicked)
+        conversationsTableHeader = self.conversationsTableView.horizontalHeader()
         for col in range(len(conversationsTableHeader)):
             conversationsTableHeader.setSectionResizeMode(col, QtWidgets.QHeaderView.Stretch)
 
     def loadConversationsTable(self):
-        conn = dbfunctions.get_connection()
-        last_messages = dbfunctions.last_sent_received_messages(conn)
-        conn.close()
-        self.conversationsTableWidget.setRowCount(len(last_messages))
-        try:
-            self.conversationsTableWidget.cellClicked.disconnect()
-        except:
-            pass
-        for row, message in enumerate(last_messages):
-            item = QtWidgets.QTableWidgetItem(f"{message['name']}\n{message['mac_address']}")
-            item.setFlags(item.flags() ^ QtCore.Qt.ItemIsEditable)
-            self.conversationsTableWidget.setItem(row, 0, item)
-            self.conversationsTableWidget.setRowHeight(row, 40)
-
-        self.conversationsTableWidget.cellClicked.connect(self.open_conversation_from_table_cell)
-
-        if self.conversationsTableWidget.rowCount():
-            self.conversationsTableWidget.cellClicked.emit(0, 0)
+        self.conversationsModel.reload()
+        if self.conversationsModel.rowCount():
+            conversation = self.conversationsModel.conversationAt(0)
+            self.open_conversation(conversation['mac_address'], conversation['name'])
+            self.selectConversation(conversation['mac_address'])
 
     def addConversationToConversationsTable(self, mac_address, name):
-        try:
-            self.conversationsTableWidget.cellClicked.disconnect()
-        except:
-            pass
-
-        for row in range(self.conversationsTableWidget.rowCount()):
-            mac = self.conversationsTableWidget.item(row, 0).text().split('\n')[1]
-            if mac_address == mac:
-                # The conversation already exists, dont add it, just scroll to the item
-                logging.info(f"The conversation with '{mac_address}' exists, scrolling down")
-                item_to_scroll = self.conversationsTableWidget.item(row, 0)
-                self.conversationsTableWidget.scrollToItem(item_to_scroll, QtWidgets.QAbstractItemView.PositionAtTop)
-                self.conversationsTableWidget.cellClicked.connect(self.open_conversation_from_table_cell)
-                self.conversationsTableWidget.cellClicked.emit(row, 0)
-                self.conversationsTableWidget.clearSelection()
-                # self.conversationsTableWidget.selectRow(row)
-                self.conversationsTableWidget.item(row, 0).setSelected(True)
-                return
-
-        self.conversationsTableWidget.insertRow(0)
-        item = QtWidgets.QTableWidgetItem(f"{name}\n{mac_address}")
-        item.setFlags(item.flags() ^ QtCore.Qt.ItemIsEditable)
-        self.conversationsTableWidget.setItem(0, 0, QtWidgets.QTableWidgetItem(item))
-        self.conversationsTableWidget.setRowHeight(0, 40)
-
-        self.conversationsTableWidget.cellClicked.connect(self.open_conversation_from_table_cell)
-        self.conversationsTableWidget.cellClicked.emit(0, 0)
-        self.conversationsTableWidget.clearSelection()
-        # self.conversationsTableWidget.selectRow(0)
-        self.conversationsTableWidget.item(0, 0).setSelected(True)
+        row = self.conversationsModel.addConversation(mac_address, name)
+        self.conversationsTableView.scrollTo(self.conversationsModel.index(row),
+                                             QtWidgets.QAbstractItemView.PositionAtTop)
+        self.open_conversation(mac_address, name)
+        self.conversationsModel.markRead(mac_address)
+        self.selectConversation(mac_address)
 
     def setupFtpConnectedUsersTable(self):
         tableHeaders = ['IP', 'Port']
@@ -1973,138 +1942,53 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
                     self.ftpFilesTableWidget.setItem(row, 2, item)
 
     def setupContactsTable(self):
-        contactsTableHeaders = ['Name', 'MAC address', 'IPv4 address', 'IPv6 address',
-                                'Inbox port', 'FTP port', 'CHAT', 'FILES', 'UPDATE', 'DELETE']
-        self.contactsTableWidget.setColumnCount(len(contactsTableHeaders))
-        self.contactsTableWidget.setHorizontalHeaderLabels(contactsTableHeaders)
-        contactsTableHeader = self.contactsTableWidget.horizontalHeader()
-        for col in range(len(contactsTableHeaders)):
+        self.contactsModel = models.ContactsTableModel(self)
+        self.contactsModel.contactEdited.connect(self.contactsModelOnContactEdited)
+        self.contactsModel.editFailed.connect(self.contactsModelOnEditFailed)
+        self.contactsProxyModel = models.ContactsProxyModel(self)
+        self.contactsProxyModel.setSourceModel(self.contactsModel)
+        self.contactsProxyModel.setSortCaseSensitivity(QtCore.Qt.CaseInsensitive)
+        self.contactsTableView.setModel(self.contactsProxyModel)
+        self.contactsButtonDelegate = models.ButtonDelegate(self.contactsTableView)
+        for column in models.ContactsTableModel.ACTIONS:
+            self.contactsTableView.setItemDelegateForColumn(column, self.contactsButtonDelegate)
+        self.contactsTableView.setSortingEnabled(True)
+        self.contactsTableView.sortByColumn(models.ContactsTableModel.NAME, QtCore.Qt.AscendingOrder)
+        self.contactsTableView.clicked.connect(self.contactsTableClicked)
+        contactsTableHeader = self.contactsTableView.horizontalHeader()
+        for col in range(len(models.ContactsTableModel.HEADERS)):
             contactsTableHeader.setSectionResizeMode(col, QtWidgets.QHeaderView.ResizeToContents)
 
     def loadContactsTable(self):
-        conn = dbfunctions.get_connection()
-        contacts = dbfunctions.contacts(conn)
-        conn.close()
-        self.contactsTableWidget.setRowCount(len(contacts))
+        generation = self.contactsModel.reload()
+        buildIndexThread = task.BuildContactSearchIndexThread(generation)
+        buildIndexThread.signals.on_result.connect(self.contactsModel.setSearchIndex)
+        buildIndexThread.signals.on_error.connect(self.buildContactSearchIndexOnError)
+        self.threadPool.start(buildIndexThread)
 
-        try:
-            self.contactsTableWidget.cellChanged.disconnect()
-        except:
-            pass
-
-        for row, contact in enumerate(contacts):
-            self.contactsTableWidget.setItem(row, 0, QtWidgets.QTableWidgetItem(str(contact['name'])))
-            mac_address = QtWidgets.QTableWidgetItem(str(contact['mac_address']))
-            mac_address.setFlags(mac_address.flags() ^ QtCore.Qt.ItemIsEditable)
-            self.contactsTableWidget.setItem(row, 1, mac_address)
-            self.contactsTableWidget.setItem(row, 2, QtWidgets.QTableWidgetItem(str(contact['ipv4_address'])))
-            self.contactsTableWidget.setItem(row, 3, QtWidgets.QTableWidgetItem(str(contact['ipv6_address'])))
-
-            inbox_port_spin = QtWidgets.QSpinBox(self.contactsTableWidget)
-            inbox_port_spin.setMaximum(65535)
-            inbox_port_spin.setMinimum(0)
-            inbox_port_spin.setValue(contact['inbox_port'])
-            inbox_port_spin.editingFinished.connect(self.update_contact_inbox_port)
-            self.contactsTableWidget.setCellWidget(row, 4, inbox_port_spin)
-
-            ftp_port_spin = QtWidgets.QSpinBox(self.contactsTableWidget)
-            ftp_port_spin.setMaximum(65535)
-            ftp_port_spin.setMinimum(0)
-            ftp_port_spin.setValue(contact['ftp_port'])
-            ftp_port_spin.editingFinished.connect(self.update_contact_ftp_port)
-            self.contactsTableWidget.setCellWidget(row, 5, ftp_port_spin)
-
-            chat_btn = QtWidgets.QPushButton(self.contactsTableWidget)
-            chat_btn.setText('Chat')
-            chat_btn.clicked.connect(self.start_chat_contact_row)
-            self.contactsTableWidget.setCellWidget(row, 6, chat_btn)
-            files_btn = QtWidgets.QPushButton(self.contactsTableWidget)
-            files_btn.setText('Files')
-            files_btn.clicked.connect(self.start_ftp_client_connection)
-            self.contactsTableWidget.setCellWidget(row, 7, files_btn)
-            delete_btn = QtWidgets.QPushButton(self.contactsTableWidget)
-
-            update_btn = QtWidgets.QPushButton(self.contactsTableWidget)
-            update_btn.setText('Update')
-            update_btn.clicked.connect(self.start_information_request)
-            self.contactsTableWidget.setCellWidget(row, 8, update_btn)
-
-            delete_btn.setText('Delete')
-            delete_btn.clicked.connect(self.delete_contact_row)
-            self.contactsTableWidget.setCellWidget(row, 9, delete_btn)
-
-        self.contactsTableWidget.cellChanged.connect(self.update_contact_from_table_cell)
+    @QtCore.pyqtSlot('PyQt_PyObject')
+    def buildContactSearchIndexOnError(self, error):
+        logging.error(f"Could not build the search index of the contacts, the searches query the database: {error}")
 
     def addContactToContactsTable(self, name, mac_address, ipv4_address, ipv6_address, inbox_port, ftp_port):
-        row = self.contactsTableWidget.rowCount()
+        self.contactsModel.addContact(mac_address, name, ipv4_address, ipv6_address, inbox_port, ftp_port)
 
-        try:
-            self.contactsTableWidget.cellChanged.disconnect()
-        except:
-            pass
-        self.contactsTableWidget.insertRow(row)
-        self.contactsTableWidget.setItem(row, 0, QtWidgets.QTableWidgetItem(name))
-        mac_address = QtWidgets.QTableWidgetItem(mac_address)
-        mac_address.setFlags(mac_address.flags() ^ QtCore.Qt.ItemIsEditable)
-        self.contactsTableWidget.setItem(row, 1, mac_address)
-        self.contactsTableWidget.setItem(row, 2, QtWidgets.QTableWidgetItem(ipv4_address))
-        self.contactsTableWidget.setItem(row, 3, QtWidgets.QTableWidgetItem(ipv6_address))
-
-        inbox_port_spin = QtWidgets.QSpinBox(self.contactsTableWidget)
-        inbox_port_spin.setMaximum(65535)
-        inbox_port_spin.setMinimum(0)
-        inbox_port_spin.setValue(inbox_port)
-        inbox_port_spin.valueChanged.connect(self.update_contact_inbox_port)
-        self.contactsTableWidget.setCellWidget(row, 4, inbox_port_spin)
-
-        ftp_port_spin = QtWidgets.QSpinBox(self.contactsTableWidget)
-        ftp_port_spin.setMaximum(65535)
-        ftp_port_spin.setMinimum(0)
-        ftp_port_spin.setValue(ftp_port)
-        ftp_port_spin.valueChanged.connect(self.update_contact_ftp_port)
-        self.contactsTableWidget.setCellWidget(row, 5, ftp_port_spin)
-
-        chat_btn = QtWidgets.QPushButton(self.contactsTableWidget)
-        chat_btn.setText('Chat')
-        chat_btn.clicked.connect(self.start_chat_contact_row)
-        self.contactsTableWidget.setCellWidget(row, 6, chat_btn)
-        files_btn = QtWidgets.QPushButton(self.contactsTableWidget)
-        files_btn.setText('Files')
-        files_btn.clicked.connect(self.start_ftp_client_connection)
-        self.contactsTableWidget.setCellWidget(row, 7, files_btn)
-        delete_btn = QtWidgets.QPushButton(self.contactsTableWidget)
-
-        update_btn = QtWidgets.QPushButton(self.contactsTableWidget)
-        update_btn.setText('Update')
-        update_btn.clicked.connect(self.start_information_request)
-        self.contactsTableWidget.setCellWidget(row, 8, update_btn)
-
-        delete_btn.setText('Delete')
-        delete_btn.clicked.connect(self.delete_contact_row)
-        self.contactsTableWidget.setCellWidget(row, 9, delete_btn)
-
-        self.contactsTableWidget.cellChanged.connect(self.update_contact_from_table_cell)
+    def start_information_request(self, contact):
+        name = contact['name']
+        mac = contact['mac_address']
+        ip4 = contact['ipv4_address'] or ''
+        ip6 = contact['ipv6_address'] or ''
+        port = contact['inbox_port']
 
-    @QtCore.pyqtSlot()
-    def start_information_request(self):
-        btn = self.sender()
-        if btn:
-            row = self.contactsTableWidget.indexAt(btn.pos()).row()
-            name = self.contactsTableWidget.item(row, 0).text()
-            mac = self.contactsTableWidget.item(row, 1).text()
-            ip4 = self.contactsTableWidget.item(row, 2).text()
-            ip6 = self.contactsTableWidget.item(row, 3).text()
-            port = self.contactsTableWidget.cellWidget(row, 4).value()
-
-            inter_ip = self.interIpAddressLineEdit.text()
-            inter_port = self.interPortSpinBox.value()
-            inter_pass = self.interPasswordLineEdit.text()
-
-            ifreqthread = task.RequestContactInformationThread(ip4, ip6, mac, name, port, inter_ip, inter_port,
-                                                               inter_pass, timeout=2)
-            ifreqthread.signals.on_fail.connect(self.informationRequestOnFail)
-            ifreqthread.signals.on_success.connect(self.informationRequestOnSuccess)
-            self.threadPool.start(ifreqthread)
+        inter_ip = self.interIpAddressLineEdit.text()
+        inter_port = self.interPortSpinBox.value()
+        inter_pass = self.interPasswordLineEdit.text()
+
+        ifreqtask = task.RequestContactInformationTask(ip4, ip6, mac, name, port, inter_ip, inter_port, inter_pass,
+                                                       timeout=2)
+        ifreqtask.signals.on_fail.connect(self.informationRequestOnFail)
+        ifreqtask.signals.on_success.connect(self.informationRequestOnSuccess)
+        ifreqtask.start()
 
     @QtCore.pyqtSlot(str, str)
     def informationRequestOnFail(self, name, mac):
@@ -2121,31 +2005,19 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
     def informationRequestOnSuccess(self, contact_info):
         logging.info(
             f"Contact information succesfully requested of {contact_info.get('name')} {contact_info.get('mac_address')}")
-        print('Algo')
-        for row in range(self.contactsTableWidget.rowCount()):
-            if contact_info.get('mac_address') == self.contactsTableWidget.item(row, 1).text():
-                self.contactsTableWidget.item(row, 2).setText(contact_info.get('ipv4_address'))
-                self.contactsTableWidget.cellWidget(row, 4).setValue(contact_info.get('inbox_port'))
-
-                self.contactsTableWidget.item(row, 3).setText(contact_info.get('ipv6_address'))
-                self.contactsTableWidget.cellWidget(row, 5).setValue(contact_info.get('ftp_port'))
-                conn = dbfunctions.get_connection()
-                dbfunctions.update_contact(
-                    conn,
-                    contact_info.get('mac_address'),
-                    inbox_port=contact_info.get('inbox_port'),
-                    ftp_port=contact_info.get('ftp_port')
-                )
-                conn.close()
-                success_message = f'{self.contactsTableWidget.item(row, 0).text()} has been updated'
-                msg = QtWidgets.QMessageBox(self)
-                msg.setIcon(QtWidgets.QMessageBox.Information)
-                msg.setWindowTitle('Success in life')
-                msg.setText(success_message)
-                msg.setStandardButtons(QtWidgets.QMessageBox.Ok)
-                msg.setDefaultButton(QtWidgets.QMessageBox.Ok)
-                answer = msg.exec_()
-                return
+        contact = self.contactsModel.contact(contact_info.get('mac_address'))
+        if contact:
+            self.saveContact(contact['mac_address'], ipv4_address=contact_info.get('ipv4_address'),
+                             ipv6_address=contact_info.get('ipv6_address'), inbox_port=contact_info.get('inbox_port'),
+                             ftp_port=contact_info.get('ftp_port'))
+            success_message = f"{contact['name']} has been updated"
+            msg = QtWidgets.QMessageBox(self)
+            msg.setIcon(QtWidgets.QMessageBox.Information)
+            msg.setWindowTitle('Success in life')
+            msg.setText(success_message)
+            msg.setStandardButtons(QtWidgets.QMessageBox.Ok)
+            msg.setDefaultButton(QtWidgets.QMessageBox.Ok)
+            answer = msg.exec_()
 
     @QtCore.pyqtSlot()
     def start_ftp_client_connection_fast(self):
@@ -2169,25 +2041,21 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
             else:
                 self.startFtpClientConnection(ip4, port)
 
-    @QtCore.pyqtSlot()
-    def start_ftp_client_connection(self):
-        btn = self.sender()
-        if btn:
-            row = self.contactsTableWidget.indexAt(btn.pos()).row()
-            ip4 = self.contactsTableWidget.item(row, 2).text()
-            port = self.contactsTableWidget.cellWidget(row, 5).value()
-            if not ip4:
-                msg = QtWidgets.QMessageBox(self)
-                msg.setIcon(QtWidgets.QMessageBox.Critical)
-                msg.setWindowTitle('Not enought information')
-                msg.setText(f"{self.contactsTableWidget.item(row, 0).text()} doesn't have an IPv4 address")
-                msg.setInformativeText(
-                    f"Please, click on 'Update' to try to get the IPv4 address of {self.contactsTableWidget.item(row, 0).text()}")
-                msg.setStandardButtons(QtWidgets.QMessageBox.Ok)
-                msg.setDefaultButton(QtWidgets.QMessageBox.Ok)
-                answer = msg.exec_()
-            else:
-                self.startFtpClientConnection(ip4, port)
+    def start_ftp_client_connection(self, contact):
+        ip4 = contact['ipv4_address']
+        port = contact['ftp_port']
+        if not ip4:
+            msg = QtWidgets.QMessageBox(self)
+            msg.setIcon(QtWidgets.QMessageBox.Critical)
+            msg.setWindowTitle('Not enought information')
+            msg.setText(f"{contact['name']} doesn't have an IPv4 address")
+            msg.setInformativeText(
+                f"Please, click on 'Update' to try to get the IPv4 address of {contact['name']}")
+            msg.setStandardButtons(QtWidgets.QMessageBox.Ok)
+            msg.setDefaultButton(QtWidgets.QMessageBox.Ok)
+            answer = msg.exec_()
+        else:
+            self.startFtpClientConnection(ip4, port)
 
     def startFtpClientConnection(self, ip, port, timeout=3):
         logging.info(f"Starting FTP client connection with {ip}:{port}")
@@ -2219,7 +2087,7 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
 
     def addFtpClientToDownloadsTab(self, ftp_conn: ftplib.FTP):
         newDownloadTab = FtpClientTabWidget(ftp_conn, self.downloadsTabWidget, self.threadPool,
-                                            self.notificationsTableWidget, self.tabWidget)
+                                            self.notificationsModel, self.tabWidget)
         self.downloadsTabWidget.addTab(newDownloadTab, f"{ftp_conn.host}:{ftp_conn.port}")
         print('Tab count=', self.downloadsTabWidget.count())
         self.downloadsTabWidget.setCurrentIndex(self.downloadsTabWidget.count() - 1)
@@ -2299,6 +2167,8 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
         banner = self.ftpBannerPlainTextEdit.toPlainText()
         folder = self.ftpFolderLineEdit.text()
         users_can_upload_files = self.ftpUsersCanUploadFilesCheckBox.isChecked()
+        keep_partial_uploads = self.ftpKeepPartialUploadsCheckBox.isChecked()
+        backend = self.ftpServerBackendComboBox.currentData()
         if not os.path.isdir(folder):
             folder = QtWidgets.QFileDialog.getExistingDirectory(self, 'Select a folder to share')
             logging.info(f"Folder selected: '{folder}'")
@@ -2309,7 +2179,7 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
 
         logging.info('Starting FTP server...')
         self.ftpServerThread = ftp.FtpServer(address, port, max_connections, max_connections_per_ip, folder, banner,
-                                             users_can_upload_files)
+                                             users_can_upload_files, keep_partial_uploads, backend)
 
         self.ftpServerThread.signals.on_start.connect(self.ftp_server_on_start)
         self.ftpServerThread.signals.on_shutdown.connect(self.ftp_server_on_shutdown)
@@ -2334,9 +2204,13 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
     @QtCore.pyqtSlot(str, int, str)
     def ftp_server_on_incomplete_file_received(self, remote_ip, remote_port, filename):
         logging.info(f"{remote_ip}:{remote_port} could not upload '{filename}'")
-        self.addNotificationToNotificationsTable(
-            f"{remote_ip}:{remote_port} could not upload '{filename}', removing the uploaded part")
-        os.remove(filename)  # TODO: Do this in a separate thread
+        # The handler of the FTP server removes the uploaded part, unless it keeps it to resume the upload
+        if self.ftpKeepPartialUploadsCheckBox.isChecked():
+            self.addNotificationToNotificationsTable(
+                f"{remote_ip}:{remote_port} could not upload '{filename}', keeping the uploaded part to resume it")
+        else:
+            self.addNotificationToNotificationsTable(
+                f"{remote_ip}:{remote_port} could not upload '{filename}', removing the uploaded part")
 
     @QtCore.pyqtSlot(str, int, str)
     def ftp_server_on_incomplete_file_sent(self, remote_ip, remote_port, filename):
@@ -2399,6 +2273,8 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
         self.ftpBannerPlainTextEdit.setEnabled(False)
         self.ftpFolderLineEdit.setEnabled(False)
         self.ftpUsersCanUploadFilesCheckBox.setEnabled(False)
+        self.ftpKeepPartialUploadsCheckBox.setEnabled(False)
+        self.ftpServerBackendComboBox.setEnabled(False)
         self.ftpStartPushButton.setEnabled(False)
         self.ftpShutdownPushButton.setEnabled(True)
         self.addNotificationToNotificationsTable("The FTP server is running")
@@ -2411,6 +2287,8 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
         self.ftpBannerPlainTextEdit.setEnabled(True)
         self.ftpFolderLineEdit.setEnabled(True)
         self.ftpUsersCanUploadFilesCheckBox.setEnabled(True)
+        self.ftpKeepPartialUploadsCheckBox.setEnabled(True)
+        self.ftpServerBackendComboBox.setEnabled(True)
         self.ftpStartPushButton.setEnabled(True)
         self.ftpShutdownPushButton.setEnabled(False)
         while self.ftpConnectedUsersTableWidget.rowCount():
@@ -2430,6 +2308,8 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
         answer = msg.exec_()
 
     def onTabChange(self, i):
+        if i == 0:  # The messages of the open conversation are read now
+            self.conversationsModel.markRead(self.chatMateMacAddressLabel.text())
         self.update_tab(i)
 
     def update_tab(self, index):
@@ -2448,27 +2328,23 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
             self.tabWidget.setTabText(self.tabWidget.indexOf(self.tabNotifications), "Notifications")
 
     def setupNotificationsTable(self):
-        tableHeaders = ['Time', 'Notification']
-        self.notificationsTableWidget.setColumnCount(len(tableHeaders))
-        self.notificationsTableWidget.setHorizontalHeaderLabels(tableHeaders)
-        self.notificationsTableWidget.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectItems)
-        self.notificationsTableWidget.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
-        hHeader = self.notificationsTableWidget.horizontalHeader()
-        hHeader.setSectionResizeMode(0, QtWidgets.QHeaderView.ResizeToContents)
+        self.notificationsTableView.setModel(self.notificationsModel)
+        self.notificationsTableView.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectItems)
+        self.notificationsTableView.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.notificationsTableView.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        hHeader = self.notificationsTableView.horizontalHeader()
+        # Every row has the same height and every time the same width, so the view does not measure the rows
+        hHeader.setSectionResizeMode(0, QtWidgets.QHeaderView.Fixed)
+        hHeader.resizeSection(0, self.notificationsTableView.fontMetrics().horizontalAdvance('May 30 2000 12:00 AM') + 16)
         hHeader.setSectionResizeMode(1, QtWidgets.QHeaderView.Stretch)
+        self.notificationsTableView.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
 
     def addNotificationToNotificationsTable(self, notification, time=None):
-        if not time:
-            time = datetime.datetime.now()
-        row = self.notificationsTableWidget.rowCount()
-        self.notificationsTableWidget.insertRow(row)
-        item = QtWidgets.QTableWidgetItem(time.strftime('%b %d %Y %I:%M %p'))
-        item.setFlags(item.flags() ^ QtCore.Qt.ItemIsEditable)
-        self.notificationsTableWidget.setItem(row, 0, item)
-        item = QtWidgets.QTableWidgetItem(notification)
-        item.setFlags(item.flags() ^ QtCore.Qt.ItemIsEditable)
-        self.notificationsTableWidget.setItem(row, 1, item)
+        self.notificationsModel.addNotification(notification, time)
 
+    @QtCore.pyqtSlot(int)
+    def notificationsModelOnNotificationsAdded(self, count):
+        """A callback when a batch of notifications was added to the notifications table"""
         if self.tabWidget.currentIndex() != 5:
             self.tabWidget.setTabText(self.tabWidget.indexOf(self.tabNotifications), "Notifications*")
 
@@ -2483,13 +2359,13 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
         getonlybymac = self.myContactInfoGetOnlyByMacCheckBox.isChecked()
         port = self.myContactInfoInboxPortSpinBox.value()
 
-        signUpThread = task.SignUpRequestThread(
+        signUpTask = task.SignUpRequestTask(
             server_address, server_port, server_password, mac, name, port, getonlybymac
         )
-        signUpThread.signals.on_start.connect(self.signupOnStart)
-        signUpThread.signals.on_result.connect(self.signupOnResult)
-        signUpThread.signals.on_error.connect(self.signupOnError)
-        self.threadPool.start(signUpThread)
+        signUpTask.signals.on_start.connect(self.signupOnStart)
+        signUpTask.signals.on_result.connect(self.signupOnResult)
+        signUpTask.signals.on_error.connect(self.signupOnError)
+        signUpTask.start()
 
     @QtCore.pyqtSlot()
     def signupOnStart(self):
@@ -2543,15 +2419,15 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
 
         pattern = self.interSearchLineEdit.text()
         if self.interSearchCriteriaComboBox.currentText() == 'Name':
-            getThread = task.GetRequestThread(server_address, server_port, server_password, username=pattern)
+            getTask = task.GetRequestTask(server_address, server_port, server_password, username=pattern)
         else:
-            getThread = task.GetRequestThread(server_address, server_port, server_password, mac=pattern)
+            getTask = task.GetRequestTask(server_address, server_port, server_password, mac=pattern)
 
-        getThread.signals.on_finished.connect(self.getRequestOnFinished)
-        getThread.signals.on_error.connect(self.getRequestOnError)
-        getThread.signals.on_result.connect(self.getRequestOnResult)
-        getThread.signals.on_start.connect(self.getRequestOnStart)
-        self.threadPool.start(getThread)
+        getTask.signals.on_finished.connect(self.getRequestOnFinished)
+        getTask.signals.on_error.connect(self.getRequestOnError)
+        getTask.signals.on_result.connect(self.getRequestOnResult)
+        getTask.signals.on_start.connect(self.getRequestOnStart)
+        getTask.start()
 
     @QtCore.pyqtSlot()
     def getRequestOnStart(self):
@@ -2627,37 +2503,37 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
             ipv4 = self.interDbTableWidget.item(row, 1).text()
             port = self.interDbTableWidget.item(row, 2).text()
 
-            interGetContactInfoThread = task.GetContactInformationThread(ipv4, int(port))
-            interGetContactInfoThread.signals.on_result.connect(self.interGetContactInfoThreadOnResult)
-            interGetContactInfoThread.signals.on_error.connect(self.interGetContactInfoThreadOnError)
-            interGetContactInfoThread.signals.on_finished.connect(self.interGetContactInfoThreadOnFinished)
+            interGetContactInfoTask = task.GetContactInformationTask(ipv4, int(port))
+            interGetContactInfoTask.signals.on_result.connect(self.interGetContactInfoThreadOnResult)
+            interGetContactInfoTask.signals.on_error.connect(self.interGetContactInfoThreadOnError)
+            interGetContactInfoTask.signals.on_finished.connect(self.interGetContactInfoThreadOnFinished)
             logging.info(f"Making a friend request to: '{name}' {ipv4}:{port}")
-            self.threadPool.start(interGetContactInfoThread)
+            interGetContactInfoTask.start()
 
     @QtCore.pyqtSlot(dict)
     def interGetContactInfoThreadOnResult(self, new_contact):
-        for row in range(self.contactsTableWidget.rowCount()):
-            if new_contact.get('mac_address') == self.contactsTableWidget.item(row, 1).text():
-                # Contact exists, update
-                self.contactsTableWidget.item(row, 2).setText(new_contact['ipv4_address'])
-                self.contactsTableWidget.item(row, 3).setText(new_contact['ipv6_address'])
-                self.contactsTableWidget.cellWidget(row, 4).setValue(new_contact['inbox_port'])
-                self.contactsTableWidget.cellWidget(row, 5).setValue(new_contact['ftp_port'])
-
-                conn = dbfunctions.get_connection()
-                dbfunctions.update_contact(conn, new_contact.get('mac_address'), inbox_port=new_contact['inbox_port'],
-                                           ftp_port=new_contact['ftp_port'])
-                conn.close()
+        conn = dbfunctions.get_connection()
+        try:
+            known_name = dbfunctions.get_contact(conn, new_contact.get('mac_address'), 'name')
+        except sqlite3.Error:
+            known_name = None
+        if known_name is not None:
+            # Contact exists, update
+            conn.close()
+            self.saveContact(new_contact['mac_address'], ipv4_address=new_contact['ipv4_address'],
+                             ipv6_address=new_contact['ipv6_address'], inbox_port=new_contact['inbox_port'],
+                             ftp_port=new_contact['ftp_port'])
 
-                msg = QtWidgets.QMessageBox(self)
-                msg.setIcon(QtWidgets.QMessageBox.Information)
-                msg.setWindowTitle('Information')
-                msg.setText(
-                    f"The contact {new_contact['name']} ({new_contact['mac_address']}) aka {self.contactsTableWidget.item(row, 0).text()} ({self.contactsTableWidget.item(row, 1).text()}) has been updated")
-                msg.setStandardButtons(QtWidgets.QMessageBox.Ok)
-                msg.setDefaultButton(QtWidgets.QMessageBox.Ok)
-                answer = msg.exec_()
-                return
+            msg = QtWidgets.QMessageBox(self)
+            msg.setIcon(QtWidgets.QMessageBox.Information)
+            msg.setWindowTitle('Information')
+            msg.setText(
+                f"The contact {new_contact['name']} ({new_contact['mac_address']}) aka {known_name} ({new_contact['mac_address']}) has been updated")
+            msg.setStandardButtons(QtWidgets.QMessageBox.Ok)
+            msg.setDefaultButton(QtWidgets.QMessageBox.Ok)
+            answer = msg.exec_()
+            return
+        conn.close()
 
         # Contact does not exist, add him
 
@@ -2721,12 +2597,12 @@ class HotlineMainWindow(QtWidgets.QMainWindow, Ui_HotlineMainWindow):
         server_addr = self.interIpAddressLineEdit.text()
         server_port = self.interPortSpinBox.value()
         server_password = self.interPasswordLineEdit.text()
-        dropRequestThread = task.DropRequestThread(server_addr, server_port, server_password, ip)
-        dropRequestThread.signals.on_start.connect(self.dropRequestThreadOnStart)
-        dropRequestThread.signals.on_error.connect(self.dropRequestThreadOnError)
-        dropRequestThread.signals.on_result.connect(self.dropRequestThreadOnResult)
-        dropRequestThread.signals.on_finished.connect(self.dropRequestThreadOnFinished)
-        self.threadPool.start(dropRequestThread)
+        dropRequestTask = task.DropRequestTask(server_addr, server_port, server_password, ip)
+        dropRequestTask.signals.on_start.connect(self.dropRequestThreadOnStart)
+        dropRequestTask.signals.on_error.connect(self.dropRequestThreadOnError)
+        dropRequestTask.signals.on_result.connect(self.dropRequestThreadOnResult)
+        dropRequestTask.signals.on_finished.connect(self.dropRequestThreadOnFinished)
+        dropRequestTask.start()
 
     @QtCore.pyqtSlot(str)
     def dropRequestThreadOnStart(self, ip_to_drop):
@@ -37,11 +37,9 @@ class Ui_HotlineMainWindow(object):
         self.verticalLayout_23.setObjectName("verticalLayout_23")
         self.verticalLayout_21 = QtWidgets.QVBoxLayout()
         self.verticalLayout_21.setObjectName("verticalLayout_21")
-        self.conversationsTableWidget = QtWidgets.QTableWidget(self.conversationsGroupBox)
-        self.conversationsTableWidget.setObjectName("conversationsTableWidget")
-        self.conversationsTableWidget.setColumnCount(0)
-        self.conversationsTableWidget.setRowCount(0)
-        self.verticalLayout_21.addWidget(self.conversationsTableWidget)
+        self.conversationsTableView = QtWidgets.QTableView(self.conversationsGroupBox)
+        self.conversationsTableView.setObjectName("conversationsTableView")
+        self.verticalLayout_21.addWidget(self.conversationsTableView)
         self.verticalLayout_23.addLayout(self.verticalLayout_21)
         self.horizontalLayout_16.addWidget(self.conversationsGroupBox)
         self.chatGroupBox = QtWidgets.QGroupBox(self.tabChats)
@@ -105,13 +103,14 @@ class Ui_HotlineMainWindow(object):
         self.searchContactCriteriaComboBox.setObjectName("searchContactCriteriaComboBox")
         self.searchContactCriteriaComboBox.addItem("")
         self.searchContactCriteriaComboBox.addItem("")
+        self.searchContactCriteriaComboBox.addItem("")
+        self.searchContactCriteriaComboBox.addItem("")
+        self.searchContactCriteriaComboBox.addItem("")
         self.horizontalLayout.addWidget(self.searchContactCriteriaComboBox)
         self.verticalLayout_3.addLayout(self.horizontalLayout)
-        self.contactsTableWidget = QtWidgets.QTableWidget(self.contactsDbGroupBox)
-        self.contactsTableWidget.setObjectName("contactsTableWidget")
-        self.contactsTableWidget.setColumnCount(0)
-        self.contactsTableWidget.setRowCount(0)
-        self.verticalLayout_3.addWidget(self.contactsTableWidget)
+        self.contactsTableView = QtWidgets.QTableView(self.contactsDbGroupBox)
+        self.contactsTableView.setObjectName("contactsTableView")
+        self.verticalLayout_3.addWidget(self.contactsTableView)
         self.verticalLayout_27.addLayout(self.verticalLayout_3)
         self.verticalLayout_2.addWidget(self.contactsDbGroupBox)
         self.newContactGroupBox = QtWidgets.QGroupBox(self.tabContacts)
@@ -329,6 +328,24 @@ class Ui_HotlineMainWindow(object):
         self.ftpUsersCanUploadFilesCheckBox = QtWidgets.QCheckBox(self.ftpServerConfigGroupBox)
         self.ftpUsersCanUploadFilesCheckBox.setObjectName("ftpUsersCanUploadFilesCheckBox")
         self.formLayout_5.setWidget(5, QtWidgets.QFormLayout.FieldRole, self.ftpUsersCanUploadFilesCheckBox)
+        self.keepPartialUploadsLabel = QtWidgets.QLabel(self.ftpServerConfigGroupBox)
+        self.keepPartialUploadsLabel.setObjectName("keepPartialUploadsLabel")
+        self.formLayout_5.setWidget(6, QtWidgets.QFormLayout.LabelRole, self.keepPartialUploadsLabel)
+        self.ftpKeepPartialUploadsCheckBox = QtWidgets.QCheckBox(self.ftpServerConfigGroupBox)
+        self.ftpKeepPartialUploadsCheckBox.setObjectName("ftpKeepPartialUploadsCheckBox")
+        self.formLayout_5.setWidget(6, QtWidgets.QFormLayout.FieldRole, self.ftpKeepPartialUploadsCheckBox)
+        self.serverBackendLabel = QtWidgets.QLabel(self.ftpServerConfigGroupBox)
+        self.serverBackendLabel.setObjectName("serverBackendLabel")
+        self.formLayout_5.setWidget(7, QtWidgets.QFormLayout.LabelRole, self.serverBackendLabel)
+        self.ftpServerBackendComboBox = QtWidgets.QComboBox(self.ftpServerConfigGroupBox)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Fixed, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.ftpServerBackendComboBox.sizePolicy().hasHeightForWidth())
+        self.ftpServerBackendComboBox.setSizePolicy(sizePolicy)
+        self.ftpServerBackendComboBox.setMinimumSize(QtCore.QSize(110, 0))
+        self.ftpServerBackendComboBox.setObjectName("ftpServerBackendComboBox")
+        self.formLayout_5.setWidget(7, QtWidgets.QFormLayout.FieldRole, self.ftpServerBackendComboBox)
         self.verticalLayout_5.addLayout(self.formLayout_5)
         self.verticalLayout_19.addWidget(self.ftpServerConfigGroupBox)
         self.groupBox_7 = QtWidgets.QGroupBox(self.tabFTP)
@@ -500,6 +517,26 @@ class Ui_HotlineMainWindow(object):
         self.myContactInfoInboxPortSpinBox.setProperty("value", 42000)
         self.myContactInfoInboxPortSpinBox.setObjectName("myContactInfoInboxPortSpinBox")
         self.formLayout_7.setWidget(2, QtWidgets.QFormLayout.FieldRole, self.myContactInfoInboxPortSpinBox)
+        self.persistentSessionsLabel = QtWidgets.QLabel(self.groupBox_2)
+        self.persistentSessionsLabel.setObjectName("persistentSessionsLabel")
+        self.formLayout_7.setWidget(5, QtWidgets.QFormLayout.LabelRole, self.persistentSessionsLabel)
+        self.myContactInfoPersistentSessionsCheckBox = QtWidgets.QCheckBox(self.groupBox_2)
+        self.myContactInfoPersistentSessionsCheckBox.setObjectName("myContactInfoPersistentSessionsCheckBox")
+        self.formLayout_7.setWidget(5, QtWidgets.QFormLayout.FieldRole, self.myContactInfoPersistentSessionsCheckBox)
+        self.retentionDaysLabel = QtWidgets.QLabel(self.groupBox_2)
+        self.retentionDaysLabel.setObjectName("retentionDaysLabel")
+        self.formLayout_7.setWidget(6, QtWidgets.QFormLayout.LabelRole, self.retentionDaysLabel)
+        self.myContactInfoRetentionDaysSpinBox = QtWidgets.QSpinBox(self.groupBox_2)
+        self.myContactInfoRetentionDaysSpinBox.setMaximum(36500)
+        self.myContactInfoRetentionDaysSpinBox.setObjectName("myContactInfoRetentionDaysSpinBox")
+        self.formLayout_7.setWidget(6, QtWidgets.QFormLayout.FieldRole, self.myContactInfoRetentionDaysSpinBox)
+        self.retentionMaxMessagesLabel = QtWidgets.QLabel(self.groupBox_2)
+        self.retentionMaxMessagesLabel.setObjectName("retentionMaxMessagesLabel")
+        self.formLayout_7.setWidget(7, QtWidgets.QFormLayout.LabelRole, self.retentionMaxMessagesLabel)
+        self.myContactInfoRetentionMaxMessagesSpinBox = QtWidgets.QSpinBox(self.groupBox_2)
+        self.myContactInfoRetentionMaxMessagesSpinBox.setMaximum(10000000)
+        self.myContactInfoRetentionMaxMessagesSpinBox.setObjectName("myContactInfoRetentionMaxMessagesSpinBox")
+        self.formLayout_7.setWidget(7, QtWidgets.QFormLayout.FieldRole, self.myContactInfoRetentionMaxMessagesSpinBox)
         self.verticalLayout_6.addLayout(self.formLayout_7)
         self.verticalLayout_22.addWidget(self.groupBox_2)
         spacerItem4 = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
@@ -582,11 +619,9 @@ class Ui_HotlineMainWindow(object):
         self.groupBox_5.setObjectName("groupBox_5")
         self.verticalLayout_13 = QtWidgets.QVBoxLayout(self.groupBox_5)
         self.verticalLayout_13.setObjectName("verticalLayout_13")
-        self.notificationsTableWidget = QtWidgets.QTableWidget(self.groupBox_5)
-        self.notificationsTableWidget.setObjectName("notificationsTableWidget")
-        self.notificationsTableWidget.setColumnCount(0)
-        self.notificationsTableWidget.setRowCount(0)
-        self.verticalLayout_13.addWidget(self.notificationsTableWidget)
+        self.notificationsTableView = QtWidgets.QTableView(self.groupBox_5)
+        self.notificationsTableView.setObjectName("notificationsTableView")
+        self.verticalLayout_13.addWidget(self.notificationsTableView)
         self.verticalLayout_14.addWidget(self.groupBox_5)
         self.tabWidget.addTab(self.tabNotifications, "")
         self.verticalLayout.addWidget(self.tabWidget)
@@ -614,15 +649,18 @@ class Ui_HotlineMainWindow(object):
         HotlineMainWindow.setTabOrder(self.myContactInfoIpAddressLineEdit, self.myContactInfoInboxPortSpinBox)
         HotlineMainWindow.setTabOrder(self.myContactInfoInboxPortSpinBox, self.myContactInfoMacAddressLineEdit)
         HotlineMainWindow.setTabOrder(self.myContactInfoMacAddressLineEdit, self.myContactInfoGetOnlyByMacCheckBox)
-        HotlineMainWindow.setTabOrder(self.myContactInfoGetOnlyByMacCheckBox, self.interSignUpPushButton)
+        HotlineMainWindow.setTabOrder(self.myContactInfoGetOnlyByMacCheckBox, self.myContactInfoPersistentSessionsCheckBox)
+        HotlineMainWindow.setTabOrder(self.myContactInfoPersistentSessionsCheckBox, self.myContactInfoRetentionDaysSpinBox)
+        HotlineMainWindow.setTabOrder(self.myContactInfoRetentionDaysSpinBox, self.myContactInfoRetentionMaxMessagesSpinBox)
+        HotlineMainWindow.setTabOrder(self.myContactInfoRetentionMaxMessagesSpinBox, self.interSignUpPushButton)
         HotlineMainWindow.setTabOrder(self.interSignUpPushButton, self.interSearchLineEdit)
         HotlineMainWindow.setTabOrder(self.interSearchLineEdit, self.interSearchPushButton)
         HotlineMainWindow.setTabOrder(self.interSearchPushButton, self.interDbTableWidget)
         HotlineMainWindow.setTabOrder(self.interDbTableWidget, self.searchContactLineEdit)
         HotlineMainWindow.setTabOrder(self.searchContactLineEdit, self.tabWidget)
         HotlineMainWindow.setTabOrder(self.tabWidget, self.searchContactCriteriaComboBox)
-        HotlineMainWindow.setTabOrder(self.searchContactCriteriaComboBox, self.contactsTableWidget)
-        HotlineMainWindow.setTabOrder(self.contactsTableWidget, self.newContactNameLineEdit)
+        HotlineMainWindow.setTabOrder(self.searchContactCriteriaComboBox, self.contactsTableView)
+        HotlineMainWindow.setTabOrder(self.contactsTableView, self.newContactNameLineEdit)
         HotlineMainWindow.setTabOrder(self.newContactNameLineEdit, self.newContactMacAddressLineEdit)
         HotlineMainWindow.setTabOrder(self.newContactMacAddressLineEdit, self.newContactIpv4AddressLineEdit)
         HotlineMainWindow.setTabOrder(self.newContactIpv4AddressLineEdit, self.newContactIpv6AddressLineEdit)
@@ -633,13 +671,13 @@ class Ui_HotlineMainWindow(object):
         HotlineMainWindow.setTabOrder(self.chatTextEdit, self.messageLineEdit)
         HotlineMainWindow.setTabOrder(self.messageLineEdit, self.sendMessagePushButton)
         HotlineMainWindow.setTabOrder(self.sendMessagePushButton, self.findContactPushButton)
-        HotlineMainWindow.setTabOrder(self.findContactPushButton, self.conversationsTableWidget)
-        HotlineMainWindow.setTabOrder(self.conversationsTableWidget, self.ftpFolderLineEdit)
+        HotlineMainWindow.setTabOrder(self.findContactPushButton, self.conversationsTableView)
+        HotlineMainWindow.setTabOrder(self.conversationsTableView, self.ftpFolderLineEdit)
         HotlineMainWindow.setTabOrder(self.ftpFolderLineEdit, self.ftpConnectedUsersTableWidget)
         HotlineMainWindow.setTabOrder(self.ftpConnectedUsersTableWidget, self.ftpFilesTableWidget)
         HotlineMainWindow.setTabOrder(self.ftpFilesTableWidget, self.interSearchCriteriaComboBox)
         HotlineMainWindow.setTabOrder(self.interSearchCriteriaComboBox, self.downloadsTabWidget)
-        HotlineMainWindow.setTabOrder(self.downloadsTabWidget, self.notificationsTableWidget)
+        HotlineMainWindow.setTabOrder(self.downloadsTabWidget, self.notificationsTableView)
 
     def retranslateUi(self, HotlineMainWindow):
         _translate = QtCore.QCoreApplication.translate
@@ -654,8 +692,11 @@ class Ui_HotlineMainWindow(object):
         self.contactsDbGroupBox.setTitle(_translate("HotlineMainWindow", "Contacts database"))
         self.searchContactLineEdit.setPlaceholderText(_translate("HotlineMainWindow", "Type here to search contacts"))
         self.findContactPushButton.setText(_translate("HotlineMainWindow", "Find"))
-        self.searchContactCriteriaComboBox.setItemText(0, _translate("HotlineMainWindow", "Name"))
-        self.searchContactCriteriaComboBox.setItemText(1, _translate("HotlineMainWindow", "MAC address"))
+        self.searchContactCriteriaComboBox.setItemText(0, _translate("HotlineMainWindow", "Any field"))
+        self.searchContactCriteriaComboBox.setItemText(1, _translate("HotlineMainWindow", "Name"))
+        self.searchContactCriteriaComboBox.setItemText(2, _translate("HotlineMainWindow", "MAC address"))
+        self.searchContactCriteriaComboBox.setItemText(3, _translate("HotlineMainWindow", "IPv4 address"))
+        self.searchContactCriteriaComboBox.setItemText(4, _translate("HotlineMainWindow", "IPv6 address"))
         self.newContactGroupBox.setTitle(_translate("HotlineMainWindow", "New contact"))
         self.nameLabel.setText(_translate("HotlineMainWindow", "Name:"))
         self.newContactNameLineEdit.setPlaceholderText(_translate("HotlineMainWindow", "Muhammad"))
@@ -677,6 +718,10 @@ class Ui_HotlineMainWindow(object):
         self.folderLabel.setText(_translate("HotlineMainWindow", "Folder:"))
         self.ftpFolderLineEdit.setPlaceholderText(_translate("HotlineMainWindow", "C:\\Users\\muhammad\\"))
         self.usersCanUploadFilesLabel.setText(_translate("HotlineMainWindow", "Users can upload files:"))
+        self.keepPartialUploadsLabel.setText(_translate("HotlineMainWindow", "Resumable uploads:"))
+        self.ftpKeepPartialUploadsCheckBox.setToolTip(_translate("HotlineMainWindow", "Keep the part of an upload received before the connection dropped, so it can be resumed"))
+        self.serverBackendLabel.setText(_translate("HotlineMainWindow", "Concurrency:"))
+        self.ftpServerBackendComboBox.setToolTip(_translate("HotlineMainWindow", "Serve every connection in the same thread, in its own thread or in its own process"))
         self.groupBox_7.setTitle(_translate("HotlineMainWindow", "Banner"))
         self.ftpBannerPlainTextEdit.setPlaceholderText(_translate("HotlineMainWindow", "Type here a creative banner message :)"))
         self.groupBox_8.setTitle(_translate("HotlineMainWindow", "Options"))
@@ -697,6 +742,12 @@ class Ui_HotlineMainWindow(object):
         self.mACAddressLabel.setText(_translate("HotlineMainWindow", "MAC address:"))
         self.onlyByMACLabel.setText(_translate("HotlineMainWindow", "Get only by MAC:"))
         self.inboxPortLabel_2.setText(_translate("HotlineMainWindow", "Inbox port:"))
+        self.persistentSessionsLabel.setText(_translate("HotlineMainWindow", "Persistent sessions:"))
+        self.retentionDaysLabel.setText(_translate("HotlineMainWindow", "Keep messages for:"))
+        self.myContactInfoRetentionDaysSpinBox.setSpecialValueText(_translate("HotlineMainWindow", "Forever"))
+        self.myContactInfoRetentionDaysSpinBox.setSuffix(_translate("HotlineMainWindow", " days"))
+        self.retentionMaxMessagesLabel.setText(_translate("HotlineMainWindow", "Messages kept per contact:"))
+        self.myContactInfoRetentionMaxMessagesSpinBox.setSpecialValueText(_translate("HotlineMainWindow", "All"))
         self.groupBox_11.setTitle(_translate("HotlineMainWindow", "Options"))
         self.interSignUpPushButton.setText(_translate("HotlineMainWindow", "Sign up"))
         self.groupBox_3.setTitle(_translate("HotlineMainWindow", "Interlocutor database"))
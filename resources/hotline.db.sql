@@ -1,3 +1,4 @@
+PRAGMA auto_vacuum = INCREMENTAL;
 BEGIN TRANSACTION;
 DROP TABLE IF EXISTS "Configuration";
 CREATE TABLE IF NOT EXISTS "Configuration" (
@@ -14,25 +15,32 @@ CREATE TABLE IF NOT EXISTS "Configuration" (
 	"interlocutor_address"	INTEGER,
 	"interlocutor_port"	INTEGER,
 	"interlocutor_password"	INTEGER,
-	"get_only_by_mac"	BOOLEAN
+	"get_only_by_mac"	BOOLEAN,
+	"inbox_persistent_sessions"	BOOLEAN DEFAULT 0,
+	"db_synchronous"	TEXT DEFAULT 'NORMAL',
+	"db_cache_size"	INTEGER DEFAULT -16000,
+	"retention_days"	INTEGER,
+	"retention_max_messages"	INTEGER,
+	"ftp_keep_partial_uploads"	BOOLEAN DEFAULT 0,
+	"ftp_server_backend"	TEXT DEFAULT 'async'
 );
 DROP TABLE IF EXISTS "SentMessage";
 CREATE TABLE IF NOT EXISTS "SentMessage" (
+	"id"	INTEGER PRIMARY KEY,
 	"receiver_contact"	TEXT NOT NULL,
 	"content"	TEXT,
-	"sent_timestamp"	DATETIME NOT NULL UNIQUE,
-	"received_timestamp"	DATETIME,
-	FOREIGN KEY("receiver_contact") REFERENCES "Contact"("mac_address") ON UPDATE CASCADE ON DELETE CASCADE,
-	PRIMARY KEY("sent_timestamp")
+	"sent_timestamp"	INTEGER NOT NULL,
+	"received_timestamp"	INTEGER,
+	FOREIGN KEY("receiver_contact") REFERENCES "Contact"("mac_address") ON UPDATE CASCADE ON DELETE CASCADE
 );
 DROP TABLE IF EXISTS "ReceivedMessage";
 CREATE TABLE IF NOT EXISTS "ReceivedMessage" (
+	"id"	INTEGER PRIMARY KEY,
 	"sender_contact"	TEXT NOT NULL,
 	"content"	TEXT,
-	"received_timestamp"	DATETIME NOT NULL UNIQUE,
-	"sent_timestamp"	DATETIME,
-	FOREIGN KEY("sender_contact") REFERENCES "Contact"("mac_address") ON UPDATE CASCADE ON DELETE CASCADE,
-	PRIMARY KEY("received_timestamp")
+	"received_timestamp"	INTEGER NOT NULL,
+	"sent_timestamp"	INTEGER,
+	FOREIGN KEY("sender_contact") REFERENCES "Contact"("mac_address") ON UPDATE CASCADE ON DELETE CASCADE
 );
 DROP TABLE IF EXISTS "Contact";
 CREATE TABLE IF NOT EXISTS "Contact" (
@@ -42,10 +50,57 @@ CREATE TABLE IF NOT EXISTS "Contact" (
 	"ipv6_address"	INTEGER,
 	"inbox_port"	INTEGER,
 	"ftp_port"	INTEGER,
+	"retention_days"	INTEGER,
+	"retention_max_messages"	INTEGER,
 	PRIMARY KEY("mac_address")
 );
-INSERT INTO "Configuration" VALUES ('70:1c:e7:73:7b:61','lucia_alarconcio','192.168.1.72','fe80::721c:e7ff:fe73:7b61%19',42000,21,'Welcome to my FTP server, please be kind.',10,1,NULL,NULL,42000,'secret',1);
-INSERT INTO "Contact" VALUES ('cccc.bbbb.eeee','juan_valdez','192.168.1.71','fe80::721c:e7ff:fe73:7b61%19',42000,21);
-INSERT INTO "Contact" VALUES ('aaaa.eeee.ffff','lucia_alarcon','192.168.1.79','2806:104e:19:2548:721c:e7ff:fe73:7b61',42000,21);
-INSERT INTO "Contact" VALUES ('701c.e773.7b65','jorge_alarcon','172.16.128.243','fe80::721c:e7ff:fe73:7b61%19',42000,21);
+DROP TABLE IF EXISTS "Route";
+CREATE TABLE IF NOT EXISTS "Route" (
+	"contact_mac"	TEXT NOT NULL,
+	"address"	TEXT NOT NULL,
+	"port"	INTEGER NOT NULL,
+	"family"	TEXT NOT NULL,
+	"last_success"	DATETIME,
+	"last_failure"	DATETIME,
+	FOREIGN KEY("contact_mac") REFERENCES "Contact"("mac_address") ON UPDATE CASCADE ON DELETE CASCADE,
+	PRIMARY KEY("contact_mac","address","port")
+);
+INSERT INTO "Configuration" VALUES ('70:1c:e7:73:7b:61','lucia_alarconcio','192.168.1.72','fe80::721c:e7ff:fe73:7b61%19',42000,21,'Welcome to my FTP server, please be kind.',10,1,NULL,NULL,42000,'secret',1,0,'NORMAL',-16000,NULL,NULL,0,'async');
+INSERT INTO "Contact" VALUES ('cccc.bbbb.eeee','juan_valdez','192.168.1.71','fe80::721c:e7ff:fe73:7b61%19',42000,21,NULL,NULL);
+INSERT INTO "Contact" VALUES ('aaaa.eeee.ffff','lucia_alarcon','192.168.1.79','2806:104e:19:2548:721c:e7ff:fe73:7b61',42000,21,NULL,NULL);
+INSERT INTO "Contact" VALUES ('701c.e773.7b65','jorge_alarcon','172.16.128.243','fe80::721c:e7ff:fe73:7b61%19',42000,21,NULL,NULL);
+CREATE INDEX IF NOT EXISTS "SentMessage_receiver_contact_sent_timestamp" ON "SentMessage" (
+	"receiver_contact",
+	"sent_timestamp"
+);
+CREATE INDEX IF NOT EXISTS "ReceivedMessage_sender_contact_received_timestamp" ON "ReceivedMessage" (
+	"sender_contact",
+	"received_timestamp"
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS "MessageSearch" USING fts5(content, contact UNINDEXED, type UNINDEXED, timestamp UNINDEXED, tokenize = 'unicode61 remove_diacritics 2');
+CREATE TRIGGER IF NOT EXISTS "SentMessage_search_insert" AFTER INSERT ON "SentMessage" BEGIN
+	INSERT INTO MessageSearch(rowid, content, contact, type, timestamp) VALUES (new.rowid * 2 + 0, new.content, new.receiver_contact, 'sent', new.sent_timestamp);
+END;
+CREATE TRIGGER IF NOT EXISTS "SentMessage_search_delete" AFTER DELETE ON "SentMessage" BEGIN
+	DELETE FROM MessageSearch WHERE rowid = old.rowid * 2 + 0;
+END;
+CREATE TRIGGER IF NOT EXISTS "SentMessage_search_update" AFTER UPDATE ON "SentMessage" BEGIN
+	DELETE FROM MessageSearch WHERE rowid = old.rowid * 2 + 0;
+	INSERT INTO MessageSearch(rowid, content, contact, type, timestamp) VALUES (new.rowid * 2 + 0, new.content, new.receiver_contact, 'sent', new.sent_timestamp);
+END;
+CREATE TRIGGER IF NOT EXISTS "ReceivedMessage_search_insert" AFTER INSERT ON "ReceivedMessage" BEGIN
+	INSERT INTO MessageSearch(rowid, content, contact, type, timestamp) VALUES (new.rowid * 2 + 1, new.content, new.sender_contact, 'received', new.received_timestamp);
+END;
+CREATE TRIGGER IF NOT EXISTS "ReceivedMessage_search_delete" AFTER DELETE ON "ReceivedMessage" BEGIN
+	DELETE FROM MessageSearch WHERE rowid = old.rowid * 2 + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS "ReceivedMessage_search_update" AFTER UPDATE ON "ReceivedMessage" BEGIN
+	DELETE FROM MessageSearch WHERE rowid = old.rowid * 2 + 1;
+	INSERT INTO MessageSearch(rowid, content, contact, type, timestamp) VALUES (new.rowid * 2 + 1, new.content, new.sender_contact, 'received', new.received_timestamp);
+END;
+CREATE INDEX IF NOT EXISTS "Contact_name_mac_address" ON "Contact" (
+	IFNULL("name", ''),
+	"mac_address"
+);
+PRAGMA user_version = 8;
 COMMIT;